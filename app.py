@@ -1,400 +1,233 @@
+"""Streamlit web front end for the FREE Screenshot Editor
+
+All image processing lives in editor.py; this module only draws the UI.
+"""
 import streamlit as st
-from PIL import Image, ImageFilter, ImageDraw, ImageFont, ImageEnhance
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from PIL import Image
 import io
-import cv2
-import numpy as np
-import re
-import random
-from typing import List, Tuple
-
-# Configure page
-st.set_page_config(
-    page_title="FREE Screenshot Editor",
-    page_icon="📸",
-    layout="wide"
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Any, Callable, List, Optional
+from dedup import DedupIndex, DedupResult
+from editor import (
+    FreeScreenshotEditor, add_text_to_image, enhance_image_quality, logger
 )
+from encoding import (
+    DEFAULT_PNG_COMPRESS_LEVEL, DEFAULT_QUALITY, FORMATS, LOSSY_FORMATS, EncodingOptions, encode_image
+)
+from enhancement import DEFAULT_COLOR, DEFAULT_CONTRAST, DEFAULT_SHARPNESS
+from instrumentation import nbytes, recording, span
+from jobs import Job, JobCancelled, JobQueue, QueueFull
+from previews import PREVIEW_WIDTH, UploadedImage, make_preview, preview_size
+from progressive import ProxyBudget, make_proxy, quick_blur
+from result_cache import ResultCache
+from streaming import needs_streaming, stream_enhance, stream_smart_blur
 
-# Initialize session state
-if 'processed_image' not in st.session_state:
-    st.session_state.processed_image = None
-if 'original_image' not in st.session_state:
-    st.session_state.original_image = None
+def init_session_state() -> None:
+    """Create the per-session values the app keeps between reruns"""
+    defaults = {
+        'processed_image': None,
+        'upload': None,
+        'upload_id': None,
+        'processed_key': None,
+        'last_trace': [],
+    }
+    for key, value in defaults.items():
+        if key not in st.session_state:
+            st.session_state[key] = value
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
 
-class FreeScreenshotEditor:
-    """FREE Screenshot editor with local AI-like features (no API needed!)"""
-    
-    def __init__(self):
-        """Initialize the editor - no API key needed!"""
-        pass
-    
-    def detect_text_regions(self, image: Image.Image) -> List[Tuple[int, int, int, int]]:
-        """Detect text regions in image using OpenCV (FREE!)"""
-        try:
-            # Convert PIL to OpenCV format
-            img_array = np.array(image)
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            
-            # Use MSER (Maximally Stable Extremal Regions) to detect text
-            mser = cv2.MSER_create()
-            regions, _ = mser.detectRegions(gray)
-            
-            # Convert regions to bounding boxes
-            boxes = []
-            for region in regions:
-                x, y, w, h = cv2.boundingRect(region.reshape(-1, 1, 2))
-                # Filter out very small regions
-                if w > 20 and h > 10:
-                    boxes.append((x, y, x + w, y + h))
-            
-            return boxes
-            
-        except Exception as e:
-            st.error(f"Error detecting text: {str(e)}")
-            return []
+class StreamlitErrorHandler(logging.Handler):
+    """Show errors logged by the editor core in the page that triggered them"""
     
-    def generate_alt_text_free(self, image: Image.Image) -> str:
-        """Generate alt text using image analysis (FREE - no API!)"""
-        try:
-            width, height = image.size
-            aspect_ratio = width / height
-            
-            # Analyze image properties
-            img_array = np.array(image)
-            
-            # Calculate average brightness
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            brightness = np.mean(gray)
-            
-            # Count dominant colors
-            img_small = cv2.resize(img_array, (50, 50))
-            img_flat = img_small.reshape(-1, 3)
-            unique_colors = len(np.unique(img_flat.view(np.dtype((np.void, img_flat.dtype.itemsize * 3)))))
-            
-            # Detect edges (complexity indicator)
-            edges = cv2.Canny(gray, 50, 150)
-            edge_density = np.sum(edges > 0) / (width * height)
-            
-            # Generate description based on analysis
-            alt_text = "Screenshot showing "
-            
-            # Describe layout
-            if aspect_ratio > 1.5:
-                alt_text += "a wide horizontal interface "
-            elif aspect_ratio < 0.7:
-                alt_text += "a tall vertical layout "
-            else:
-                alt_text += "a standard rectangular interface "
-            
-            # Describe complexity
-            if edge_density > 0.1:
-                alt_text += "with detailed content and multiple elements"
-            elif edge_density > 0.05:
-                alt_text += "with moderate detail and various UI components"
-            else:
-                alt_text += "with clean, minimal design"
-            
-            # Describe brightness
-            if brightness > 200:
-                alt_text += ", featuring bright colors and high contrast"
-            elif brightness < 100:
-                alt_text += ", with dark theme or low lighting"
-            else:
-                alt_text += ", with balanced lighting"
-            
-            # Add color diversity info
-            if unique_colors > 1000:
-                alt_text += " and rich color palette."
-            elif unique_colors > 500:
-                alt_text += " and moderate color variety."
-            else:
-                alt_text += " and limited color scheme."
-            
-            return alt_text
-            
-        except Exception as e:
-            return f"Screenshot image with dimensions {image.size[0]}x{image.size[1]} pixels."
+    def emit(self, record: logging.LogRecord) -> None:
+        st.error(self.format(record))
+
+@st.cache_resource
+def install_error_handler() -> logging.Handler:
+    """Forward the core's error log to st.error (once per server process)"""
+    handler = StreamlitErrorHandler(level=logging.ERROR)
+    logger.addHandler(handler)
+    return handler
+
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    """Result cache shared by every session in this server process"""
+    return ResultCache()
+
+@st.cache_resource
+def get_dedup_index() -> Optional[DedupIndex]:
+    """On-disk index of earlier results, so near-duplicate screenshots skip most detection
     
-    def detect_sensitive_info_free(self, image: Image.Image) -> dict:
-        """Detect potential sensitive areas using pattern recognition (FREE!)"""
-        try:
-            # Convert to OpenCV format
-            img_array = np.array(image)
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            
-            # Detect text regions
-            text_boxes = self.detect_text_regions(image)
-            
-            width, height = image.size
-            sensitive_areas = []
-            details = []
-            
-            # Check common sensitive areas
-            # Top area (often contains emails, names in headers)
-            if height > 100:
-                top_area = gray[0:int(height * 0.15), :]
-                if np.mean(top_area) < 240:  # Not just white space
-                    sensitive_areas.append("top")
-                    details.append("header area with potential personal info")
-            
-            # Bottom area (often contains signatures, contact info)
-            if height > 100:
-                bottom_area = gray[int(height * 0.85):height, :]
-                if np.mean(bottom_area) < 240:  # Not just white space
-                    sensitive_areas.append("bottom")
-                    details.append("footer area with potential contact details")
-            
-            # Check for potential email patterns in filename or assume presence
-            # (This is a simplified approach since we can't do OCR without heavy libraries)
-            if len(text_boxes) > 5:  # Lots of text regions
-                details.append("multiple text regions that may contain sensitive data")
-            
-            # Check image dimensions for common sensitive screenshot types
-            if width > 800 and height > 600:  # Likely desktop screenshot
-                details.append("desktop screenshot that may show personal information")
-            elif width < 500:  # Likely mobile screenshot
-                details.append("mobile screenshot that may contain private messages or data")
-            
-            found = len(sensitive_areas) > 0 or len(text_boxes) > 3
-            
-            return {
-                "found": found,
-                "details": ", ".join(details) if details else "Image analysis completed",
-                "locations": ", ".join(sensitive_areas) if sensitive_areas else "General content areas",
-                "text_boxes": text_boxes
-            }
-            
-        except Exception as e:
-            return {
-                "found": True,  # Conservative approach
-                "details": f"Unable to fully analyze - applying protective blur. Error: {str(e)}",
-                "locations": "entire image",
-                "text_boxes": []
-            }
+    Off unless SCREENSHOT_EDITOR_INDEX names the file to keep it in: it stores a small
+    grayscale thumbnail, text boxes and alt text of every upload.
+    """
+    path = os.environ.get("SCREENSHOT_EDITOR_INDEX")
+    return DedupIndex(path) if path else None
+
+# How often a waiting session refreshes its queue position (seconds)
+JOB_POLL_INTERVAL = 0.1
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Worker pool shared by every session, so heavy jobs can't overload the server"""
+    return JobQueue()
+
+@st.cache_resource
+def get_proxy_budget() -> ProxyBudget:
+    """Quick-pass timings shared by every session, so proxies are sized to the latency budget"""
+    return ProxyBudget()
+
+def submit_job(fn: Callable[[], Any]) -> Job:
+    """Queue fn on the shared worker pool for this session"""
+    ctx = get_script_run_ctx()
     
-    def apply_smart_blur(self, image: Image.Image, blur_strength: int = 15) -> Image.Image:
-        """Apply smart blur to likely sensitive areas (FREE!)"""
-        try:
-            # Get sensitive info detection results
-            sensitive_info = self.detect_sensitive_info_free(image)
-            
-            # Create a copy for processing
-            result = image.copy()
-            width, height = image.size
-            
-            # Apply blur to detected text regions
-            for box in sensitive_info.get("text_boxes", []):
-                x1, y1, x2, y2 = box
-                # Extract the region
-                region = result.crop((x1, y1, x2, y2))
-                # Apply blur
-                blurred_region = region.filter(ImageFilter.GaussianBlur(radius=blur_strength))
-                # Paste back
-                result.paste(blurred_region, (x1, y1))
-            
-            # Apply blur to common sensitive areas
-            if "top" in sensitive_info.get("locations", ""):
-                top_region = result.crop((0, 0, width, int(height * 0.15)))
-                top_blurred = top_region.filter(ImageFilter.GaussianBlur(radius=blur_strength))
-                result.paste(top_blurred, (0, 0))
-            
-            if "bottom" in sensitive_info.get("locations", ""):
-                bottom_region = result.crop((0, int(height * 0.85), width, height))
-                bottom_blurred = bottom_region.filter(ImageFilter.GaussianBlur(radius=blur_strength))
-                result.paste(bottom_blurred, (0, int(height * 0.85)))
-            
-            return result
-            
-        except Exception as e:
-            st.error(f"Error applying blur: {str(e)}")
-            return image
+    def job():
+        # Let st.error() calls made while processing reach this session
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn()
     
-    def generate_meme_caption_free(self, image: Image.Image) -> str:
-        """Generate meme caption using image analysis (FREE!)"""
-        try:
-            width, height = image.size
-            aspect_ratio = width / height
-            
-            # Analyze image
-            img_array = np.array(image)
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            brightness = np.mean(gray)
-            
-            # Detect edges for complexity
-            edges = cv2.Canny(gray, 50, 150)
-            edge_density = np.sum(edges > 0) / (width * height)
-            
-            # Pre-made meme templates based on image characteristics
-            meme_templates = {
-                "complex_desktop": [
-                    "When you have 47 tabs open but still can't find what you're looking for",
-                    "POV: Your desktop after 3 months of 'I'll organize it later'",
-                    "This screenshot has more layers than my emotional problems",
-                    "When your screen looks like a puzzle but you're the missing piece"
-                ],
-                "simple_clean": [
-                    "Minimalism: Because sometimes less is more... or you just gave up",
-                    "Clean desktop energy ✨ (Trash folder has entered the chat)",
-                    "When you finally organize your life for 5 seconds",
-                    "This is what peak performance looks like"
-                ],
-                "mobile_screenshot": [
-                    "When your phone knows more about you than you do",
-                    "Mobile screenshot: Because desktop was too mainstream",
-                    "POV: You're about to show someone something but panic about your notifications",
-                    "This app has seen things... terrible things"
-                ],
-                "dark_theme": [
-                    "Dark mode: Because my soul matches my UI",
-                    "When you're trying to save battery but really you're just emo",
-                    "Dark theme supremacy ⚫",
-                    "My screen is darker than my coffee"
-                ],
-                "bright_colorful": [
-                    "When your screen is brighter than your future",
-                    "This has more colors than a unicorn explosion 🌈",
-                    "RGB keyboard users be like:",
-                    "Brightness level: Retina damage"
-                ]
-            }
-            
-            # Choose template based on image characteristics
-            if width < 500:  # Mobile
-                templates = meme_templates["mobile_screenshot"]
-            elif brightness < 100:  # Dark
-                templates = meme_templates["dark_theme"]
-            elif brightness > 200:  # Bright
-                templates = meme_templates["bright_colorful"]
-            elif edge_density > 0.1:  # Complex
-                templates = meme_templates["complex_desktop"]
-            else:  # Clean
-                templates = meme_templates["simple_clean"]
-            
-            # Add some random tech humor
-            random_humor = [
-                "Error 404: Social life not found",
-                "It ain't much, but it's honest work",
-                "Me explaining this screenshot to my mom:",
-                "When the screenshot is more organized than your life",
-                "This screenshot brought to you by caffeine and poor life choices"
-            ]
-            
-            # Combine and pick random
-            all_options = templates + random_humor
-            return random.choice(all_options)
-            
-        except Exception as e:
-            return "When your screenshot editor works better than your life decisions 😅"
+    try:
+        return get_job_queue().submit(st.session_state.session_id, job)
+    except QueueFull:
+        st.error("🚦 The server is busy right now - please try again in a moment.")
+        st.stop()
 
-def add_text_to_image(image: Image.Image, text: str, position: str = "bottom") -> Image.Image:
-    """Add meme-style text to image (FREE!)"""
+def submit_background_job(session_id: str, fn: Callable[[], Any]) -> Optional[Job]:
+    """Queue fn on the shared worker pool for when no one is waiting on it (None if the pool is full)"""
     try:
-        # Create a copy
-        img_with_text = image.copy()
-        draw = ImageDraw.Draw(img_with_text)
-        
-        # Try to load a font (fallback to default)
-        try:
-            # Try different common font paths
-            font_paths = [
-                "arial.ttf", "Arial.ttf", 
-                "C:/Windows/Fonts/arial.ttf",
-                "C:/Windows/Fonts/calibri.ttf",
-                "/System/Library/Fonts/Arial.ttf",
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-            ]
-            
-            font = None
-            for path in font_paths:
-                try:
-                    font = ImageFont.truetype(path, 28)
-                    break
-                except:
-                    continue
-            
-            if font is None:
-                font = ImageFont.load_default()
-                
-        except:
-            font = ImageFont.load_default()
-        
-        # Get image dimensions
-        width, height = img_with_text.size
-        
-        # Word wrap for long text
-        words = text.split(' ')
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            bbox = draw.textbbox((0, 0), test_line, font=font)
-            if bbox[2] - bbox[0] < width - 40:  # Leave 20px margin on each side
-                current_line.append(word)
+        return get_job_queue().submit_background(session_id, fn)
+    except QueueFull:
+        # Background work only warms caches - skip it while the server is busy
+        return None
+
+def wait_for_job(submitted: Job) -> Any:
+    """Result of a submitted job, showing the queue position while it waits"""
+    queue = get_job_queue()
+    status = st.empty()
+    try:
+        while not submitted.wait(JOB_POLL_INTERVAL):
+            position = queue.position(submitted)
+            if position is not None:
+                status.info(f"⏳ Waiting for a free worker - you're #{position} in line")
             else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
-        
-        if current_line:
-            lines.append(' '.join(current_line))
-        
-        # Calculate total text height
-        total_text_height = len(lines) * 35  # Approximate line height
-        
-        # Position text
-        if position == "top":
-            start_y = 20
-        else:  # bottom
-            start_y = height - total_text_height - 20
-        
-        # Draw each line
-        for i, line in enumerate(lines):
-            # Calculate position for this line
-            bbox = draw.textbbox((0, 0), line, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            x = (width - text_width) // 2
-            y = start_y + (i * 35)
-            
-            # Draw outline (stroke effect)
-            outline_width = 3
-            for adj_x in range(-outline_width, outline_width + 1):
-                for adj_y in range(-outline_width, outline_width + 1):
-                    if adj_x != 0 or adj_y != 0:
-                        draw.text((x + adj_x, y + adj_y), line, fill="black", font=font)
-            
-            # Draw main text
-            draw.text((x, y), line, fill="white", font=font)
-        
-        return img_with_text
-        
-    except Exception as e:
-        st.error(f"Error adding text: {str(e)}")
-        return image
+                status.info(f"🔄 Processing... {time.time() - (submitted.started_at or submitted.submitted_at):.1f}s")
+    finally:
+        # Also reached when the user reruns the script while waiting
+        queue.cancel(submitted)
+    status.empty()
+    
+    try:
+        return submitted.result()
+    except JobCancelled:
+        st.warning("Processing was cancelled.")
+        st.stop()
 
-def enhance_image_quality(image: Image.Image) -> Image.Image:
-    """Enhance image quality (FREE bonus feature!)"""
+def run_job(fn: Callable[[], Any]) -> Any:
+    """Run fn on the shared worker pool, showing the queue position while it waits"""
+    return wait_for_job(submit_job(fn))
+
+def quick_pass_wanted(feature_name: str, done_key) -> bool:
+    """True unless the full result is already cached (under done_key) or the upload is small"""
+    return done_key not in get_result_cache() and get_proxy_budget().worth_it(
+        feature_name, st.session_state.upload.size
+    )
+
+def run_progressive(feature_name: str, full: Callable[[], Any],
+                    quick: Optional[Callable[[Image.Image, float], Any]],
+                    show: Callable[[Any, bool], None],
+                    instant: Optional[Callable[[], Any]] = None) -> Any:
+    """Show quick's result on a small proxy while full runs on the worker pool, then swap in full's
+    
+    quick(proxy, scale) gets the upload shrunk to the feature's latency budget (scale is its
+    width / the full width); show(result, is_quick) draws either result in the same place.
+    instant() can offer a preview from precomputed data instead (None if it has none).
+    With quick=None and no instant preview this is just run_job followed by show.
+    """
+    slot = st.empty()
+    job = submit_job(full)
     try:
-        # Enhance sharpness
-        enhancer = ImageEnhance.Sharpness(image)
-        enhanced = enhancer.enhance(1.2)
-        
-        # Enhance contrast slightly
-        enhancer = ImageEnhance.Contrast(enhanced)
-        enhanced = enhancer.enhance(1.1)
-        
-        # Enhance color
-        enhancer = ImageEnhance.Color(enhanced)
-        enhanced = enhancer.enhance(1.05)
+        preview = instant() if instant is not None else None
+        if preview is not None:
+            if not job.done():
+                with slot.container():
+                    show(preview, True)
+        elif quick is not None:
+            budget = get_proxy_budget()
+            upload = st.session_state.upload
+            proxy = make_proxy(upload.preview(), budget.proxy_pixels(feature_name))
+            pixels = proxy.size[0] * proxy.size[1]
+            with span("quick_pass", pixels=pixels), budget.timed(feature_name, pixels):
+                quick_result = quick(proxy, proxy.size[0] / upload.size[0])
+            # Not worth flashing up if the full result beat it
+            if not job.done():
+                with slot.container():
+                    show(quick_result, True)
+    except BaseException:
+        # Including Streamlit's rerun/stop: the full pass is no longer wanted
+        get_job_queue().cancel(job)
+        raise
+    result = wait_for_job(job)
+    with slot.container():
+        show(result, False)
+    return result
+
+def show_image(image: Image.Image, cache_key=None, max_width: int = PREVIEW_WIDTH, **kwargs) -> None:
+    """st.image of a display-sized copy of image; full-resolution pixels never go to the browser
+    
+    With cache_key, the downscaled copy is cached alongside the result it shows.
+    """
+    if cache_key is not None:
+        preview = get_result_cache().get_or_compute(
+            cache_key + ("preview", max_width), lambda: make_preview(image, max_width)
+        )
+    else:
+        preview = make_preview(image, max_width)
+    # Timed as its own stage: serializing images to the browser is slow
+    with span("render.st_image", pixels=preview.size[0] * preview.size[1], allocated_bytes=nbytes(preview)):
+        st.image(preview, **kwargs)
+
+def show_debug_panel(spans: List[dict]) -> None:
+    """Sidebar table of the last run's stage timings, exportable as JSON"""
+    with st.sidebar:
+        st.markdown("---")
+        st.subheader("🐞 Stage Timings")
+        if not spans:
+            st.caption("Process an image to see where the time goes.")
+            return
         
-        return enhanced
-    except:
-        return image
+        total_ms = sum(s["duration_ms"] for s in spans if s["parent"] is None)
+        st.caption(f"{len(spans)} stages • {total_ms:.0f} ms in top-level stages")
+        st.dataframe(
+            [{k: v for k, v in s.items() if k != "start"} for s in spans],
+            use_container_width=True
+        )
+        st.download_button(
+            label="📥 Export timings (JSON)",
+            data=json.dumps(spans, indent=2),
+            file_name="stage_timings.json",
+            mime="application/json"
+        )
 
 def main():
     """Main Streamlit app - 100% FREE!"""
     
+    # Configure page
+    st.set_page_config(
+        page_title="FREE Screenshot Editor",
+        page_icon="📸",
+        layout="wide"
+    )
+    init_session_state()
+    install_error_handler()
+    
     # Header with celebration
     st.title("📸 FREE Screenshot Editor")
     st.markdown("*✨ No API keys, no costs, no limits! Pure local magic!* 🎉")
@@ -425,6 +258,24 @@ def main():
             blur_strength = st.slider("Blur Strength", 1, 30, 15)
         elif feature == "😄 Meme Generator":
             caption_position = st.selectbox("Caption Position", ["bottom", "top"])
+        elif feature == "✨ Quality Enhance":
+            sharpness = st.slider("Sharpness", 0.5, 3.0, DEFAULT_SHARPNESS, 0.05)
+            contrast = st.slider("Contrast", 0.5, 2.0, DEFAULT_CONTRAST, 0.05)
+            color = st.slider("Color", 0.0, 2.0, DEFAULT_COLOR, 0.05)
+        
+        with st.expander("💾 Download Format"):
+            output_format = st.selectbox("Format", list(FORMATS), help="Lossless WebP is usually the smallest exact copy")
+            compress_level, quality, colors = DEFAULT_PNG_COMPRESS_LEVEL, DEFAULT_QUALITY, None
+            if output_format == "PNG":
+                compress_level = st.slider("PNG Compression", 0, 9, DEFAULT_PNG_COMPRESS_LEVEL,
+                                           help="Lower is faster, higher is smaller")
+            if output_format in LOSSY_FORMATS:
+                quality = st.slider("Quality", 1, 100, DEFAULT_QUALITY)
+            elif st.checkbox("Reduce colors", help="Great for flat UI screenshots - exact if they use few colors"):
+                colors = st.slider("Colors", 2, 256, 256)
+            encoding = EncodingOptions(output_format, compress_level, quality, colors)
+        
+        debug_timings = st.checkbox("🐞 Show stage timings", help="Time each processing step (for bug reports)")
     
     # Main content
     col1, col2 = st.columns([1, 1])
@@ -439,99 +290,277 @@ def main():
         )
         
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.session_state.original_image = image
+            # Only decode and analyze again when a different file is uploaded
+            if st.session_state.upload_id != uploaded_file.file_id:
+                # Work still queued for the previous image is no longer wanted
+                get_job_queue().cancel_session(st.session_state.session_id)
+                # Full-resolution pixels are decoded by the first job that needs them
+                st.session_state.upload = UploadedImage(uploaded_file.getvalue())
+                st.session_state.upload_id = uploaded_file.file_id
+            upload = st.session_state.upload
             
-            st.image(image, caption="Original Screenshot", use_column_width=True)
+            show_image(upload.preview(), caption="Original Screenshot", use_column_width=True)
             
             # Show image stats
-            file_size = len(uploaded_file.getvalue()) / 1024  # KB
-            st.info(f"📊 Size: {image.size[0]} x {image.size[1]} pixels • {file_size:.1f} KB")
+            file_size = len(upload.data) / 1024  # KB
+            st.info(f"📊 Size: {upload.size[0]} x {upload.size[1]} pixels • {file_size:.1f} KB")
     
-    with col2:
+    with col2, (recording() if debug_timings else nullcontext()) as trace:
         st.header("✨ FREE AI-Powered Results")
         
-        if st.session_state.original_image is not None:
+        if st.session_state.upload is not None:
             editor = FreeScreenshotEditor()
-            
-            if st.button(f"🚀 Process with {feature}", type="primary"):
+            cache = get_result_cache()
+            index = get_dedup_index()
+            upload = st.session_state.upload
+            image_hash = upload.hash
+            
+            # Once an image is blurred, moving the strength slider updates the preview right away
+            live_blur = (
+                feature == "🔒 Privacy Blur"
+                and st.session_state.processed_key is not None
+                and st.session_state.processed_key[:2] == (image_hash, "blur")
+                and not needs_streaming(upload)
+            )
+            
+            if st.button(f"🚀 Process with {feature}", type="primary") or live_blur:
                 with st.spinner("🔄 Processing locally (no internet needed)..."):
                     
                     if feature == "📝 Smart Alt Text":
                         # Generate alt text using local analysis
-                        alt_text = editor.generate_alt_text_free(st.session_state.original_image)
-                        st.success("✅ Alt text generated using local AI!")
-                        st.text_area("Generated Alt Text:", value=alt_text, height=100)
-                        st.image(st.session_state.original_image, caption="Your Screenshot", use_column_width=True)
+                        alt_key = (image_hash, "alt_text")
+                        
+                        def show_alt_text(alt_text, is_quick):
+                            if is_quick:
+                                st.info(f"⚡ Quick look (full resolution on its way): {alt_text}")
+                            else:
+                                st.success("✅ Alt text generated using local AI!")
+                                st.text_area("Generated Alt Text:", value=alt_text, height=100)
+                            show_image(upload.preview(), caption="Your Screenshot", use_column_width=True)
+                        
+                        run_progressive(
+                            "alt_text",
+                            lambda: cache.get_or_compute(
+                                alt_key,
+                                lambda: index.generate_alt_text(editor, upload.image, upload.features, upload.hash)
+                                if index else editor.generate_alt_text_free(upload.image, upload.features)
+                            ),
+                            (lambda proxy, scale: FreeScreenshotEditor().generate_alt_text_free(proxy))
+                            if quick_pass_wanted("alt_text", alt_key) else None,
+                            show_alt_text,
+                        )
                     
                     elif feature == "🔒 Privacy Blur":
-                        # Detect and blur sensitive areas
-                        sensitive_info = editor.detect_sensitive_info_free(st.session_state.original_image)
+                        blur_key = (image_hash, "blur", blur_strength)
+                        streaming = needs_streaming(upload)
+                        stream_key = blur_key + ("stream", encoding.compress_level)
+                        
+                        session_id = st.session_state.session_id
                         
-                        st.write("🔍 **FREE Privacy Analysis:**")
-                        if sensitive_info["found"]:
-                            st.warning(f"Detected: {sensitive_info['details']}")
-                            st.write(f"📍 Areas: {sensitive_info['locations']}")
+                        def blur_job():
+                            if streaming:
+                                # Huge capture: detect and blur band by band straight into PNG bytes
+                                def stream_blur():
+                                    buf = io.BytesIO()
+                                    info = stream_smart_blur(upload.image, buf, editor, blur_strength,
+                                                             compress_level=encoding.compress_level,
+                                                             preview_size=preview_size(upload.size))
+                                    return info, buf.getvalue(), None
+                                
+                                return cache.get_or_compute(stream_key, stream_blur)
                             
-                            blurred_image = editor.apply_smart_blur(
-                                st.session_state.original_image, 
-                                blur_strength
+                            # Detect sensitive areas once per image, reusing a near-duplicate's results if indexed
+                            def detect():
+                                if index is None:
+                                    info = editor.detect_sensitive_info_free(upload.image, upload.features)
+                                    return DedupResult(info, "full")
+                                return index.detect_sensitive_info(editor, upload.image, upload.features, upload.hash)
+                            
+                            detection = cache.get_or_compute((image_hash, "sensitive_info"), detect)
+                            info = detection.sensitive_info
+                            if not info["found"]:
+                                return info, None, detection
+                            
+                            # The result (and download) is always an exact blur at this strength
+                            blurred = cache.get_or_compute(
+                                blur_key, lambda: editor.apply_smart_blur(upload.image, blur_strength,
+                                                                          upload.features, info)
+                            )
+                            # Blur levels for instant slider previews are built once per image, one level
+                            # at a time while a worker is free
+                            pyramid = cache.get_or_compute(
+                                (image_hash, "blur_pyramid"),
+                                lambda: editor.build_blur_pyramid(upload.image, upload.features, info)
                             )
-                            st.session_state.processed_image = blurred_image
+                            pyramid.precompute_in_background(lambda fn: submit_background_job(session_id, fn))
+                            return info, blurred, detection
+                        
+                        # While the exact blur runs, a blend of the blur levels (if they are ready) previews it
+                        def slider_preview():
+                            pyramid = cache.get((image_hash, "blur_pyramid"))
+                            detection = cache.get((image_hash, "sensitive_info"))
+                            if streaming or pyramid is None or detection is None or not pyramid.ready(blur_strength):
+                                return None
+                            return detection.sensitive_info, pyramid.render(blur_strength)
+                        
+                        def show_blur(result, is_quick):
+                            st.write("🔍 **FREE Privacy Analysis:**")
+                            if is_quick:
+                                sensitive_info, blurred_proxy = result
+                                st.caption("⚡ Quick look - the exact full-resolution blur replaces it when ready")
+                                if sensitive_info["found"]:
+                                    show_image(blurred_proxy, caption="Privacy-Protected Screenshot (preview)",
+                                               use_column_width=True)
+                                else:
+                                    show_image(upload.preview(), caption="Your Screenshot", use_column_width=True)
+                                return
                             
-                            st.success("✅ Privacy protection applied!")
-                            st.image(blurred_image, caption="Privacy-Protected Screenshot", use_column_width=True)
-                        else:
-                            st.success("✅ No obvious sensitive content detected!")
-                            st.image(st.session_state.original_image, caption="Your Screenshot", use_column_width=True)
+                            sensitive_info, blurred, detection = result
+                            if detection is not None and detection.mode in ("reused", "incremental"):
+                                st.caption(f"♻️ Near-duplicate of an earlier screenshot - only "
+                                           f"{detection.changed_fraction:.0%} of it was scanned again")
+                            if sensitive_info["found"]:
+                                st.warning(f"Detected: {sensitive_info['details']}")
+                                st.write(f"📍 Areas: {sensitive_info['locations']}")
+                                
+                                if streaming:
+                                    # The PNG download reuses the streamed bytes; the image is only decoded if needed
+                                    if encoding.is_default_png:
+                                        cache.put(blur_key + ("encoded", encoding), blurred)
+                                    blurred_image = Image.open(io.BytesIO(blurred))
+                                    # Shrunk while streaming, so the PNG is not decoded just to show it
+                                    blurred_preview = sensitive_info["preview"]
+                                else:
+                                    blurred_image = blurred_preview = blurred
+                                st.session_state.processed_image = blurred_image
+                                st.session_state.processed_key = blur_key
+                                
+                                st.success("✅ Privacy protection applied!")
+                                show_image(blurred_preview, blur_key, caption="Privacy-Protected Screenshot",
+                                           use_column_width=True)
+                            else:
+                                st.success("✅ No obvious sensitive content detected!")
+                                show_image(upload.preview(), caption="Your Screenshot", use_column_width=True)
+                        
+                        # Once the blur levels exist, a blend previews any strength faster than a quick pass
+                        done_key = stream_key if streaming else blur_key
+                        run_progressive(
+                            "blur",
+                            blur_job,
+                            (lambda proxy, scale: quick_blur(FreeScreenshotEditor(), proxy, blur_strength, scale))
+                            if quick_pass_wanted("blur", done_key) else None,
+                            show_blur,
+                            slider_preview if done_key not in cache else None,
+                        )
                     
                     elif feature == "😄 Meme Generator":
-                        # Generate meme using local analysis
-                        meme_text = editor.generate_meme_caption_free(st.session_state.original_image)
-                        st.success("✅ Meme caption generated using local humor AI!")
-                        st.text_area("Generated Meme Caption:", value=meme_text, height=100)
+                        # Generate meme using local analysis and add it to the image
+                        meme_key = (image_hash, "meme", caption_position)
                         
-                        # Add to image
-                        meme_image = add_text_to_image(
-                            st.session_state.original_image,
-                            meme_text,
-                            caption_position
+                        def make_meme():
+                            text = editor.generate_meme_caption_free(upload.image, upload.features)
+                            return text, add_text_to_image(upload.image, text, caption_position)
+                        
+                        def quick_meme(proxy, scale):
+                            # The proxy's caption is only a stand-in: the full pass picks its own from
+                            # full-resolution features
+                            text = FreeScreenshotEditor().generate_meme_caption_free(proxy)
+                            return text, add_text_to_image(proxy, text, caption_position)
+                        
+                        def show_meme(result, is_quick):
+                            text, image = result
+                            if is_quick:
+                                st.info(f"⚡ Quick look (full resolution on its way): {text}")
+                                show_image(image, caption="Meme-ified Screenshot 🎭 (preview)", use_column_width=True)
+                                return
+                            st.success("✅ Meme caption generated using local humor AI!")
+                            st.text_area("Generated Meme Caption:", value=text, height=100)
+                            
+                            st.session_state.processed_image = image
+                            st.session_state.processed_key = meme_key
+                            show_image(image, meme_key, caption="Meme-ified Screenshot 🎭", use_column_width=True)
+                        
+                        run_progressive(
+                            "meme",
+                            lambda: cache.get_or_compute(meme_key, make_meme),
+                            quick_meme if quick_pass_wanted("meme", meme_key) else None,
+                            show_meme,
                         )
-                        st.session_state.processed_image = meme_image
-                        st.image(meme_image, caption="Meme-ified Screenshot 🎭", use_column_width=True)
                     
                     elif feature == "✨ Quality Enhance":
                         # Enhance image quality
-                        enhanced_image = enhance_image_quality(st.session_state.original_image)
-                        st.session_state.processed_image = enhanced_image
+                        enhance_key = (image_hash, "enhance", sharpness, contrast, color)
+                        streaming = needs_streaming(upload)
+                        png_key = enhance_key + ("stream", encoding.compress_level)
+                        
+                        def enhance_job():
+                            if streaming:
+                                # Huge capture: enhance band by band straight into PNG bytes (plus a preview)
+                                def stream_enhanced():
+                                    buf = io.BytesIO()
+                                    preview = stream_enhance(upload.image, buf, compress_level=encoding.compress_level,
+                                                             sharpness=sharpness, contrast=contrast, color=color,
+                                                             preview_size=preview_size(upload.size))
+                                    return buf.getvalue(), preview
+                                
+                                return cache.get_or_compute(png_key, stream_enhanced)
+                            enhanced = cache.get_or_compute(
+                                enhance_key,
+                                lambda: enhance_image_quality(upload.image, sharpness, contrast, color, upload.features)
+                            )
+                            return enhanced, enhanced
                         
-                        st.success("✅ Image quality enhanced!")
-                        st.image(enhanced_image, caption="Enhanced Screenshot", use_column_width=True)
+                        def show_enhanced(result, is_quick):
+                            if is_quick:
+                                st.caption("⚡ Quick look at reduced size - the full-resolution result replaces it when ready")
+                                enhanced_image = enhanced_preview = result
+                                key = None
+                            else:
+                                enhanced_image, enhanced_preview = result
+                                key = enhance_key
+                                if streaming:
+                                    if encoding.is_default_png:
+                                        cache.put(enhance_key + ("encoded", encoding), enhanced_image)
+                                    enhanced_image = Image.open(io.BytesIO(enhanced_image))
+                                st.session_state.processed_image = enhanced_image
+                                st.session_state.processed_key = enhance_key
+                                
+                                st.success("✅ Image quality enhanced!")
+                            show_image(enhanced_preview, key, caption="Enhanced Screenshot", use_column_width=True)
+                            
+                            # Show before/after, at half the width
+                            st.markdown("**Before vs After:**")
+                            before_col, after_col = st.columns(2)
+                            with before_col:
+                                show_image(upload.preview(PREVIEW_WIDTH // 2), caption="Before", use_column_width=True)
+                            with after_col:
+                                show_image(enhanced_preview, key, PREVIEW_WIDTH // 2, caption="After",
+                                           use_column_width=True)
                         
-                        # Show before/after
-                        st.markdown("**Before vs After:**")
-                        before_col, after_col = st.columns(2)
-                        with before_col:
-                            st.image(st.session_state.original_image, caption="Before", use_column_width=True)
-                        with after_col:
-                            st.image(enhanced_image, caption="After", use_column_width=True)
+                        run_progressive(
+                            "enhance",
+                            enhance_job,
+                            (lambda proxy, scale: enhance_image_quality(proxy, sharpness, contrast, color))
+                            if quick_pass_wanted("enhance", png_key if streaming else enhance_key) else None,
+                            show_enhanced,
+                        )
             
             # Download processed image
             if st.session_state.processed_image is not None:
                 st.markdown("---")
                 
-                buf = io.BytesIO()
-                st.session_state.processed_image.save(buf, format='PNG')
-                byte_data = buf.getvalue()
+                processed_image = st.session_state.processed_image
+                encoded_key = st.session_state.processed_key + ("encoded", encoding)
                 
                 st.download_button(
                     label="💾 Download FREE Processed Image",
-                    data=byte_data,
-                    file_name=f"free_processed_{feature.replace(' ', '_').lower()}.png",
-                    mime="image/png"
+                    # Encoded once per result and setting, then cached
+                    data=cache.get_or_compute(encoded_key, lambda: encode_image(processed_image, encoding)),
+                    file_name=f"free_processed_{feature.replace(' ', '_').lower()}.{encoding.extension}",
+                    mime=encoding.mime
                 )
         
-        elif st.session_state.original_image is None:
+        elif st.session_state.upload is None:
             st.info("👆 Upload an image to get started with FREE processing!")
             
             # Show what's possible
@@ -544,6 +573,11 @@ def main():
             - **No Limits**: Process unlimited images!
             """)
     
+    if debug_timings:
+        if trace.spans:
+            st.session_state.last_trace = trace.to_dicts()
+        show_debug_panel(st.session_state.last_trace)
+    
     # Footer
     st.markdown("---")
     st.markdown("""
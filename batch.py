@@ -0,0 +1,323 @@
+"""Headless batch processing of screenshot folders (no Streamlit UI needed)
+
+Example:
+    python batch.py screenshots/ "more/**/*.png" -o processed --ops alt_text,blur --workers 8
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from multiprocessing import Pool
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Set, Tuple
+
+import cv2
+from PIL import Image
+
+from dedup import DedupIndex
+from editor import FreeScreenshotEditor, ImageFeatures, load_image
+from encoding import DEFAULT_PNG_COMPRESS_LEVEL, DEFAULT_QUALITY, FORMATS, EncodingOptions, encode_image
+from enhancement import DEFAULT_COLOR, DEFAULT_CONTRAST, DEFAULT_SHARPNESS
+from instrumentation import recording
+from processing import OPERATIONS, OutputSink, run_operations
+from result_cache import content_hash
+from streaming import needs_streaming
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+MANIFEST_NAME = "manifest.jsonl"
+INDEX_NAME = "index.sqlite3"
+
+# One editor (and dedup index connection) per worker process, created by _init_worker
+_editor = None
+_index = None
+
+
+def find_images(inputs: List[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (image path, output-relative path) for directories, globs and files
+
+    Outputs are named after the relative path without its extension, so inputs
+    that would share one (a/x.png and b/x.png, or x.png and x.jpg) get a short
+    hash of their full path appended instead of overwriting each other's results.
+    """
+    seen = set()
+    taken = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            root = item
+            paths = glob.glob(os.path.join(item, "**", "*"), recursive=True)
+        else:
+            root = None
+            paths = glob.glob(item, recursive=True) or [item]
+
+        for path in sorted(paths):
+            if Path(path).suffix.lower() not in IMAGE_EXTENSIONS or not os.path.isfile(path):
+                continue
+            path = os.path.abspath(path)
+            if path in seen:
+                continue
+            seen.add(path)
+            rel = os.path.relpath(path, os.path.abspath(root)) if root else os.path.basename(path)
+            stem = os.path.normcase(os.path.splitext(rel)[0])
+            if stem in taken:
+                rel_path = Path(rel)
+                suffix = hashlib.sha1(path.encode("utf-8")).hexdigest()[:8]
+                rel = str(rel_path.parent / f"{rel_path.stem}-{suffix}{rel_path.suffix}")
+                stem = os.path.normcase(os.path.splitext(rel)[0])
+            taken.add(stem)
+            yield path, rel
+
+
+def run_settings(options: dict) -> dict:
+    """The options a manifest record's results depend on, stored with it"""
+    settings = {key: options[key] for key in ("ops", "blur_strength", "caption_position", "enhance")}
+    settings["encoding"] = options["encoding"]._asdict()
+    return settings
+
+
+def load_finished(manifest_path: str, settings: dict) -> Set[str]:
+    """Inputs already processed successfully with these settings by a previous (possibly interrupted) run
+
+    Records made with other settings (or before settings were recorded) don't
+    count, so changing e.g. --ops or --blur-strength processes every image again.
+    """
+    finished = set()
+    if not os.path.exists(manifest_path):
+        return finished
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Half-written line from an interrupted run
+            if not record.get("error") and record.get("settings") == settings:
+                finished.add(record["input"])
+    return finished
+
+
+def _init_worker(index_path: str = None) -> None:
+    """Set up one worker process"""
+    global _editor, _index
+    # Each process handles one image at a time - OpenCV's own threads would just fight the pool
+    cv2.setNumThreads(1)
+    _editor = FreeScreenshotEditor(detection_workers=1)
+    _index = DedupIndex(index_path) if index_path else None
+
+
+def _output_path(out_dir: str, rel: str, operation: str, extension: str = "png") -> str:
+    """Where to save the result of operation for one input"""
+    rel_path = Path(rel)
+    path = Path(out_dir) / rel_path.parent / f"{rel_path.stem}_{operation}.{extension}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return str(path)
+
+
+def _output_key(operation: str, options: dict) -> str:
+    """Identifies a blur/enhance output by every setting it depends on (meme captions are random)"""
+    settings = options["blur_strength"] if operation == "blur" else options["enhance"]
+    return json.dumps([operation, settings, options["encoding"]])
+
+
+def _reuse_output(entry, operation: str, options: dict, rel: str, record: dict) -> bool:
+    """Copy the output an identical file already got, if any; returns whether it did"""
+    previous = entry.outputs.get(_output_key(operation, options)) if entry is not None else None
+    if not previous or not os.path.exists(previous):
+        return False
+    out_path = _output_path(options["out_dir"], rel, operation, Path(previous).suffix[1:])
+    if os.path.abspath(out_path) != os.path.abspath(previous):
+        shutil.copyfile(previous, out_path)
+    record["outputs"][operation] = out_path
+    record.setdefault("reused_outputs", []).append(operation)
+    return True
+
+
+class _FileSink(OutputSink):
+    """Writes output images under OUT_DIR and lists them in the record"""
+
+    def __init__(self, options: dict, rel: str, record: dict, index, file_hash: str, entry):
+        self.options = options
+        self.rel = rel
+        self.record = record
+        self.index = index
+        self.file_hash = file_hash
+        self.entry = entry
+
+    def _saved(self, operation: str, out_path: str) -> None:
+        self.record["outputs"][operation] = out_path
+        if self.index is not None and operation in ("blur", "enhance"):
+            self.index.update(self.file_hash, outputs={_output_key(operation, self.options): out_path})
+
+    def reuse(self, operation: str, record: dict) -> bool:
+        if not _reuse_output(self.entry, operation, self.options, self.rel, record):
+            return False
+        self._saved(operation, record["outputs"][operation])
+        return True
+
+    @contextmanager
+    def stream(self, operation: str) -> Iterator[BinaryIO]:
+        out_path = _output_path(self.options["out_dir"], self.rel, operation)
+        with open(out_path, "wb") as f:
+            yield f
+        self._saved(operation, out_path)
+
+    def save(self, operation: str, image: Image.Image) -> None:
+        encoding = self.options["encoding"]
+        out_path = _output_path(self.options["out_dir"], self.rel, operation, encoding.extension)
+        with open(out_path, "wb") as f:
+            f.write(encode_image(image, encoding))
+        self._saved(operation, out_path)
+
+
+def process_image(task: Tuple[str, str, dict]) -> dict:
+    """Run the selected operations on one image and return its manifest record"""
+    path, rel, options = task
+    record = {"input": path, "settings": run_settings(options), "outputs": {}, "timings": {}}
+    start = time.perf_counter()
+
+    try:
+        with (recording() if options.get("trace") else nullcontext()) as trace:
+            with open(path, "rb") as f:
+                data = f.read()
+            image = load_image(io.BytesIO(data))
+            features = ImageFeatures(image)
+            record["size"] = list(image.size)
+            # Identical files reuse stored outputs, near-duplicates reuse detection results
+            # (not for streamed captures, whose full-size analysis would break their memory bound)
+            index = _index if not needs_streaming(image) else None
+            file_hash = content_hash(data) if index is not None else None
+            entry = index.entry_for(_editor, image, features, file_hash) if index is not None else None
+            record["timings"]["load"] = round(time.perf_counter() - start, 4)
+
+            sink = _FileSink(options, rel, record, index, file_hash, entry)
+            run_operations(_editor, image, features, options["ops"], options, record, sink, index, file_hash)
+
+            if trace is not None:
+                record["spans"] = trace.to_dicts()
+
+    except Exception as e:
+        record["error"] = str(e)
+
+    record["timings"]["total"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def run_batch(inputs: List[str], out_dir: str, ops: List[str], workers: int = None,
+              blur_strength: int = 15, caption_position: str = "bottom",
+              manifest_path: str = None, chunksize: int = 4, sharpness: float = DEFAULT_SHARPNESS,
+              contrast: float = DEFAULT_CONTRAST, color: float = DEFAULT_COLOR,
+              trace: bool = False, encoding: EncodingOptions = EncodingOptions(),
+              index_path: str = None, use_index: bool = True) -> Dict[str, float]:
+    """Process every image under inputs with a worker pool and append results to the manifest
+
+    Results are also kept in a dedup index (default OUT_DIR/index.sqlite3), so
+    repeated and near-duplicate screenshots - in this run or later ones - reuse them.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(out_dir, MANIFEST_NAME)
+    index_path = (index_path or os.path.join(out_dir, INDEX_NAME)) if use_index else None
+    if index_path:
+        # Create the database once here rather than racing in every worker
+        DedupIndex(index_path).close()
+    workers = workers or os.cpu_count() or 1
+
+    options = {
+        "ops": ops,
+        "out_dir": out_dir,
+        "blur_strength": blur_strength,
+        "caption_position": caption_position,
+        "enhance": {"sharpness": sharpness, "contrast": contrast, "color": color},
+        "trace": trace,
+        "encoding": encoding,
+    }
+    # Settings go through JSON like the manifest does, so tuples and lists compare equal
+    finished = load_finished(manifest_path, json.loads(json.dumps(run_settings(options))))
+    images = list(find_images(inputs))
+    tasks = [(path, rel, options) for path, rel in images if path not in finished]
+
+    stats = {"skipped": len(images) - len(tasks), "processed": 0, "failed": 0, "reused": 0}
+    start = time.perf_counter()
+
+    # Only the parent writes the manifest, one flushed line per image, so a crash loses at most one record
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        with Pool(processes=workers, initializer=_init_worker, initargs=(index_path,)) as pool:
+            for record in pool.imap_unordered(process_image, tasks, chunksize=chunksize):
+                manifest.write(json.dumps(record) + "\n")
+                manifest.flush()
+                stats["processed"] += 1
+                if "reused_outputs" in record or record.get("dedup", {}).get("mode", "full") != "full":
+                    stats["reused"] += 1
+                if record.get("error"):
+                    stats["failed"] += 1
+                    print(f"❌ {record['input']}: {record['error']}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["images_per_sec"] = round(stats["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+    stats["images_per_sec_per_worker"] = round(stats["images_per_sec"] / workers, 2)
+    return stats
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Batch-process screenshots with the FREE Screenshot Editor")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("-o", "--out-dir", default="processed", help="Where to write processed images")
+    parser.add_argument("--ops", default="alt_text,blur",
+                        help=f"Comma-separated operations: {', '.join(OPERATIONS)}")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--blur-strength", type=int, default=15, help="Blur radius for privacy blur (1-30)")
+    parser.add_argument("--caption-position", choices=["bottom", "top"], default="bottom")
+    parser.add_argument("--sharpness", type=float, default=DEFAULT_SHARPNESS, help="Enhance sharpness factor")
+    parser.add_argument("--contrast", type=float, default=DEFAULT_CONTRAST, help="Enhance contrast factor")
+    parser.add_argument("--color", type=float, default=DEFAULT_COLOR, help="Enhance color factor")
+    parser.add_argument("--format", choices=list(FORMATS), default="PNG",
+                        help="Output format (huge streamed captures are always PNG)")
+    parser.add_argument("--compress-level", type=int, default=DEFAULT_PNG_COMPRESS_LEVEL,
+                        help="PNG compression, 0 (fast) - 9 (small)")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY, help="JPEG/WebP quality (1-100)")
+    parser.add_argument("--colors", type=int, default=None,
+                        help="Quantize PNG/lossless WebP output to this many colors (2-256)")
+    parser.add_argument("--manifest", default=None, help=f"JSONL manifest path (default: OUT_DIR/{MANIFEST_NAME})")
+    parser.add_argument("--index", default=None,
+                        help=f"Dedup index of earlier results (default: OUT_DIR/{INDEX_NAME})")
+    parser.add_argument("--no-index", action="store_true", help="Don't reuse or store results for duplicates")
+    parser.add_argument("--trace", action="store_true", help="Record per-stage timing spans in the manifest")
+    parser.add_argument("--chunksize", type=int, default=4, help="Images handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    args.ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = [op for op in args.ops if op not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown operation(s): {', '.join(unknown)}")
+    if args.colors is not None and not 2 <= args.colors <= 256:
+        parser.error("--colors must be between 2 and 256")
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    stats = run_batch(
+        args.inputs, args.out_dir, args.ops,
+        workers=args.workers,
+        blur_strength=args.blur_strength,
+        caption_position=args.caption_position,
+        manifest_path=args.manifest,
+        chunksize=args.chunksize,
+        sharpness=args.sharpness,
+        contrast=args.contrast,
+        color=args.color,
+        trace=args.trace,
+        encoding=EncodingOptions(args.format, args.compress_level, args.quality, args.colors),
+        index_path=args.index,
+        use_index=not args.no_index,
+    )
+    print(json.dumps(stats))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Benchmark suite for the screenshot editor on deterministic synthetic screenshots
+
+Example:
+    python benchmark.py --scenarios desktop,dark,4k --repeats 5 --output bench.json
+    python benchmark.py --output new.json --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+from editor import (FreeScreenshotEditor, ImageFeatures, add_text_to_image, enhance_image_quality, load_font,
+                    render_caption_layer)
+from instrumentation import current_rss
+
+# name -> (width, height, dark theme, UI scale)
+SCENARIOS = {
+    "desktop": (1920, 1080, False, 1.0),
+    "mobile": (430, 932, False, 1.0),
+    "dark": (1920, 1080, True, 1.0),
+    "long_scroll": (1080, 20000, False, 1.0),
+    "4k": (3840, 2160, False, 2.0),
+    "8k": (7680, 4320, False, 4.0),
+}
+DEFAULT_SCENARIOS = ["desktop", "mobile", "dark", "long_scroll", "4k"]
+
+WORDS = [
+    "invoice", "meeting", "project", "update", "status", "review", "account", "settings",
+    "profile", "message", "report", "deploy", "budget", "notes", "draft", "calendar",
+    "lorem", "ipsum", "dolor", "sit", "amet", "the", "and", "for", "with", "from",
+]
+CAPTION = "When the benchmark is more organized than your life"
+
+# How often the memory sampler reads RSS (seconds)
+RSS_SAMPLE_INTERVAL = 0.005
+
+
+def make_screenshot(scenario: str, seed: int = 0) -> Image.Image:
+    """Draw a deterministic, text-dense fake UI screenshot for scenario"""
+    width, height, dark, scale = SCENARIOS[scenario]
+    rng = random.Random(f"{scenario}-{seed}")
+
+    background = (30, 30, 34) if dark else (248, 248, 250)
+    text_color = (220, 220, 225) if dark else (20, 20, 25)
+    panel_color = (45, 45, 52) if dark else (232, 234, 240)
+    accents = [(66, 133, 244), (52, 168, 83), (234, 67, 53), (251, 188, 5)]
+
+    image = Image.new("RGB", (width, height), background)
+    draw = ImageDraw.Draw(image)
+    font = load_font(int(16 * scale))
+    line_height = int(24 * scale)
+
+    # Title bar and (on wide layouts) a sidebar
+    draw.rectangle((0, 0, width, int(48 * scale)), fill=rng.choice(accents))
+    draw.text((int(16 * scale), int(12 * scale)), "Inbox - user@example.com", fill="white", font=font)
+    content_x = int(16 * scale)
+    if width >= 1000:
+        sidebar_width = int(220 * scale)
+        draw.rectangle((0, int(48 * scale), sidebar_width, height), fill=panel_color)
+        for y in range(int(64 * scale), height, line_height * 2):
+            draw.text((int(16 * scale), y), rng.choice(WORDS).title(), fill=text_color, font=font)
+        content_x = sidebar_width + int(24 * scale)
+
+    # Paragraphs of text with emails/phone numbers, buttons and image blocks
+    y = int(64 * scale)
+    while y < height - line_height:
+        block = rng.random()
+        if block < 0.08:
+            box_height = int(rng.randint(80, 200) * scale)
+            draw.rectangle((content_x, y, min(width - content_x // 4, content_x + int(400 * scale)), y + box_height),
+                           fill=tuple(rng.randint(60, 200) for _ in range(3)))
+            y += box_height + line_height
+        elif block < 0.15:
+            draw.rounded_rectangle((content_x, y, content_x + int(120 * scale), y + int(32 * scale)),
+                                   radius=int(6 * scale), fill=rng.choice(accents))
+            draw.text((content_x + int(16 * scale), y + int(6 * scale)), "Submit", fill="white", font=font)
+            y += int(48 * scale)
+        else:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(4, 14))]
+            if rng.random() < 0.2:
+                words.append(f"{rng.choice(WORDS)}{rng.randint(1, 99)}@example.com")
+            if rng.random() < 0.1:
+                words.append(f"+1 555-{rng.randint(1000, 9999)}")
+            draw.text((content_x, y), " ".join(words), fill=text_color, font=font)
+            y += line_height
+
+    return image
+
+
+def _benchmarks() -> Dict[str, Callable[[Image.Image], object]]:
+    """Public operations to time; each call starts cold (fresh editor, features and caption caches)
+
+    add_text_to_image_cached is the exception: it times a repeated caption,
+    which only pastes the cached caption layer.
+    """
+    def editor_call(method: str, *args):
+        def run(image):
+            return getattr(FreeScreenshotEditor(), method)(image, *args, features=ImageFeatures(image))
+        return run
+
+    def add_text_cold(image):
+        render_caption_layer.cache_clear()
+        load_font.cache_clear()
+        return add_text_to_image(image, CAPTION, "bottom")
+
+    return {
+        "detect_text_regions": editor_call("detect_text_regions"),
+        "detect_sensitive_info_free": editor_call("detect_sensitive_info_free"),
+        "apply_smart_blur": editor_call("apply_smart_blur", 15),
+        "generate_alt_text_free": editor_call("generate_alt_text_free"),
+        "generate_meme_caption_free": editor_call("generate_meme_caption_free"),
+        "add_text_to_image": add_text_cold,
+        "add_text_to_image_cached": lambda image: add_text_to_image(image, CAPTION, "bottom"),
+        "enhance_image_quality": enhance_image_quality,
+    }
+
+
+class _RSSSampler:
+    """Track the highest RSS seen while a block runs, from a background thread"""
+
+    def __init__(self):
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            rss = current_rss()
+            if rss is not None:
+                self.peak = rss if self.peak is None else max(self.peak, rss)
+            self._stop.wait(RSS_SAMPLE_INTERVAL)
+
+    def __enter__(self) -> "_RSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def measure(fn: Callable[[Image.Image], object], image: Image.Image, repeats: int, warmup: int = 1) -> dict:
+    """Latency percentiles (ms) and peak memory (bytes) of fn(image)"""
+    for _ in range(warmup):
+        fn(image)
+
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # Memory is measured in a separate run so tracing doesn't skew the timings
+    baseline_rss = current_rss()
+    tracemalloc.start()
+    with _RSSSampler() as sampler:
+        fn(image)
+    python_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_peak_delta = None
+    if sampler.peak is not None and baseline_rss is not None:
+        rss_peak_delta = max(0, sampler.peak - baseline_rss)
+
+    latencies = np.array(latencies)
+    return {
+        "repeats": repeats,
+        "min_ms": round(float(latencies.min()), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p90_ms": round(float(np.percentile(latencies, 90)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        # NumPy/Python allocations (tracemalloc does not see Pillow's own buffers)
+        "python_peak_bytes": python_peak,
+        # Process-wide RSS growth, sampled - includes Pillow and OpenCV
+        "rss_peak_delta_bytes": rss_peak_delta,
+    }
+
+
+def run_benchmarks(scenarios: List[str], functions: Optional[List[str]] = None, repeats: int = 5,
+                   seed: int = 0) -> dict:
+    """Time every selected function on every selected scenario"""
+    benchmarks = _benchmarks()
+    functions = functions or list(benchmarks)
+
+    results = []
+    for scenario in scenarios:
+        image = make_screenshot(scenario, seed)
+        for name in functions:
+            row = {"scenario": scenario, "function": name, "width": image.size[0], "height": image.size[1]}
+            row.update(measure(benchmarks[name], image, repeats))
+            results.append(row)
+            print(f"{scenario:>12} {name:<28} p50 {row['p50_ms']:>10.1f} ms", file=sys.stderr)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "pillow": PIL.__version__,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 1.2) -> List[dict]:
+    """Per-benchmark p50 ratio against a baseline run; ratio > threshold is a regression"""
+    previous = {(row["scenario"], row["function"]): row for row in baseline.get("results", [])}
+    comparison = []
+    for row in current["results"]:
+        old = previous.get((row["scenario"], row["function"]))
+        if old is None or not old["p50_ms"]:
+            continue
+        ratio = row["p50_ms"] / old["p50_ms"]
+        comparison.append({
+            "scenario": row["scenario"],
+            "function": row["function"],
+            "baseline_p50_ms": old["p50_ms"],
+            "p50_ms": row["p50_ms"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > threshold,
+        })
+    return comparison
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the FREE Screenshot Editor")
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help=f"Comma-separated scenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument("--functions", default=None, help="Comma-separated functions to time (default: all)")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic screenshots")
+    parser.add_argument("--output", default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 ratio that counts as a regression")
+    parser.add_argument("--save-images", default=None, help="Also save the synthetic screenshots to this folder")
+    args = parser.parse_args(argv)
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    if args.functions:
+        args.functions = [f.strip() for f in args.functions.split(",") if f.strip()]
+        unknown = [f for f in args.functions if f not in _benchmarks()]
+        if unknown:
+            parser.error(f"unknown function(s): {', '.join(unknown)}")
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+
+    if args.save_images:
+        os.makedirs(args.save_images, exist_ok=True)
+        for scenario in args.scenarios:
+            make_screenshot(scenario, args.seed).save(os.path.join(args.save_images, f"{scenario}.png"))
+
+    report = run_benchmarks(args.scenarios, args.functions, args.repeats, args.seed)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.threshold)
+        regressions = sum(row["regression"] for row in report["comparison"])
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
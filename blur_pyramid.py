@@ -0,0 +1,170 @@
+"""Precomputed blur levels for instant blur-strength previews
+
+Blurring is the slow part of the privacy blur, and the detected regions do not
+depend on the strength. BlurPyramid blurs the masked part of an image at a few
+fixed radii (each one the first time it is needed); any strength in between is
+a weighted blend of the two nearest levels, which takes milliseconds even on 4K.
+
+A blend only looks like a blur of that strength, so it is meant for previews
+while the slider moves - results people keep come from an exact blur.
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from PIL import Image, ImageFilter
+
+from instrumentation import span, traced
+from jobs import Job
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# Radii blurred up front; the slider's 1-30 range is blended between them. Starting at
+# the slider's minimum means a blend never mixes in unblurred pixels.
+BLUR_RADII = (1, 2, 4, 8, 15, 30)
+
+
+class BlurPyramid:
+    """Blurred copies of the masked area of one image at several radii"""
+
+    def __init__(self, image: Image.Image, mask: np.ndarray, radii: Sequence[int] = BLUR_RADII):
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGB")
+        self.image = image
+        self.radii = tuple(sorted(radii))
+        self.box = self._mask_box(mask, image.size, 3 * self.radii[-1])
+        self._levels: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._precompute_job = None
+        if self.box is None:
+            return
+
+        # Every level shares one crop with room for the widest blur to spread
+        x1, y1, x2, y2 = self.box
+        self._crop = image.crop(self.box)
+        self._mask = Image.fromarray(mask[y1:y2, x1:x2], mode="L")
+
+    @staticmethod
+    def _mask_box(mask: np.ndarray, size: Tuple[int, int], margin: int) -> Optional[Tuple[int, int, int, int]]:
+        """Bounding box of the mask grown by margin (None if the mask is empty)"""
+        rows = np.flatnonzero(mask.any(axis=1))
+        if len(rows) == 0:
+            return None
+        cols = np.flatnonzero(mask.any(axis=0))
+        width, height = size
+        return (
+            max(0, int(cols[0]) - margin),
+            max(0, int(rows[0]) - margin),
+            min(width, int(cols[-1]) + 1 + margin),
+            min(height, int(rows[-1]) + 1 + margin),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Memory the levels take once all are blurred (for cache accounting)"""
+        if self.box is None:
+            return 0
+        width, height = self._crop.size
+        return width * height * len(self._crop.getbands()) * len(self.radii)
+
+    def _blur(self, radius: int) -> np.ndarray:
+        """The cropped area with the mask blurred at radius"""
+        # Levels are stored already composited through the mask: pixels outside it are
+        # identical in every level, so blending two levels leaves them untouched
+        with span("blur.level", radius=radius, pixels=self._crop.size[0] * self._crop.size[1]):
+            level = self._crop.copy()
+            level.paste(self._crop.filter(ImageFilter.GaussianBlur(radius=radius)), (0, 0), self._mask)
+            return np.asarray(level)
+
+    def levels(self, *radii: int) -> Tuple[np.ndarray, ...]:
+        """Blurred levels for radii, computing any that are missing"""
+        if all(radius in self._levels for radius in radii):
+            return tuple(self._levels[radius] for radius in radii)
+        with self._lock:
+            missing = [radius for radius in radii if radius not in self._levels]
+            if len(missing) > 1:
+                # Pillow releases the GIL while blurring, so levels are built in parallel
+                with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                    self._levels.update(zip(missing, pool.map(self._blur, missing)))
+            elif missing:
+                self._levels[missing[0]] = self._blur(missing[0])
+            return tuple(self._levels[radius] for radius in radii)
+
+    @property
+    def complete(self) -> bool:
+        """True once every level is blurred"""
+        return self.box is None or len(self._levels) == len(self.radii)
+
+    def precompute(self) -> "BlurPyramid":
+        """Blur every remaining level now so that no later strength has to wait
+
+        Levels are blurred one at a time, so this takes a single thread and a
+        render() needing a level only waits for the one being blurred.
+        """
+        if self.box is not None:
+            for radius in self.radii:
+                self.levels(radius)
+        return self
+
+    def precompute_in_background(self, submit: Callable[[Callable[[], object]], Optional[Job]]) -> None:
+        """Blur the remaining levels as jobs handed to submit (e.g. JobQueue.submit_background)
+
+        One level per job, so a worker busy warming the pyramid is free again
+        after a single blur. submit returns the Job, or None if it could not be
+        queued; nothing is submitted while a job is queued or running, and a
+        cancelled one is submitted again on the next call.
+        """
+        with self._lock:
+            job = self._precompute_job
+            if self.complete or (job is not None and not job.done()):
+                return
+            self._precompute_job = submit(lambda: self._precompute_next(submit))
+
+    def _precompute_next(self, submit: Callable[[Callable[[], object]], Optional[Job]]) -> None:
+        """Blur the next missing level, then queue the one after it"""
+        missing = [radius for radius in self.radii if radius not in self._levels]
+        if missing:
+            self.levels(missing[0])
+        with self._lock:
+            # This job is finishing, so it doesn't block the next one
+            self._precompute_job = None
+        self.precompute_in_background(submit)
+
+    def _neighbours(self, blur_strength: float) -> Tuple[float, Tuple[int, ...]]:
+        """blur_strength clamped to the levels' range, and the level(s) it is blended from"""
+        radius = min(max(blur_strength, self.radii[0]), self.radii[-1])
+        upper = next(i for i, r in enumerate(self.radii) if r >= radius)
+        if self.radii[upper] == radius:
+            return radius, (self.radii[upper],)
+        return radius, (self.radii[upper - 1], self.radii[upper])
+
+    def ready(self, blur_strength: float) -> bool:
+        """True if render(blur_strength) needs no blurring (only a blend)"""
+        return self.box is None or all(radius in self._levels for radius in self._neighbours(blur_strength)[1])
+
+    def blend(self, blur_strength: float) -> np.ndarray:
+        """Pixels of the cropped area blurred by about blur_strength"""
+        radius, neighbours = self._neighbours(blur_strength)
+        if len(neighbours) == 1:
+            return self.levels(radius)[0]
+
+        low, high = neighbours
+        weight = (radius - low) / (high - low)
+        low_level, high_level = self.levels(low, high)
+        return cv2.addWeighted(low_level, 1 - weight, high_level, weight, 0)
+
+    @traced("blur.render")
+    def render(self, blur_strength: float) -> Image.Image:
+        """Preview of the image with the masked area blurred by about blur_strength"""
+        if self.box is None:
+            return self.image.copy()
+        blurred = Image.fromarray(self.blend(blur_strength), mode=self.image.mode)
+        if self.box == (0, 0) + self.image.size:
+            return blurred
+        result = self.image.copy()
+        result.paste(blurred, self.box[:2])
+        return result
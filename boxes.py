@@ -0,0 +1,229 @@
+"""Array-backed text boxes with a grid index for fast region queries
+
+MSER finds thousands of boxes on a dense page (one per glyph or word).
+TextBoxes keeps them as one (N, 4) int32 array of (x1, y1, x2, y2) instead of
+a list of tuples, and answers the questions the rest of the editor asks -
+which boxes touch this rectangle, which have their centre in these changed
+areas, how they group into text lines, how dense the text is where - with
+NumPy operations rather than Python loops. Rectangle queries go through a
+uniform grid built on first use.
+
+It still behaves like the old list of tuples: len(), iteration and indexing
+give (x1, y1, x2, y2) tuples, so callers that just loop over boxes keep working.
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+Box = Tuple[int, int, int, int]
+
+# Side of the index grid cells, in pixels (a bit bigger than a line of UI text)
+GRID_CELL_SIZE = 64
+
+
+class TextBoxes(Sequence):
+    """Immutable set of (x1, y1, x2, y2) boxes with vectorized spatial queries"""
+
+    def __init__(self, boxes: Union["TextBoxes", np.ndarray, Iterable[Box]] = (),
+                 cell_size: int = GRID_CELL_SIZE):
+        if isinstance(boxes, TextBoxes):
+            array = boxes.array
+        else:
+            array = np.asarray(boxes if isinstance(boxes, np.ndarray) else list(boxes), dtype=np.int32)
+            array = np.ascontiguousarray(array.reshape(-1, 4), dtype=np.int32)
+            array.flags.writeable = False
+        self.array = array
+        self.cell_size = cell_size
+        # Grid index: boxes of grid cell i are _cell_boxes[_cell_starts[i]:_cell_starts[i + 1]]
+        self._grid_cols = 0
+        self._grid_rows = 0
+        self._cell_starts = None
+        self._cell_boxes = None
+
+    @classmethod
+    def of(cls, boxes) -> "TextBoxes":
+        """boxes as TextBoxes (itself if it already is)"""
+        return boxes if isinstance(boxes, cls) else cls(boxes)
+
+    @classmethod
+    def concat(cls, parts: Iterable[Union["TextBoxes", np.ndarray, Iterable[Box]]]) -> "TextBoxes":
+        arrays = [cls.of(part).array for part in parts]
+        return cls(np.concatenate(arrays) if arrays else ())
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __iter__(self) -> Iterator[Box]:
+        return map(tuple, self.array.tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return tuple(self.array[index].tolist())
+        return TextBoxes(self.array[index], self.cell_size)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (TextBoxes, list, tuple, np.ndarray)):
+            return NotImplemented
+        return np.array_equal(self.array, TextBoxes.of(other).array)
+
+    def __repr__(self) -> str:
+        return f"TextBoxes({len(self)} boxes)"
+
+    def __getstate__(self) -> dict:
+        # The grid is cheap to rebuild, so it isn't pickled (e.g. to batch workers)
+        return {"array": self.array, "cell_size": self.cell_size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["array"], state["cell_size"])
+
+    @property
+    def nbytes(self) -> int:
+        index = 0 if self._cell_starts is None else self._cell_starts.nbytes + self._cell_boxes.nbytes
+        return self.array.nbytes + index
+
+    def tolist(self) -> List[List[int]]:
+        """JSON-friendly [[x1, y1, x2, y2], ...]"""
+        return self.array.tolist()
+
+    def offset(self, dx: int, dy: int) -> "TextBoxes":
+        """The same boxes moved by (dx, dy)"""
+        return TextBoxes(self.array + np.array([dx, dy, dx, dy], dtype=np.int32), self.cell_size)
+
+    def centers_in(self, rects: Iterable[Box]) -> np.ndarray:
+        """Bool mask of boxes whose centre lies inside any of rects (left/top edges inclusive)"""
+        rects = np.asarray(list(rects), dtype=np.int64).reshape(-1, 4)
+        if len(rects) == 0 or len(self) == 0:
+            return np.zeros(len(self), dtype=bool)
+        # Doubled coordinates keep the centres in integers
+        cx = (self.array[:, 0].astype(np.int64) + self.array[:, 2])[:, None]
+        cy = (self.array[:, 1].astype(np.int64) + self.array[:, 3])[:, None]
+        inside = (2 * rects[:, 0] <= cx) & (cx < 2 * rects[:, 2]) & (2 * rects[:, 1] <= cy) & (cy < 2 * rects[:, 3])
+        return inside.any(axis=1)
+
+    def _build_grid(self) -> None:
+        """Bucket every box into each grid cell it overlaps (sorted by cell, CSR style)"""
+        size = self.cell_size
+        boxes = self.array.astype(np.int64)
+        gx1, gy1 = np.maximum(boxes[:, 0] // size, 0), np.maximum(boxes[:, 1] // size, 0)
+        gx2 = np.maximum((boxes[:, 2] - 1) // size, gx1)
+        gy2 = np.maximum((boxes[:, 3] - 1) // size, gy1)
+        self._grid_cols = int(gx2.max()) + 1 if len(boxes) else 1
+        self._grid_rows = int(gy2.max()) + 1 if len(boxes) else 1
+
+        # One (box, cell) pair per cell each box covers
+        spans_x = gx2 - gx1 + 1
+        counts = spans_x * (gy2 - gy1 + 1)
+        box_ids = np.repeat(np.arange(len(boxes)), counts)
+        k = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = gx1[box_ids] + k % spans_x[box_ids]
+        cell_y = gy1[box_ids] + k // spans_x[box_ids]
+        cells = cell_y * self._grid_cols + cell_x
+
+        order = np.argsort(cells, kind="stable")
+        self._cell_boxes = box_ids[order]
+        self._cell_starts = np.searchsorted(cells[order], np.arange(self._grid_rows * self._grid_cols + 1))
+
+    def query(self, rect: Box) -> np.ndarray:
+        """Indices (ascending) of the boxes that overlap rect"""
+        x1, y1, x2, y2 = rect
+        if len(self) == 0 or x2 <= x1 or y2 <= y1:
+            return np.empty(0, dtype=np.int64)
+        size = self.cell_size
+        if self._cell_starts is None:
+            self._build_grid()
+        # Clamped to the grid at both ends: boxes left of/above the image are bucketed into its first
+        # column/row, boxes can't reach past the last one
+        gx1, gx2 = (min(max(0, x // size), self._grid_cols - 1) for x in (x1, x2 - 1))
+        gy1, gy2 = (min(max(0, y // size), self._grid_rows - 1) for y in (y1, y2 - 1))
+
+        if (gx2 - gx1 + 1) * (gy2 - gy1 + 1) >= len(self):
+            # A rect covering more cells than there are boxes: checking every box is cheaper
+            candidates = np.arange(len(self))
+        else:
+            cells = (np.arange(gy1, gy2 + 1)[:, None] * self._grid_cols + np.arange(gx1, gx2 + 1)).ravel()
+            starts, ends = self._cell_starts[cells], self._cell_starts[cells + 1]
+            lengths = ends - starts
+            # Concatenate the cells' slices of _cell_boxes without a loop
+            slots = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(int(lengths.sum()))
+            candidates = np.unique(self._cell_boxes[slots])
+
+        boxes = self.array[candidates]
+        hit = (boxes[:, 0] < x2) & (boxes[:, 2] > x1) & (boxes[:, 1] < y2) & (boxes[:, 3] > y1)
+        return candidates[hit]
+
+    def within(self, rect: Box) -> "TextBoxes":
+        """The boxes that overlap rect"""
+        return self[self.query(rect)]
+
+    def count_in(self, rect: Box) -> int:
+        """Number of boxes that overlap rect"""
+        return len(self.query(rect))
+
+    def lines(self, max_gap: Optional[int] = None) -> Tuple[np.ndarray, "TextBoxes"]:
+        """Cluster boxes into text lines; returns (line number of each box, bounds of each line)
+
+        Boxes whose vertical centres are within half a typical box height of
+        each other share a row, and a row is split where the horizontal gap
+        exceeds max_gap (default: twice the typical box height), so columns
+        of text stay separate lines.
+        """
+        n = len(self)
+        if n == 0:
+            return np.empty(0, dtype=np.int64), TextBoxes()
+        boxes = self.array.astype(np.int64)
+        line_height = max(1, int(np.median(boxes[:, 3] - boxes[:, 1])))
+        max_gap = 2 * line_height if max_gap is None else max_gap
+
+        # Rows: sort by (doubled) vertical centre and break where consecutive centres are far apart
+        centers = boxes[:, 1] + boxes[:, 3]
+        order = np.argsort(centers, kind="stable")
+        rows = np.concatenate([[0], np.cumsum(np.diff(centers[order]) > line_height)])
+        # Within a row, left to right
+        by_x = np.lexsort((boxes[order, 0], rows))
+        order, rows = order[by_x], rows[by_x]
+
+        # Right edge reached so far in the row; the row offset stops the running max leaking between rows
+        x1, x2 = boxes[order, 0], boxes[order, 2]
+        row_offset = rows * (int(boxes[:, 2].max()) + max_gap + 1)
+        reach = np.maximum.accumulate(x2 + row_offset) - row_offset
+        starts_line = np.ones(n, dtype=bool)
+        starts_line[1:] = (rows[1:] != rows[:-1]) | (x1[1:] > reach[:-1] + max_gap)
+
+        labels = np.empty(n, dtype=np.int64)
+        labels[order] = np.cumsum(starts_line) - 1
+        starts = np.flatnonzero(starts_line)
+        ordered = boxes[order]
+        bounds = np.column_stack([
+            np.minimum.reduceat(ordered[:, 0], starts),
+            np.minimum.reduceat(ordered[:, 1], starts),
+            np.maximum.reduceat(ordered[:, 2], starts),
+            np.maximum.reduceat(ordered[:, 3], starts),
+        ])
+        return labels, TextBoxes(bounds, self.cell_size)
+
+    def density(self, size: Tuple[int, int], cell_size: Optional[int] = None) -> np.ndarray:
+        """(rows, cols) heatmap of how many boxes overlap each cell_size square of an image of size"""
+        width, height = size
+        cell_size = cell_size or self.cell_size
+        rows, cols = -(-height // cell_size), -(-width // cell_size)
+        boxes = self.array.astype(np.int64)
+        boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+        gx1 = np.clip(boxes[:, 0] // cell_size, 0, cols)
+        gy1 = np.clip(boxes[:, 1] // cell_size, 0, rows)
+        gx2 = np.clip((boxes[:, 2] - 1) // cell_size + 1, 0, cols)
+        gy2 = np.clip((boxes[:, 3] - 1) // cell_size + 1, 0, rows)
+        # Mark each box's cell range at its corners; two running sums fill the ranges in
+        corners = np.zeros((rows + 1, cols + 1), dtype=np.int64)
+        np.add.at(corners, (gy1, gx1), 1)
+        np.add.at(corners, (gy1, gx2), -1)
+        np.add.at(corners, (gy2, gx1), -1)
+        np.add.at(corners, (gy2, gx2), 1)
+        return corners.cumsum(axis=0).cumsum(axis=1)[:rows, :cols]
@@ -0,0 +1,414 @@
+"""Perceptual-hash index of processed screenshots, stored on disk in SQLite
+
+Screenshot folders are full of near-duplicates: the same screen captured again
+with only the clock or a notification changed. Every processed image is stored
+with a 64-bit dHash, a coarse grayscale signature and its results (text boxes,
+sensitive areas, alt text, output files). A new image is looked up by dHash; if
+a near-duplicate exists, comparing signatures shows which tiles changed, and
+only those tiles go through text detection again - none at all for an
+unchanged screen.
+
+    with DedupIndex("index.sqlite3") as index:
+        result = index.detect_sensitive_info(editor, image, features, content_hash)
+        print(result.mode, result.changed_fraction)
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from boxes import Box, TextBoxes
+from instrumentation import span, traced
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+DEFAULT_DB_PATH = "screenshot_index.sqlite3"
+# Entries kept; the least recently used beyond this are pruned
+DEFAULT_MAX_ENTRIES = 10_000
+# Entries not used for this long (seconds) are pruned
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+# dHash compares neighbouring pixels of a 9x8 thumbnail -> 64 bits
+HASH_BITS = 64
+# Hashes are indexed as HASH_BANDS 16-bit bands; two hashes at most
+# HASH_BANDS - 1 bits apart always share a band, so no near-duplicate is missed
+HASH_BANDS = 4
+MAX_DISTANCE = HASH_BANDS - 1
+
+# The signature is a SIGNATURE_GRID x SIGNATURE_GRID grid of tiles, each shrunk to SIGNATURE_TILE pixels square
+SIGNATURE_GRID = 16
+SIGNATURE_TILE = 8
+# Gray levels a signature pixel may move (re-encoding noise) before its tile counts as changed
+TILE_TOLERANCE = 4
+# With more of the screen changed than this, detecting from scratch is cheaper
+MAX_CHANGED_FRACTION = 0.5
+# Pixels of context around changed tiles when detecting text again
+DETECTION_MARGIN = 32
+
+
+
+class IndexEntry(NamedTuple):
+    """What the index remembers about one processed image"""
+
+    content_hash: str
+    size: Tuple[int, int]
+    dhash: int
+    signature: np.ndarray
+    sensitive_info: Optional[dict] = None
+    alt_text: Optional[str] = None
+    outputs: Dict[str, str] = {}
+
+
+class DedupResult(NamedTuple):
+    """Outcome of DedupIndex.detect_sensitive_info"""
+
+    sensitive_info: dict
+    # "exact" (same file), "reused" (nothing changed), "incremental" (changed tiles re-detected) or "full"
+    mode: str
+    match: Optional[str] = None  # content hash of the near-duplicate that was reused
+    changed_fraction: float = 1.0
+
+
+@traced("dedup.signature")
+def signature(gray: np.ndarray) -> np.ndarray:
+    """Coarse grayscale thumbnail, SIGNATURE_TILE pixels per tile, for spotting changed tiles"""
+    side = SIGNATURE_GRID * SIGNATURE_TILE
+    # Area averaging: each signature pixel is the mean of the screen pixels it covers
+    return cv2.resize(gray, (side, side), interpolation=cv2.INTER_AREA)
+
+
+def dhash(sig: np.ndarray) -> int:
+    """64-bit difference hash: is each pixel of a 9x8 thumbnail brighter than its left neighbour?"""
+    thumb = cv2.resize(sig, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (thumb[:, 1:] > thumb[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits"""
+    return bin(a ^ b).count("1")
+
+
+def changed_tiles(old: np.ndarray, new: np.ndarray, tolerance: int = TILE_TOLERANCE) -> np.ndarray:
+    """SIGNATURE_GRID x SIGNATURE_GRID bool grid of tiles whose signature pixels moved more than tolerance"""
+    diff = np.abs(old.astype(np.int16) - new.astype(np.int16)) > tolerance
+    return diff.reshape(SIGNATURE_GRID, SIGNATURE_TILE, SIGNATURE_GRID, SIGNATURE_TILE).any(axis=(1, 3))
+
+
+def changed_rects(tiles: np.ndarray, size: Tuple[int, int]) -> List[Box]:
+    """Bounding boxes, in image pixels, of each connected group of changed tiles
+
+    tiles is a bool grid laid evenly over an image of size (width, height).
+    """
+    width, height = size
+    rows, cols = tiles.shape
+    _, _, stats, _ = cv2.connectedComponentsWithStats(tiles.astype(np.uint8), connectivity=8)
+    rects = []
+    for x, y, w, h, _ in stats[1:].tolist():  # Component 0 is the unchanged background
+        rects.append((x * width // cols, y * height // rows, (x + w) * width // cols, (y + h) * height // rows))
+    return rects
+
+
+@traced("dedup.redetect")
+def redetect_boxes(editor, image: Image.Image, old_boxes: TextBoxes, rects: List[Box],
+                   margin: int = DETECTION_MARGIN) -> TextBoxes:
+    """old_boxes with the text inside rects detected again
+
+    A box belongs to the rect its centre is in, so boxes crossing a rect's
+    edge are neither lost nor found twice.
+    """
+    width, height = image.size
+    old_boxes = TextBoxes.of(old_boxes)
+    parts = [old_boxes[~old_boxes.centers_in(rects)]]
+    for rect in rects:
+        x1, y1 = max(0, rect[0] - margin), max(0, rect[1] - margin)
+        x2, y2 = min(width, rect[2] + margin), min(height, rect[3] + margin)
+        found = editor.detect_text_regions(image.crop((x1, y1, x2, y2))).offset(x1, y1)
+        parts.append(found[found.centers_in([rect])])
+    return TextBoxes.concat(parts)
+
+
+def detection_settings(editor, image: Image.Image, features=None) -> dict:
+    """The editor options and matched layout that decide text detection, as stored with its results
+
+    Results stored under other settings are detected again rather than reused.
+    """
+    layout = editor.match_layout(image, features)
+    settings = {
+        "detection_mode": editor.detection_mode,
+        "max_detection_pixels": editor.max_detection_pixels,
+        "tile_size": editor.tile_size,
+        "tile_overlap": editor.tile_overlap,
+        "layout": layout.to_dict() if layout is not None else None,
+    }
+    # Round-tripped through JSON so it compares equal to the stored copy
+    return json.loads(json.dumps(settings))
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _bands(value: int) -> List[int]:
+    band_bits = HASH_BITS // HASH_BANDS
+    return [(value >> (band_bits * i)) & ((1 << band_bits) - 1) for i in range(HASH_BANDS)]
+
+
+def _stored_info(info: dict) -> dict:
+    """The JSON-safe part of a detect_sensitive_info_free result"""
+    stored = {
+        "found": bool(info["found"]),
+        "details": info["details"],
+        "locations": info["locations"],
+        "text_boxes": TextBoxes.of(info["text_boxes"]).tolist(),
+    }
+    if "areas" in info:
+        # A layout profile's sensitive areas
+        stored["areas"] = [list(area) for area in info["areas"]]
+    for key in ("area_text_boxes", "text_lines"):
+        if key in info:
+            stored[key] = int(info[key])
+    if "settings" in info:
+        stored["settings"] = info["settings"]
+    return stored
+
+
+class DedupIndex:
+    """SQLite-backed store of per-image results, looked up by perceptual hash
+
+    Safe to share between threads; separate processes can each open the same
+    file (SQLite serializes the writes). It holds at most max_entries entries,
+    none unused for longer than max_age seconds (None = no limit): older ones
+    are pruned whenever an entry is added.
+    """
+
+    _COLUMNS = "content_hash, width, height, dhash, signature, sensitive_info, alt_text, outputs"
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, max_distance: int = MAX_DISTANCE,
+                 max_changed_fraction: float = MAX_CHANGED_FRACTION,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, max_age: Optional[float] = DEFAULT_MAX_AGE):
+        if max_distance >= HASH_BANDS:
+            raise ValueError(f"max_distance must be below {HASH_BANDS} (the number of hash bands)")
+        self.path = path
+        self.max_distance = max_distance
+        self.max_changed_fraction = max_changed_fraction
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.counts = {"exact": 0, "reused": 0, "incremental": 0, "full": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            # WAL lets batch workers read while another one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            bands = "".join(f", band{i} INTEGER NOT NULL" for i in range(HASH_BANDS))
+            self._db.execute(f"""
+                CREATE TABLE IF NOT EXISTS images (
+                    content_hash TEXT PRIMARY KEY,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    dhash INTEGER NOT NULL,
+                    signature BLOB NOT NULL,
+                    sensitive_info TEXT,
+                    alt_text TEXT,
+                    outputs TEXT NOT NULL DEFAULT '{{}}',
+                    updated_at REAL NOT NULL{bands}
+                )""")
+            for i in range(HASH_BANDS):
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS images_band{i} ON images (width, height, band{i})")
+            self._db.execute("CREATE INDEX IF NOT EXISTS images_updated ON images (updated_at)")
+        self.prune()
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _entry(row) -> IndexEntry:
+        content_hash, width, height, hash_value, sig, info, alt_text, outputs = row
+        side = SIGNATURE_GRID * SIGNATURE_TILE
+        info = json.loads(info) if info else None
+        if info is not None:
+            info["text_boxes"] = TextBoxes(info["text_boxes"])
+        return IndexEntry(
+            content_hash, (width, height), hash_value % (1 << HASH_BITS),
+            np.frombuffer(sig, dtype=np.uint8).reshape(side, side),
+            info, alt_text, json.loads(outputs),
+        )
+
+    def prune(self) -> int:
+        """Delete entries beyond max_entries or older than max_age; returns how many"""
+        with self._lock, self._db:
+            removed = 0
+            if self.max_age is not None:
+                removed += self._db.execute("DELETE FROM images WHERE updated_at < ?",
+                                            (time.time() - self.max_age,)).rowcount
+            if self.max_entries is not None:
+                removed += self._db.execute(
+                    "DELETE FROM images WHERE content_hash IN "
+                    "(SELECT content_hash FROM images ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            return removed
+
+    def get(self, content_hash: str) -> Optional[IndexEntry]:
+        """The entry for exactly this file, if it was processed before"""
+        with self._lock:
+            row = self._db.execute(f"SELECT {self._COLUMNS} FROM images WHERE content_hash = ?",
+                                   (content_hash,)).fetchone()
+        return self._entry(row) if row else None
+
+    def find_similar(self, size: Tuple[int, int], hash_value: int,
+                     exclude: Optional[str] = None) -> Optional[Tuple[IndexEntry, int]]:
+        """Closest same-size entry within max_distance dHash bits, with its distance"""
+        bands = _bands(hash_value)
+        where = " OR ".join(f"band{i} = ?" for i in range(HASH_BANDS))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM images WHERE width = ? AND height = ? AND ({where}) "
+                "ORDER BY updated_at DESC",
+                (*size, *bands),
+            ).fetchall()
+        best = None
+        for row in rows:
+            if row[0] == exclude:
+                continue
+            distance = hamming(row[3] % (1 << HASH_BITS), hash_value)
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (row, distance)
+        return (self._entry(best[0]), best[1]) if best else None
+
+    def put(self, entry: IndexEntry, replace: bool = True) -> None:
+        """Store the entry for entry.content_hash (kept as it is if one exists and not replace)"""
+        info = json.dumps(_stored_info(entry.sensitive_info)) if entry.sensitive_info is not None else None
+        values = (
+            entry.content_hash, entry.size[0], entry.size[1], _to_signed(entry.dhash),
+            np.ascontiguousarray(entry.signature, dtype=np.uint8).tobytes(), info, entry.alt_text,
+            json.dumps(entry.outputs), time.time(), *_bands(entry.dhash),
+        )
+        columns = self._COLUMNS + ", updated_at, " + ", ".join(f"band{i}" for i in range(HASH_BANDS))
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock, self._db:
+            added = self._db.execute(f"{verb} INTO images ({columns}) VALUES ({', '.join('?' * len(values))})",
+                                     values).rowcount
+        if added:
+            self.prune()
+
+    def update(self, content_hash: str, sensitive_info: Optional[dict] = None, alt_text: Optional[str] = None,
+               outputs: Optional[Dict[str, str]] = None) -> None:
+        """Store results for an existing entry, leaving the others alone (outputs are merged)"""
+        changes = {"updated_at": time.time()}
+        if sensitive_info is not None:
+            changes["sensitive_info"] = json.dumps(_stored_info(sensitive_info))
+        if alt_text is not None:
+            changes["alt_text"] = alt_text
+        with self._lock, self._db:
+            row = self._db.execute("SELECT outputs FROM images WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is None:
+                raise KeyError(content_hash)
+            if outputs:
+                changes["outputs"] = json.dumps({**json.loads(row[0]), **outputs})
+            assignments = ", ".join(f"{column} = ?" for column in changes)
+            self._db.execute(f"UPDATE images SET {assignments} WHERE content_hash = ?",
+                             (*changes.values(), content_hash))
+
+    def entry_for(self, editor, image: Image.Image, features=None, content_hash: str = None) -> IndexEntry:
+        """The stored entry for this file, adding one without results first if it is new"""
+        entry = self.get(content_hash)
+        if entry is None:
+            sig = signature(editor.get_features(image, features).gray)
+            self.put(IndexEntry(content_hash, image.size, dhash(sig), sig), replace=False)
+            entry = self.get(content_hash)
+        return entry
+
+    def _fingerprint(self, editor, image: Image.Image, features, content_hash: Optional[str]):
+        """(stored entry or None, signature, dHash) for image"""
+        if content_hash is not None:
+            entry = self.entry_for(editor, image, features, content_hash)
+            return entry, entry.signature, entry.dhash
+        sig = signature(editor.get_features(image, features).gray)
+        return None, sig, dhash(sig)
+
+    @traced("dedup.detect")
+    def detect_sensitive_info(self, editor, image: Image.Image, features=None,
+                              content_hash: Optional[str] = None) -> DedupResult:
+        """editor.detect_sensitive_info_free, reusing the results of a near-duplicate
+
+        content_hash identifies the file (e.g. result_cache.content_hash of its
+        bytes) so the result is stored for later images; without it the index
+        is only searched. Results are only reused if they were detected with
+        the same detection_settings.
+        """
+        features = editor.get_features(image, features)
+        settings = detection_settings(editor, image, features)
+        entry, sig, hash_value = self._fingerprint(editor, image, features, content_hash)
+        if entry is not None and self._detected_with(entry, settings):
+            self._count("exact")
+            return DedupResult(entry.sensitive_info, "exact", content_hash, 0.0)
+
+        result = None
+        match = self.find_similar(image.size, hash_value, exclude=content_hash)
+        if match is not None and self._detected_with(match[0], settings):
+            previous = match[0]
+            tiles = changed_tiles(previous.signature, sig)
+            fraction = float(tiles.mean())
+            if fraction <= self.max_changed_fraction:
+                old_boxes = previous.sensitive_info["text_boxes"]
+                if fraction == 0:
+                    boxes, mode = old_boxes, "reused"
+                else:
+                    rects = changed_rects(tiles, image.size)
+                    with span("dedup.incremental", regions=len(rects), changed_fraction=round(fraction, 3)):
+                        boxes, mode = redetect_boxes(editor, image, old_boxes, rects), "incremental"
+                # Header/footer checks are cheap, so they always run on the new pixels
+                info = editor.detect_sensitive_info_free(image, features, text_boxes=boxes)
+                result = DedupResult(info, mode, previous.content_hash, fraction)
+
+        if result is None:
+            result = DedupResult(editor.detect_sensitive_info_free(image, features), "full")
+        self._count(result.mode)
+        if entry is not None:
+            self.update(content_hash, sensitive_info={**result.sensitive_info, "settings": settings})
+        return result
+
+    @staticmethod
+    def _detected_with(entry: IndexEntry, settings: dict) -> bool:
+        return entry.sensitive_info is not None and entry.sensitive_info.get("settings") == settings
+
+    def _count(self, mode: str) -> None:
+        with self._lock:
+            self.counts[mode] += 1
+
+    @traced("dedup.alt_text")
+    def generate_alt_text(self, editor, image: Image.Image, features=None,
+                          content_hash: Optional[str] = None) -> str:
+        """editor.generate_alt_text_free, reused for the same file or an unchanged screen"""
+        entry, sig, hash_value = self._fingerprint(editor, image, features, content_hash)
+        if entry is not None and entry.alt_text is not None:
+            return entry.alt_text
+
+        match = self.find_similar(image.size, hash_value, exclude=content_hash)
+        if match is not None and match[0].alt_text is not None and not changed_tiles(match[0].signature, sig).any():
+            alt_text = match[0].alt_text
+        else:
+            alt_text = editor.generate_alt_text_free(image, features)
+        if entry is not None:
+            self.update(content_hash, alt_text=alt_text)
+        return alt_text
@@ -0,0 +1,800 @@
+"""Image-processing core of the FREE Screenshot Editor (no Streamlit needed)
+
+Import FreeScreenshotEditor, add_text_to_image and enhance_image_quality from
+here in scripts, workers and tests; app.py is only the web front end. NumPy and
+OpenCV are imported on first use, so importing this module stays cheap.
+Errors are reported on the "screenshot_editor" logger.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from blur_pyramid import BlurPyramid
+from boxes import Box, TextBoxes
+from enhancement import DEFAULT_COLOR, DEFAULT_CONTRAST, DEFAULT_SHARPNESS, enhance_pixels
+from instrumentation import nbytes, span, traced
+from layouts import LayoutProfile, LayoutProfiles, default_layouts
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("screenshot_editor")
+
+# Rows copied at a time when converting a PIL image to NumPy
+PIXEL_STRIP_ROWS = 256
+
+# Header/footer bands (fraction of the height) flagged unless they're blank
+SENSITIVE_BAND = 0.15
+WHITESPACE_BRIGHTNESS = 240
+
+# boxes_to_mask draws up to this many boxes one by one, and sums more in strips of MASK_STRIP_ROWS rows
+MASK_RECTANGLE_BOXES = 64
+MASK_STRIP_ROWS = 256
+
+# OpenCV's default MSER area limits (in full-resolution pixels)
+MSER_MIN_AREA = 60
+MSER_MAX_AREA = 14400
+
+def _mser_bboxes(gray: np.ndarray, level: int = 0) -> np.ndarray:
+    """MSER bounding boxes (x, y, w, h) for one grayscale image or tile"""
+    mser = cv2.MSER_create()
+    # Keep the area limits meaning the same thing at every pyramid level
+    area_scale = 4 ** level
+    mser.setMinArea(max(1, MSER_MIN_AREA // area_scale))
+    mser.setMaxArea(max(2, MSER_MAX_AREA // area_scale))
+    _, bboxes = mser.detectRegions(gray)
+    return np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+
+def pyramid_level_for(pixels: int, max_pixels: Optional[int]) -> int:
+    """How many times to halve an image so it has at most max_pixels"""
+    level = 0
+    if max_pixels:
+        while pixels / (4 ** level) > max_pixels:
+            level += 1
+    return level
+
+def boxes_to_mask(boxes: List[Tuple[int, int, int, int]], width: int, height: int) -> np.ndarray:
+    """Rasterize the union of (x1, y1, x2, y2) boxes into a 0/255 mask
+    
+    A few boxes are filled in place by OpenCV. Many boxes go through a 2D
+    difference array over their bounding area, so the cost depends on that
+    area and not on how many (overlapping) boxes there are; it is summed
+    MASK_STRIP_ROWS rows at a time to keep the extra memory small.
+    """
+    mask = np.zeros((height, width), dtype=np.uint8)
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, width)
+    boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, height)
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+    if len(boxes) <= MASK_RECTANGLE_BOXES:
+        for x1, y1, x2, y2 in boxes.tolist():
+            cv2.rectangle(mask, (x1, y1), (x2 - 1, y2 - 1), 255, thickness=-1)
+        return mask
+    
+    # Only the area the boxes cover needs summing
+    left, top = int(boxes[:, 0].min()), int(boxes[:, 1].min())
+    right, bottom = int(boxes[:, 2].max()), int(boxes[:, 3].max())
+    boxes = boxes - [left, top, left, top]
+    area_width = right - left
+    for strip_top in range(0, bottom - top, MASK_STRIP_ROWS):
+        strip_bottom = min(bottom - top, strip_top + MASK_STRIP_ROWS)
+        strip = boxes[(boxes[:, 1] < strip_bottom) & (boxes[:, 3] > strip_top)]
+        x1, x2 = strip[:, 0], strip[:, 2]
+        y1 = np.maximum(strip[:, 1], strip_top) - strip_top
+        y2 = np.minimum(strip[:, 3], strip_bottom) - strip_top
+        rows, cols = strip_bottom - strip_top + 1, area_width + 1
+        # +1 at the top-left corner, -1 right of and below the box, +1 diagonally past it
+        diff = np.zeros((rows, cols), dtype=np.float32)
+        np.add.at(diff, (y1, x1), 1)
+        np.add.at(diff, (y1, x2), -1)
+        np.add.at(diff, (y2, x1), -1)
+        np.add.at(diff, (y2, x2), 1)
+        # The running 2D sum counts the boxes covering each pixel
+        covered = cv2.integral(diff[:-1, :-1], sdepth=cv2.CV_32F)[1:, 1:]
+        cv2.compare(covered, 0.5, cv2.CMP_GT, dst=mask[top + strip_top:top + strip_bottom, left:right])
+    return mask
+
+def normalize_mode(image: Image.Image) -> Image.Image:
+    """image as RGB, or RGBA if it has transparency - the two modes the pipeline works in
+    
+    Palette, grayscale, CMYK, 16-bit... uploads are converted once here instead
+    of in every step. Returns image itself if it is already RGB/RGBA.
+    """
+    if image.mode in ("RGB", "RGBA"):
+        return image
+    if image.mode in ("LA", "PA", "La") or "transparency" in image.info:
+        return image.convert("RGBA")
+    return image.convert("RGB")
+
+def pixel_array(image: Image.Image, strip_rows: int = PIXEL_STRIP_ROWS) -> np.ndarray:
+    """Read-only NumPy copy of image's pixels
+    
+    np.asarray(image) goes through a full-size bytes object first; copying
+    strip by strip fills one array directly, with no full-size temporary.
+    """
+    width, height = image.size
+    bands = len(image.getbands())
+    array = np.empty((height, width, bands) if bands > 1 else (height, width), dtype=np.uint8)
+    for y in range(0, height, strip_rows):
+        array[y:y + strip_rows] = np.asarray(image.crop((0, y, width, min(height, y + strip_rows))))
+    array.flags.writeable = False
+    return array
+
+def load_image(fp) -> Image.Image:
+    """Open and decode an uploaded file or path into the pipeline's working format"""
+    image = normalize_mode(Image.open(fp))
+    image.load()
+    return image
+
+class ImageFeatures:
+    """Per-image analysis data, computed lazily once and shared by every editor method"""
+    
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self.width, self.height = image.size
+        self._pyramid = None
+        self._mser_cache = {}
+    
+    @cached_property
+    def array(self) -> np.ndarray:
+        """Copy of the image pixels as a read-only RGB(A) NumPy array, shared by every analysis step"""
+        with span("features.array", pixels=self.width * self.height) as s:
+            array = pixel_array(normalize_mode(self.image))
+            s.set(allocated_bytes=array.nbytes)
+        return array
+    
+    @cached_property
+    def gray(self) -> np.ndarray:
+        """Grayscale version of the image"""
+        array = self.array
+        with span("features.gray", pixels=self.width * self.height) as s:
+            code = cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+            gray = cv2.cvtColor(array, code)
+            s.set(allocated_bytes=gray.nbytes)
+        return gray
+    
+    @cached_property
+    def brightness(self) -> float:
+        """Average brightness (0-255)"""
+        return float(np.mean(self.gray))
+    
+    @cached_property
+    def edges(self) -> np.ndarray:
+        """Canny edge map"""
+        gray = self.gray
+        with span("features.canny", pixels=self.width * self.height) as s:
+            edges = cv2.Canny(gray, 50, 150)
+            s.set(allocated_bytes=edges.nbytes)
+        return edges
+    
+    @cached_property
+    def edge_density(self) -> float:
+        """Fraction of pixels that are edges (complexity indicator)"""
+        return np.count_nonzero(self.edges) / (self.width * self.height)
+    
+    @cached_property
+    def unique_colors(self) -> int:
+        """Number of distinct colors in a 50x50 thumbnail"""
+        img_small = cv2.resize(self.array, (50, 50))
+        img_flat = np.ascontiguousarray(img_small[..., :3].reshape(-1, 3))
+        return len(np.unique(img_flat.view(np.dtype((np.void, img_flat.dtype.itemsize * 3)))))
+    
+    def gray_region(self, box: Tuple[int, int, int, int]) -> np.ndarray:
+        """Grayscale pixels of box (x1, y1, x2, y2) - converting only that area if gray isn't computed yet"""
+        x1, y1, x2, y2 = box
+        if "gray" in self.__dict__:
+            return self.gray[y1:y2, x1:x2]
+        if "array" in self.__dict__:
+            array = self.array[y1:y2, x1:x2]
+        else:
+            # Decoding just the area keeps layout matching cheap on streamed captures
+            array = np.asarray(normalize_mode(self.image.crop(box)))
+        return cv2.cvtColor(array, cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY)
+    
+    def gray_level(self, level: int) -> np.ndarray:
+        """Grayscale image halved level times (level 0 is full resolution)"""
+        if self._pyramid is None:
+            self._pyramid = [self.gray]
+        while len(self._pyramid) <= level:
+            self._pyramid.append(cv2.pyrDown(self._pyramid[-1]))
+        return self._pyramid[level]
+    
+    def mser_boxes(self, level: int = 0, tile_size: Optional[int] = None,
+                   tile_overlap: int = 64, workers: Optional[int] = None,
+                   region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        """MSER bounding boxes (x, y, w, h) in full-resolution coordinates
+        
+        level picks the pyramid level to detect on; tile_size splits it into
+        overlapping tiles that are processed in parallel. region (x1, y1, x2, y2)
+        restricts detection to that area - no pixels outside it are read.
+        """
+        key = (level, tile_size, tile_overlap, region)
+        if key in self._mser_cache:
+            return self._mser_cache[key]
+        
+        if region is None:
+            gray = self.gray_level(level)
+        else:
+            x1, y1 = max(0, region[0]), max(0, region[1])
+            gray = self.gray_region((x1, y1, min(self.width, region[2]), min(self.height, region[3])))
+            for _ in range(level):
+                gray = cv2.pyrDown(gray)
+        level_height, level_width = gray.shape
+        
+        with span("detect.mser", pixels=level_width * level_height, level=level) as s:
+            boxes = self._detect_mser(gray, level, tile_size, tile_overlap, workers)
+            s.set(regions=len(boxes))
+        
+        boxes = boxes * (2 ** level)
+        if region is not None:
+            boxes[:, 0] += x1
+            boxes[:, 1] += y1
+        self._mser_cache[key] = boxes
+        return boxes
+    
+    @staticmethod
+    def _detect_mser(gray: np.ndarray, level: int, tile_size: Optional[int],
+                     tile_overlap: int, workers: Optional[int]) -> np.ndarray:
+        """MSER boxes on one pyramid level, in that level's coordinates"""
+        level_height, level_width = gray.shape
+        
+        if tile_size and (level_width > tile_size or level_height > tile_size):
+            step = max(1, tile_size - tile_overlap)
+            # Skip trailing tiles that would lie entirely inside the previous one
+            origins = [
+                (x, y)
+                for y in range(0, level_height, step) if y == 0 or level_height - y > tile_overlap
+                for x in range(0, level_width, step) if x == 0 or level_width - x > tile_overlap
+            ]
+            
+            def detect_tile(origin):
+                x, y = origin
+                tile_boxes = _mser_bboxes(gray[y:y + tile_size, x:x + tile_size], level)
+                tile_boxes[:, 0] += x
+                tile_boxes[:, 1] += y
+                return tile_boxes
+            
+            # OpenCV releases the GIL, so threads run the tiles truly in parallel
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                tile_results = list(pool.map(detect_tile, origins))
+            boxes = np.concatenate(tile_results) if tile_results else np.empty((0, 4), dtype=np.int64)
+            # Regions inside the overlap are found by both neighbouring tiles
+            return np.unique(boxes, axis=0)
+        return _mser_bboxes(gray, level)
+
+class FreeScreenshotEditor:
+    """FREE Screenshot editor with local AI-like features (no API needed!)"""
+    
+    def __init__(self, detection_mode: str = "auto", max_detection_pixels: Optional[int] = 16_000_000,
+                 tile_size: int = 2048, tile_overlap: int = 64, detection_workers: Optional[int] = None,
+                 layouts: Optional[LayoutProfiles] = None):
+        """Initialize the editor - no API key needed!
+        
+        detection_mode controls text detection on big captures:
+        "full" (single full-resolution pass), "tiled" (full resolution in parallel tiles),
+        "pyramid" (downscaled to max_detection_pixels) or "auto" (pyramid + tiles).
+        Lowering max_detection_pixels makes detection faster but misses more small text.
+        layouts are the saved layout profiles to match screenshots against
+        (default: the layouts file, see layouts.py; pass LayoutProfiles() for none).
+        """
+        self.detection_mode = detection_mode
+        self.max_detection_pixels = max_detection_pixels
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.detection_workers = detection_workers
+        self.layouts = layouts
+        self._features = None
+        self._layout_match = None
+    
+    def get_features(self, image: Image.Image, features: Optional[ImageFeatures] = None) -> ImageFeatures:
+        """Return analysis data for image, reusing what was already computed"""
+        if features is not None and features.image is image:
+            return features
+        if self._features is None or self._features.image is not image:
+            self._features = ImageFeatures(image)
+        return self._features
+    
+    def match_layout(self, image: Image.Image,
+                     features: Optional[ImageFeatures] = None) -> Optional[LayoutProfile]:
+        """The saved layout profile image matches, if any"""
+        layouts = self.layouts if self.layouts is not None else default_layouts()
+        if not layouts:
+            return None
+        features = self.get_features(image, features)
+        if self._layout_match is None or self._layout_match[:2] != (features, layouts):
+            with span("detect.layout", profiles=len(layouts)):
+                self._layout_match = (features, layouts, layouts.match(features))
+        return self._layout_match[2]
+    
+    @traced("detect_text_regions")
+    def detect_text_regions(self, image: Image.Image, features: Optional[ImageFeatures] = None,
+                            detection_pixels: Optional[int] = None) -> TextBoxes:
+        """Detect text regions in image using OpenCV (FREE!) as (x1, y1, x2, y2) boxes
+        
+        detection_pixels is the size of the whole image when image is one band
+        of it, so every band is scanned at the pyramid level the whole image would be.
+        """
+        try:
+            features = self.get_features(image, features)
+            
+            # A known layout limits detection to its include areas, minus its exclude areas
+            layout = self.match_layout(image, features)
+            regions = layout.scan_areas() if layout is not None else [None]
+            
+            parts = []
+            for region in regions:
+                # Pick pyramid level and tiling for the size of the area
+                if detection_pixels is not None:
+                    pixels = detection_pixels
+                elif region is None:
+                    pixels = features.width * features.height
+                else:
+                    pixels = (region[2] - region[0]) * (region[3] - region[1])
+                level = 0
+                tile_size = None
+                if self.detection_mode in ("pyramid", "auto"):
+                    level = pyramid_level_for(pixels, self.max_detection_pixels)
+                if self.detection_mode in ("tiled", "auto"):
+                    tile_size = self.tile_size
+                
+                # Use MSER (Maximally Stable Extremal Regions) to detect text
+                parts.append(features.mser_boxes(level, tile_size, self.tile_overlap, self.detection_workers, region))
+            # Overlapping include areas find the same regions twice
+            if len(parts) == 1:
+                bboxes = parts[0]
+            else:
+                bboxes = np.unique(np.concatenate(parts), axis=0) if parts else np.empty((0, 4), dtype=np.int64)
+            
+            # Filter out very small regions and convert to (x1, y1, x2, y2)
+            x, y, w, h = bboxes.T
+            keep = (w > 20) & (h > 10)
+            boxes = np.column_stack([
+                x[keep],
+                y[keep],
+                np.minimum(x[keep] + w[keep], features.width),
+                np.minimum(y[keep] + h[keep], features.height),
+            ])
+            
+            # Only keep boxes centred where the layout allows
+            return TextBoxes(boxes) if layout is None else layout.restrict(boxes)
+            
+        except Exception as e:
+            logger.error(f"Error detecting text: {str(e)}")
+            return TextBoxes()
+    
+    @traced("generate_alt_text")
+    def generate_alt_text_free(self, image: Image.Image, features: Optional[ImageFeatures] = None) -> str:
+        """Generate alt text using image analysis (FREE - no API!)"""
+        try:
+            width, height = image.size
+            aspect_ratio = width / height
+            
+            # Analyze image properties (brightness, colors, edges)
+            features = self.get_features(image, features)
+            brightness = features.brightness
+            unique_colors = features.unique_colors
+            edge_density = features.edge_density
+            
+            # Generate description based on analysis
+            alt_text = "Screenshot showing "
+            
+            # Describe layout
+            if aspect_ratio > 1.5:
+                alt_text += "a wide horizontal interface "
+            elif aspect_ratio < 0.7:
+                alt_text += "a tall vertical layout "
+            else:
+                alt_text += "a standard rectangular interface "
+            
+            # Describe complexity
+            if edge_density > 0.1:
+                alt_text += "with detailed content and multiple elements"
+            elif edge_density > 0.05:
+                alt_text += "with moderate detail and various UI components"
+            else:
+                alt_text += "with clean, minimal design"
+            
+            # Describe brightness
+            if brightness > 200:
+                alt_text += ", featuring bright colors and high contrast"
+            elif brightness < 100:
+                alt_text += ", with dark theme or low lighting"
+            else:
+                alt_text += ", with balanced lighting"
+            
+            # Add color diversity info
+            if unique_colors > 1000:
+                alt_text += " and rich color palette."
+            elif unique_colors > 500:
+                alt_text += " and moderate color variety."
+            else:
+                alt_text += " and limited color scheme."
+            
+            return alt_text
+            
+        except Exception as e:
+            return f"Screenshot image with dimensions {image.size[0]}x{image.size[1]} pixels."
+    
+    @traced("detect_sensitive_info")
+    def detect_sensitive_info_free(self, image: Image.Image, features: Optional[ImageFeatures] = None,
+                                   text_boxes: Optional[List[Tuple[int, int, int, int]]] = None) -> dict:
+        """Detect potential sensitive areas using pattern recognition (FREE!)
+        
+        Pass text_boxes (e.g. reused from a near-duplicate screenshot) to skip text detection.
+        """
+        try:
+            features = self.get_features(image, features)
+            layout = self.match_layout(image, features)
+            
+            # Detect text regions
+            if text_boxes is None:
+                text_boxes = self.detect_text_regions(image, features)
+            elif layout is not None:
+                text_boxes = layout.restrict(text_boxes)
+            else:
+                text_boxes = TextBoxes.of(text_boxes)
+            
+            areas = self.sensitive_areas(image.size, lambda y1, y2: float(np.mean(features.gray[y1:y2])), layout)
+            return self.summarize_sensitive_info(image.size, areas, text_boxes)
+            
+        except Exception as e:
+            return {
+                "found": True,  # Conservative approach
+                "details": f"Unable to fully analyze - applying protective blur. Error: {str(e)}",
+                "locations": "entire image",
+                "text_boxes": TextBoxes()
+            }
+    
+    def sensitive_areas(self, size: Tuple[int, int], mean_gray: Callable[[int, int], float],
+                        layout: Optional[LayoutProfile] = None) -> Tuple[List[str], List[str], List[Box]]:
+        """Areas to blur whatever text is found in them, as (location names, details, boxes)
+        
+        These are a matching layout's blur areas, or else the header and footer
+        bands unless they are blank. mean_gray(y1, y2) is the mean brightness
+        of rows y1 to y2, so streamed captures can measure it band by band.
+        """
+        width, height = size
+        if layout is not None:
+            # A known layout says where the sensitive areas are - no need to guess
+            details = [f"{len(layout.blur)} known sensitive area(s) of the {layout.name} layout"] if layout.blur else []
+            return [f"{layout.name} layout"], details, [tuple(rect) for rect in layout.blur]
+        
+        names, details, boxes = [], [], []
+        if height > 100:
+            # Top area (often contains emails, names in headers)
+            top = (0, 0, width, int(height * SENSITIVE_BAND))
+            if mean_gray(top[1], top[3]) < WHITESPACE_BRIGHTNESS:  # Not just white space
+                names.append("top")
+                details.append("header area with potential personal info")
+                boxes.append(top)
+            
+            # Bottom area (often contains signatures, contact info)
+            bottom = (0, int(height * (1 - SENSITIVE_BAND)), width, height)
+            if mean_gray(bottom[1], bottom[3]) < WHITESPACE_BRIGHTNESS:  # Not just white space
+                names.append("bottom")
+                details.append("footer area with potential contact details")
+                boxes.append(bottom)
+        return names, details, boxes
+    
+    def summarize_sensitive_info(self, size: Tuple[int, int], areas: Tuple[List[str], List[str], List[Box]],
+                                 text_boxes: TextBoxes) -> dict:
+        """The detect_sensitive_info_free result for the sensitive_areas and text boxes of an image"""
+        width, height = size
+        names, details, boxes = areas
+        details = list(details)
+        
+        # Check for potential email patterns in filename or assume presence
+        # (This is a simplified approach since we can't do OCR without heavy libraries)
+        if len(text_boxes) > 5:  # Lots of text regions
+            details.append("multiple text regions that may contain sensitive data")
+        
+        # Check image dimensions for common sensitive screenshot types
+        if width > 800 and height > 600:  # Likely desktop screenshot
+            details.append("desktop screenshot that may show personal information")
+        elif width < 500:  # Likely mobile screenshot
+            details.append("mobile screenshot that may contain private messages or data")
+        
+        return {
+            "found": len(boxes) > 0 or len(text_boxes) > 3,
+            "details": ", ".join(details) if details else "Image analysis completed",
+            "locations": ", ".join(names) if names else "General content areas",
+            "text_boxes": text_boxes,
+            # Blurred along with the text boxes
+            "areas": [list(box) for box in boxes],
+            # Text regions inside those areas, and the text lines all the regions form
+            "area_text_boxes": sum(text_boxes.count_in(box) for box in boxes),
+            "text_lines": len(text_boxes.lines()[1]),
+        }
+    
+    @traced("blur_regions")
+    def blur_regions(self, image: Image.Image, boxes: List[Tuple[int, int, int, int]],
+                     blur_strength: int = 15, in_place: bool = False) -> Image.Image:
+        """Return image with the union of boxes blurred in a single pass
+        
+        Works on a copy unless in_place is set (for band windows and crops the caller no longer needs).
+        """
+        width, height = image.size
+        
+        # Blur once - only the part the boxes touch, plus room for the blur to spread
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, width)
+        boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, height)
+        boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+        if len(boxes) == 0:
+            return image if in_place else image.copy()
+        margin = 3 * blur_strength
+        x1 = max(0, int(boxes[:, 0].min()) - margin)
+        y1 = max(0, int(boxes[:, 1].min()) - margin)
+        x2 = min(width, int(boxes[:, 2].max()) + margin)
+        y2 = min(height, int(boxes[:, 3].max()) + margin)
+        
+        # Merge all (heavily overlapping) boxes into one mask covering just that area
+        with span("blur.mask", regions=len(boxes)) as s:
+            mask = boxes_to_mask(boxes - [x1, y1, x1, y1], x2 - x1, y2 - y1)
+            s.set(allocated_bytes=mask.nbytes)
+        
+        with span("blur.gaussian", pixels=(x2 - x1) * (y2 - y1), radius=blur_strength) as s:
+            # Header + footer bands often make that the whole image - then there's nothing to crop
+            region = image if (x1, y1, x2, y2) == (0, 0, width, height) else image.crop((x1, y1, x2, y2))
+            blurred = region.filter(ImageFilter.GaussianBlur(radius=blur_strength))
+            del region
+            s.set(allocated_bytes=nbytes(blurred))
+        
+        # Composite the blurred pixels through the mask (copying only now keeps the peak lower)
+        with span("blur.composite", pixels=(x2 - x1) * (y2 - y1)):
+            result = image if in_place else image.copy()
+            result.paste(blurred, (x1, y1), Image.fromarray(mask, mode="L"))
+        return result
+    
+    def sensitive_boxes(self, image: Image.Image, sensitive_info: dict) -> TextBoxes:
+        """Boxes to blur: detected text regions plus the sensitive areas (layout areas or header/footer)"""
+        width, height = image.size
+        areas = []
+        if "areas" in sensitive_info:
+            areas = sensitive_info["areas"]
+        else:
+            # Results stored before areas were recorded
+            if "top" in sensitive_info.get("locations", ""):
+                areas.append((0, 0, width, int(height * 0.15)))
+            if "bottom" in sensitive_info.get("locations", ""):
+                areas.append((0, int(height * 0.85), width, height))
+        return TextBoxes.concat([sensitive_info.get("text_boxes", ()), areas])
+    
+    @traced("apply_smart_blur")
+    def apply_smart_blur(self, image: Image.Image, blur_strength: int = 15,
+                         features: Optional[ImageFeatures] = None,
+                         sensitive_info: Optional[dict] = None) -> Image.Image:
+        """Apply smart blur to likely sensitive areas (FREE!)
+        
+        Pass the result of detect_sensitive_info_free as sensitive_info to skip detecting again.
+        """
+        try:
+            # Get sensitive info detection results
+            if sensitive_info is None:
+                sensitive_info = self.detect_sensitive_info_free(image, features)
+            
+            return self.blur_regions(image, self.sensitive_boxes(image, sensitive_info), blur_strength)
+            
+        except Exception as e:
+            logger.error(f"Error applying blur: {str(e)}")
+            return image
+    
+    @traced("blur_pyramid")
+    def build_blur_pyramid(self, image: Image.Image, features: Optional[ImageFeatures] = None,
+                           sensitive_info: Optional[dict] = None) -> BlurPyramid:
+        """Pre-blur the sensitive areas at several strengths for instant slider previews"""
+        if sensitive_info is None:
+            sensitive_info = self.detect_sensitive_info_free(image, features)
+        width, height = image.size
+        with span("blur.mask") as s:
+            mask = boxes_to_mask(self.sensitive_boxes(image, sensitive_info), width, height)
+            s.set(allocated_bytes=mask.nbytes)
+        return BlurPyramid(image, mask)
+    
+    @traced("generate_meme_caption")
+    def generate_meme_caption_free(self, image: Image.Image, features: Optional[ImageFeatures] = None) -> str:
+        """Generate meme caption using image analysis (FREE!)"""
+        try:
+            width, height = image.size
+            aspect_ratio = width / height
+            
+            # Analyze image (brightness and edge complexity)
+            features = self.get_features(image, features)
+            brightness = features.brightness
+            edge_density = features.edge_density
+            
+            # Pre-made meme templates based on image characteristics
+            meme_templates = {
+                "complex_desktop": [
+                    "When you have 47 tabs open but still can't find what you're looking for",
+                    "POV: Your desktop after 3 months of 'I'll organize it later'",
+                    "This screenshot has more layers than my emotional problems",
+                    "When your screen looks like a puzzle but you're the missing piece"
+                ],
+                "simple_clean": [
+                    "Minimalism: Because sometimes less is more... or you just gave up",
+                    "Clean desktop energy ✨ (Trash folder has entered the chat)",
+                    "When you finally organize your life for 5 seconds",
+                    "This is what peak performance looks like"
+                ],
+                "mobile_screenshot": [
+                    "When your phone knows more about you than you do",
+                    "Mobile screenshot: Because desktop was too mainstream",
+                    "POV: You're about to show someone something but panic about your notifications",
+                    "This app has seen things... terrible things"
+                ],
+                "dark_theme": [
+                    "Dark mode: Because my soul matches my UI",
+                    "When you're trying to save battery but really you're just emo",
+                    "Dark theme supremacy ⚫",
+                    "My screen is darker than my coffee"
+                ],
+                "bright_colorful": [
+                    "When your screen is brighter than your future",
+                    "This has more colors than a unicorn explosion 🌈",
+                    "RGB keyboard users be like:",
+                    "Brightness level: Retina damage"
+                ]
+            }
+            
+            # Choose template based on image characteristics
+            if width < 500:  # Mobile
+                templates = meme_templates["mobile_screenshot"]
+            elif brightness < 100:  # Dark
+                templates = meme_templates["dark_theme"]
+            elif brightness > 200:  # Bright
+                templates = meme_templates["bright_colorful"]
+            elif edge_density > 0.1:  # Complex
+                templates = meme_templates["complex_desktop"]
+            else:  # Clean
+                templates = meme_templates["simple_clean"]
+            
+            # Add some random tech humor
+            random_humor = [
+                "Error 404: Social life not found",
+                "It ain't much, but it's honest work",
+                "Me explaining this screenshot to my mom:",
+                "When the screenshot is more organized than your life",
+                "This screenshot brought to you by caffeine and poor life choices"
+            ]
+            
+            # Combine and pick random
+            all_options = templates + random_humor
+            return random.choice(all_options)
+            
+        except Exception as e:
+            return "When your screenshot editor works better than your life decisions 😅"
+
+# Common font locations, tried in order
+FONT_PATHS = [
+    "arial.ttf", "Arial.ttf", 
+    "C:/Windows/Fonts/arial.ttf",
+    "C:/Windows/Fonts/calibri.ttf",
+    "/System/Library/Fonts/Arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+]
+CAPTION_FONT_SIZE = 28
+CAPTION_LINE_HEIGHT = 35  # Approximate line height
+CAPTION_OUTLINE_WIDTH = 3
+CAPTION_MARGIN = 20  # Space between the caption and the image edge
+CAPTION_LAYER_PADDING = 10  # Room for the outline around the text inside a caption layer
+
+@lru_cache(maxsize=None)
+def load_font(size: int = CAPTION_FONT_SIZE) -> ImageFont.ImageFont:
+    """Load the first available font once per process (fallback to default)"""
+    for path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(path, size)
+        except Exception:
+            continue
+    return ImageFont.load_default()
+
+def wrap_text(text: str, font: ImageFont.ImageFont, max_width: float) -> List[str]:
+    """Greedy word wrap, measuring every word only once"""
+    words = text.split(' ')
+    space_width = font.getlength(' ')
+    lines = []
+    current_line = []
+    current_width = 0.0
+    
+    for word in words:
+        word_width = font.getlength(word)
+        test_width = current_width + space_width + word_width if current_line else word_width
+        if test_width < max_width:
+            current_line.append(word)
+            current_width = test_width
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+            current_line = [word]
+            current_width = word_width
+    
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines
+
+@lru_cache(maxsize=64)
+@traced("caption.render")
+def render_caption_layer(text: str, width: int, font_size: int = CAPTION_FONT_SIZE) -> Image.Image:
+    """Render an outlined caption on a transparent layer as wide as the image
+    
+    Cached, so captioning many images of the same width only costs a composite.
+    Callers must not modify the returned layer.
+    """
+    font = load_font(font_size)
+    lines = wrap_text(text, font, width - 2 * CAPTION_MARGIN)
+    
+    pad = CAPTION_LAYER_PADDING
+    layer = Image.new("RGBA", (width, len(lines) * CAPTION_LINE_HEIGHT + 2 * pad), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    
+    for i, line in enumerate(lines):
+        # Center this line
+        bbox = draw.textbbox((0, 0), line, font=font)
+        x = (width - (bbox[2] - bbox[0])) // 2
+        y = pad + i * CAPTION_LINE_HEIGHT
+        
+        # White text with a black outline (stroke effect)
+        draw.text((x, y), line, fill="white", font=font,
+                  stroke_width=CAPTION_OUTLINE_WIDTH, stroke_fill="black")
+    
+    return layer
+
+def caption_layer_top(layer: Image.Image, height: int, position: str = "bottom") -> int:
+    """Row of an image of height at which a render_caption_layer layer goes"""
+    total_text_height = layer.size[1] - 2 * CAPTION_LAYER_PADDING
+    
+    # Position text
+    if position == "top":
+        start_y = CAPTION_MARGIN
+    else:  # bottom
+        start_y = height - total_text_height - CAPTION_MARGIN
+    return start_y - CAPTION_LAYER_PADDING
+
+@traced("add_text_to_image")
+def add_text_to_image(image: Image.Image, text: str, position: str = "bottom") -> Image.Image:
+    """Add meme-style text to image (FREE!)"""
+    try:
+        # Create a copy
+        img_with_text = image.copy()
+        width, height = img_with_text.size
+        
+        layer = render_caption_layer(text, width)
+        
+        # Blend the caption in using its own transparency
+        img_with_text.paste(layer, (0, caption_layer_top(layer, height, position)), layer)
+        
+        return img_with_text
+        
+    except Exception as e:
+        logger.error(f"Error adding text: {str(e)}")
+        return image
+
+@traced("enhance_image_quality")
+def enhance_image_quality(image: Image.Image, sharpness: float = DEFAULT_SHARPNESS,
+                          contrast: float = DEFAULT_CONTRAST, color: float = DEFAULT_COLOR,
+                          features: Optional[ImageFeatures] = None) -> Image.Image:
+    """Enhance image quality (FREE bonus feature!)
+    
+    Sharpness, contrast and color work like ImageEnhance factors (1.0 = unchanged),
+    applied in a single fused pass. Pass features to reuse its pixel array.
+    """
+    try:
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = normalize_mode(image)
+        if features is not None and features.image is image:
+            pixels = features.array
+        else:
+            pixels = pixel_array(image)
+        enhanced = enhance_pixels(pixels, sharpness, contrast, color)
+        return Image.fromarray(enhanced, mode=image.mode)
+    except:
+        return image
@@ -0,0 +1,120 @@
+"""Output encoding for downloads and batch results
+
+PNG at the default level is slow and large for big screenshots. EncodingOptions
+picks the format (PNG with a compression level, lossless WebP, or JPEG/WebP at
+a quality) and optional palette quantization, which shrinks flat UI screenshots
+a lot. Options are hashable, so encoded bytes can be cached per image + options.
+"""
+from __future__ import annotations
+
+import io
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+from instrumentation import traced
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+# Format name -> (Pillow format, file extension, MIME type)
+FORMATS = {
+    "PNG": ("PNG", "png", "image/png"),
+    "WebP (lossless)": ("WEBP", "webp", "image/webp"),
+    "WebP": ("WEBP", "webp", "image/webp"),
+    "JPEG": ("JPEG", "jpg", "image/jpeg"),
+}
+LOSSY_FORMATS = {"WebP", "JPEG"}
+
+DEFAULT_PNG_COMPRESS_LEVEL = 6
+DEFAULT_QUALITY = 90
+# Background lossy formats without transparency are flattened onto
+JPEG_BACKGROUND = (255, 255, 255)
+
+
+class EncodingOptions(NamedTuple):
+    """How to encode an output image (hashable, for cache keys)"""
+
+    format: str = "PNG"
+    compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL  # PNG: 0 (fast, big) - 9 (slow, small)
+    quality: int = DEFAULT_QUALITY  # Lossy JPEG/WebP: 1-100
+    colors: Optional[int] = None  # Quantize to this many colors (PNG / lossless WebP only)
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.format][1]
+
+    @property
+    def mime(self) -> str:
+        return FORMATS[self.format][2]
+
+    @property
+    def is_default_png(self) -> bool:
+        """True if a plain PNG at this compression level is exactly what is wanted"""
+        return self.format == "PNG" and not self.colors
+
+
+def _exact_palette(image: Image.Image, colors: list) -> Image.Image:
+    """Palette image holding exactly the (count, color) entries from getcolors()"""
+    pixels = np.asarray(image).astype(np.uint32)
+    palette = np.array([color for _, color in colors], dtype=np.uint32)
+
+    def pack(values):
+        # One integer per color, so pixels can be matched to entries with a binary search
+        packed = values[..., 0] << 16 | values[..., 1] << 8 | values[..., 2]
+        return packed | values[..., 3] << 24 if values.shape[-1] == 4 else packed
+
+    palette_keys = pack(palette)
+    order = np.argsort(palette_keys)
+    indices = np.searchsorted(palette_keys[order], pack(pixels)).astype(np.uint8)
+
+    result = Image.fromarray(indices, mode="P")
+    result.putpalette(palette[order].astype(np.uint8).tobytes(), rawmode=image.mode)
+    return result
+
+
+def quantize(image: Image.Image, colors: int) -> Image.Image:
+    """Reduce image to a palette of at most colors (no dithering, so flat areas stay flat)
+
+    Lossless when the image has no more distinct colors than that, which is
+    common for flat UI; otherwise a fast octree approximation.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    exact = image.getcolors(maxcolors=colors)
+    if exact is not None:
+        return _exact_palette(image, exact)
+    # Fast octree handles RGBA too and is several times quicker than median cut
+    return image.quantize(colors=colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """RGB copy of image with any transparency composited onto JPEG_BACKGROUND"""
+    if image.mode == "RGBA":
+        background = Image.new("RGB", image.size, JPEG_BACKGROUND)
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image if image.mode in ("RGB", "L") else image.convert("RGB")
+
+
+@traced("encode")
+def encode_image(image: Image.Image, options: EncodingOptions = EncodingOptions()) -> bytes:
+    """Encode image for download according to options"""
+    if options.format not in FORMATS:
+        raise ValueError(f"Unknown output format: {options.format}")
+
+    pil_format = FORMATS[options.format][0]
+    buf = io.BytesIO()
+    if options.format == "JPEG":
+        _flatten(image).save(buf, format=pil_format, quality=options.quality,
+                             subsampling=0)  # Full-resolution color keeps colored text crisp
+    elif options.format == "WebP":
+        image.save(buf, format=pil_format, quality=options.quality, method=4)
+    else:
+        if options.colors:
+            image = quantize(image, options.colors)
+        if options.format == "PNG":
+            image.save(buf, format=pil_format, compress_level=options.compress_level)
+        else:
+            image.save(buf, format=pil_format, lossless=True, quality=80, method=4)
+    return buf.getvalue()
@@ -0,0 +1,88 @@
+"""Fused sharpen + contrast + saturation engine behind enhance_image_quality
+
+Matches chaining ImageEnhance.Sharpness, Contrast and Color, but all three are
+linear, so they collapse into one 3x3 convolution plus one per-pixel color
+matrix (or a lookup table) with no full-size intermediate images.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+DEFAULT_SHARPNESS = 1.2
+DEFAULT_CONTRAST = 1.1
+DEFAULT_COLOR = 1.05
+
+# PIL's ImageFilter.SMOOTH (weights sum to 13), the "degenerate" image ImageEnhance.Sharpness blends against
+SMOOTH_KERNEL = ((1, 1, 1), (1, 5, 1), (1, 1, 1))
+# ITU-R 601-2 luma weights, as used by PIL's convert("L")
+LUMA = (0.299, 0.587, 0.114)
+
+
+def sharpen_kernel(sharpness: float) -> np.ndarray:
+    """3x3 kernel equal to blending the smoothed image towards the original by sharpness"""
+    identity = np.zeros((3, 3), dtype=np.float32)
+    identity[1, 1] = 1
+    smooth = np.array(SMOOTH_KERNEL, dtype=np.float32) / 13
+    return sharpness * identity + (1 - sharpness) * smooth
+
+
+def color_matrix(contrast: float, color: float, mean: float) -> np.ndarray:
+    """3x4 matrix applying contrast around mean, then saturation, to RGB pixels"""
+    # Saturation: mix each pixel with its own luma
+    saturation = color * np.eye(3, dtype=np.float32) + (1 - color) * np.outer(np.ones(3, dtype=np.float32), LUMA)
+    # Contrast scales around the mean; saturation keeps gray (the offset) unchanged
+    matrix = np.empty((3, 4), dtype=np.float32)
+    matrix[:, :3] = contrast * saturation
+    matrix[:, 3] = (1 - contrast) * mean
+    return matrix
+
+
+def contrast_lut(contrast: float, mean: float) -> np.ndarray:
+    """256-entry lookup table applying contrast around mean"""
+    values = np.arange(256, dtype=np.float32)
+    return np.clip(np.rint(mean + contrast * (values - mean)), 0, 255).astype(np.uint8)
+
+
+def mean_brightness(pixels: np.ndarray) -> float:
+    """Mean luma of an L/RGB(A) pixel array, without building a grayscale copy"""
+    channel_means = cv2.mean(pixels)
+    if pixels.ndim == 3 and pixels.shape[2] >= 3:
+        return float(np.dot(LUMA, channel_means[:3]))
+    return float(channel_means[0])
+
+
+def enhance_pixels(pixels: np.ndarray, sharpness: float = DEFAULT_SHARPNESS,
+                   contrast: float = DEFAULT_CONTRAST, color: float = DEFAULT_COLOR,
+                   mean: Optional[float] = None) -> np.ndarray:
+    """Sharpen, then adjust contrast and saturation of an L, RGB or RGBA uint8 array
+
+    mean is the brightness contrast is applied around (the whole image's
+    mean when enhancing it in bands); computed from pixels if not given.
+    """
+    if pixels.ndim == 3 and pixels.shape[2] == 4:
+        # Enhance the colors, keep transparency as it is
+        enhanced = enhance_pixels(np.ascontiguousarray(pixels[..., :3]), sharpness, contrast, color, mean)
+        return np.dstack([enhanced, pixels[..., 3]])
+
+    if mean is None:
+        # Sharpening preserves the mean, so it can be taken before sharpening
+        mean = mean_brightness(pixels)
+    mean = float(int(mean + 0.5))
+
+    if sharpness != 1:
+        result = cv2.filter2D(pixels, -1, sharpen_kernel(sharpness), borderType=cv2.BORDER_REPLICATE)
+    else:
+        result = pixels.copy()
+
+    if pixels.ndim == 2 or color == 1:
+        # Same curve for every channel - a lookup table is the cheapest pass
+        cv2.LUT(result, contrast_lut(contrast, mean), dst=result)
+    else:
+        cv2.transform(result, color_matrix(contrast, color, mean), dst=result)
+    return result
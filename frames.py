@@ -0,0 +1,266 @@
+"""Privacy blur for screen recordings and animated GIFs, one frame at a time
+
+Consecutive frames of a screen recording are mostly identical. FrameBlurrer
+diffs each frame against the previous one and only looks at the cells that
+changed: text is detected again inside them (boxes elsewhere are carried
+forward) and only the area around them is blurred again, on top of the
+previous output frame. A scene change (most of the screen different) falls
+back to detecting and blurring the whole frame.
+
+Frames are read and written as streams, so only the current and previous
+frame are held in memory (for video output; Pillow keeps the frames of an
+animated GIF/WebP until it writes the file).
+
+Example:
+    python frames.py recording.mp4 recording_blurred.mp4 --blur-strength 15
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageSequence
+
+from boxes import Box, TextBoxes
+from dedup import changed_rects, redetect_boxes
+from editor import FreeScreenshotEditor, ImageFeatures, normalize_mode
+from instrumentation import span, traced
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# Gray levels a pixel must change by to count (video compression noise stays below this)
+DIFF_THRESHOLD = 12
+# Frames are compared in cells of this many pixels square
+CELL_SIZE = 32
+# With more of the frame changed than this, the frame is processed from scratch
+MAX_CHANGED_FRACTION = 0.5
+# Container extension -> OpenCV FourCC for video output
+VIDEO_CODECS = {".mp4": "mp4v", ".m4v": "mp4v", ".mov": "mp4v", ".avi": "MJPG"}
+DEFAULT_FRAME_DURATION = 100  # ms, when the source doesn't say
+
+
+class Frame(NamedTuple):
+    """One decoded frame and how long it is shown (ms)"""
+
+    image: Image.Image
+    duration: int = DEFAULT_FRAME_DURATION
+
+
+def _expand(box: Box, margin: int, size: Tuple[int, int]) -> Box:
+    """box grown by margin on every side, clipped to size"""
+    width, height = size
+    return max(0, box[0] - margin), max(0, box[1] - margin), min(width, box[2] + margin), min(height, box[3] + margin)
+
+
+def _union(rect: Box, boxes: TextBoxes) -> Box:
+    """Smallest box holding rect and all of boxes"""
+    corners = np.vstack([np.asarray(rect, dtype=np.int64).reshape(1, 4), boxes.array])
+    return (*corners[:, :2].min(axis=0).tolist(), *corners[:, 2:].max(axis=0).tolist())
+
+
+class FrameBlurrer:
+    """Privacy-blurs consecutive frames, redoing detection and blur only where the screen changed
+
+    Feed frames in order to blur(); stats counts how each one was handled.
+    """
+
+    def __init__(self, editor: Optional[FreeScreenshotEditor] = None, blur_strength: int = 15,
+                 diff_threshold: int = DIFF_THRESHOLD, cell_size: int = CELL_SIZE,
+                 max_changed_fraction: float = MAX_CHANGED_FRACTION, keyframe_interval: int = 0):
+        self.editor = editor or FreeScreenshotEditor()
+        self.blur_strength = blur_strength
+        self.diff_threshold = diff_threshold
+        self.cell_size = cell_size
+        self.max_changed_fraction = max_changed_fraction
+        # Detect from scratch every this many frames (0 = only on scene changes)
+        self.keyframe_interval = keyframe_interval
+        self.stats = {"frames": 0, "full": 0, "incremental": 0, "unchanged": 0, "changed_pixels": 0, "pixels": 0}
+        self._gray = None
+        self._info = None
+        self._output = None
+
+    def changed_cells(self, gray: np.ndarray) -> np.ndarray:
+        """Bool grid of cells where gray differs from the previous frame"""
+        height, width = gray.shape
+        with span("frames.diff", pixels=width * height):
+            changed = cv2.absdiff(gray, self._gray) > self.diff_threshold
+            # A cell counts as changed if any pixel in it did
+            rows = np.logical_or.reduceat(changed, np.arange(0, height, self.cell_size), axis=0)
+            return np.logical_or.reduceat(rows, np.arange(0, width, self.cell_size), axis=1)
+
+    @traced("frames.blur")
+    def blur(self, image: Image.Image) -> Image.Image:
+        """The privacy-blurred version of the next frame"""
+        image = normalize_mode(image)
+        features = ImageFeatures(image)
+        gray = features.gray
+        self.stats["frames"] += 1
+        self.stats["pixels"] += image.size[0] * image.size[1]
+
+        keyframe = self.keyframe_interval and (self.stats["frames"] - 1) % self.keyframe_interval == 0
+        if self._gray is None or self._gray.shape != gray.shape or keyframe:
+            output = self._blur_full(image, features)
+        else:
+            cells = self.changed_cells(gray)
+            fraction = float(cells.mean())
+            if fraction > self.max_changed_fraction:
+                output = self._blur_full(image, features)
+            elif not cells.any():
+                self.stats["unchanged"] += 1
+                output = self._output.copy()
+            else:
+                output = self._blur_changed(image, features, cells)
+            self.stats["changed_pixels"] += int(fraction * image.size[0] * image.size[1])
+
+        self._gray = gray
+        self._output = output
+        return output
+
+    def _blur_full(self, image: Image.Image, features: ImageFeatures,
+                   info: Optional[dict] = None) -> Image.Image:
+        """Blur the whole frame (detecting its text first unless info is given)"""
+        self.stats["full"] += 1
+        self._info = info or self.editor.detect_sensitive_info_free(image, features)
+        return self.editor.blur_regions(image, self.editor.sensitive_boxes(image, self._info), self.blur_strength)
+
+    def _blur_changed(self, image: Image.Image, features: ImageFeatures, cells: np.ndarray) -> Image.Image:
+        """Redo detection and blur inside the changed cells, keeping the previous output elsewhere"""
+        rects = changed_rects(cells, image.size)
+        old_boxes = TextBoxes.of(self._info["text_boxes"])
+        boxes = redetect_boxes(self.editor, image, old_boxes, rects)
+        info = self.editor.detect_sensitive_info_free(image, features, text_boxes=boxes)
+        if info["locations"] != self._info["locations"]:
+            # A header/footer band switched on or off - that changes far more than the cells
+            return self._blur_full(image, features, info)
+        self.stats["incremental"] += 1
+
+        # Boxes that disappeared or appeared leave or need blur around them, inside the cells or not
+        removed = old_boxes[old_boxes.centers_in(rects)]
+        # redetect_boxes puts the kept boxes first and the newly found ones after them
+        changed = TextBoxes.concat([removed, boxes[len(old_boxes) - len(removed):]])
+        margin = 3 * self.blur_strength
+        areas = [_expand(_union(rect, changed[changed.centers_in([rect])]), margin, image.size) for rect in rects]
+
+        blur_boxes = self.editor.sensitive_boxes(image, info)
+        output = self._output.copy()
+        with span("frames.reblur", regions=len(areas)):
+            for area in areas:
+                # Blur with context around the area, so its edges match a full-frame blur
+                x1, y1, x2, y2 = context = _expand(area, margin, image.size)
+                local = blur_boxes.within(context).offset(-x1, -y1)
+                blurred = self.editor.blur_regions(image.crop(context), local, self.blur_strength, in_place=True)
+                output.paste(blurred.crop((area[0] - x1, area[1] - y1, area[2] - x1, area[3] - y1)), area[:2])
+        self._info = info
+        return output
+
+
+def read_frames(path: str) -> Iterator[Frame]:
+    """Decode an animated GIF/WebP/PNG or a video one frame at a time"""
+    if os.path.splitext(path)[1].lower() in VIDEO_CODECS:
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"Can't open video: {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 1000 / DEFAULT_FRAME_DURATION
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield Frame(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), round(1000 / fps))
+        finally:
+            capture.release()
+
+    with Image.open(path) as animation:
+        for frame in ImageSequence.Iterator(animation):
+            # Later GIF frames are composited onto earlier ones by Pillow, so each one is a full frame
+            yield Frame(normalize_mode(frame).copy(), frame.info.get("duration", DEFAULT_FRAME_DURATION))
+
+
+def write_frames(path: str, frames: Iterable[Frame]) -> int:
+    """Encode frames as a video (.mp4, .mov, .avi) or an animated GIF/WebP/PNG; returns the frame count
+
+    Video frames are written as they arrive. Pillow assembles animated images
+    in memory, so those hold every (encoded or palette) frame until the end.
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("No frames to write")
+    count = 1
+
+    codec = VIDEO_CODECS.get(os.path.splitext(path)[1].lower())
+    if codec:
+        fps = 1000 / max(1, first.duration)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, first.image.size)
+        try:
+            writer.write(cv2.cvtColor(np.asarray(first.image.convert("RGB")), cv2.COLOR_RGB2BGR))
+            for frame in frames:
+                writer.write(cv2.cvtColor(np.asarray(frame.image.convert("RGB")), cv2.COLOR_RGB2BGR))
+                count += 1
+        finally:
+            writer.release()
+        return count
+
+    def rest():
+        nonlocal count
+        for frame in frames:
+            # Pillow's GIF writer takes each frame's duration from its info
+            frame.image.info["duration"] = frame.duration
+            count += 1
+            yield frame.image
+
+    first.image.info["duration"] = first.duration
+    first.image.save(path, save_all=True, append_images=rest(), loop=0)
+    return count
+
+
+def blur_frames(frames: Iterable[Frame], blurrer: Optional[FrameBlurrer] = None, **kwargs) -> Iterator[Frame]:
+    """Privacy-blurred frames, produced as the input frames arrive"""
+    blurrer = blurrer or FrameBlurrer(**kwargs)
+    for frame in frames:
+        yield Frame(blurrer.blur(frame.image), frame.duration)
+
+
+def blur_recording(src: str, dst: str, editor: Optional[FreeScreenshotEditor] = None,
+                   blur_strength: int = 15, **kwargs) -> dict:
+    """Privacy-blur a recording or animated image from src into dst; returns FrameBlurrer stats"""
+    blurrer = FrameBlurrer(editor, blur_strength, **kwargs)
+    write_frames(dst, blur_frames(read_frames(src), blurrer))
+    stats = dict(blurrer.stats)
+    stats["changed_fraction"] = round(stats["changed_pixels"] / max(1, stats["pixels"]), 4)
+    return stats
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Privacy-blur a screen recording or animated GIF")
+    parser.add_argument("input", help="Video (.mp4, .mov, .avi) or animated GIF/WebP/PNG")
+    parser.add_argument("output", help="Where to write the blurred frames (format from the extension)")
+    parser.add_argument("--blur-strength", type=int, default=15, help="Blur radius (1-30)")
+    parser.add_argument("--diff-threshold", type=int, default=DIFF_THRESHOLD,
+                        help="Gray levels a pixel must change by to count as changed")
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE, help="Size of the cells frames are compared in")
+    parser.add_argument("--keyframe-interval", type=int, default=0,
+                        help="Detect the whole frame every N frames (default: only on scene changes)")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    stats = blur_recording(
+        args.input, args.output,
+        blur_strength=args.blur_strength,
+        diff_threshold=args.diff_threshold,
+        cell_size=args.cell_size,
+        keyframe_interval=args.keyframe_interval,
+    )
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Lightweight per-stage timing and memory spans
+
+Spans cost almost nothing unless a trace is being recorded (or the
+"screenshot_editor.spans" logger is at DEBUG, in which case every finished
+span is logged as one JSON line for aggregation):
+
+    with recording() as trace:
+        enhance_image_quality(image)
+    print(trace.to_json())
+"""
+import functools
+import json
+import logging
+import os
+import time
+from collections.abc import Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from PIL import Image
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger("screenshot_editor.spans")
+
+_current_trace: ContextVar = ContextVar("current_trace", default=None)
+_current_span: ContextVar = ContextVar("current_span", default=None)
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def nbytes(value: Any) -> Optional[int]:
+    """Bytes held by an image or array result (None for anything else)"""
+    if isinstance(value, Image.Image):
+        width, height = value.size
+        return width * height * len(value.getbands())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return None
+
+
+class Span:
+    """One timed stage: wall time, pixel/region counts and memory"""
+
+    __slots__ = ("name", "parent", "start", "duration_ms", "attrs")
+
+    def __init__(self, name: str, parent: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.start = time.time()
+        self.duration_ms = None
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        """Attach counts (pixels, regions, allocated_bytes, ...) to the span"""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            **self.attrs,
+        }
+
+
+class _NullSpan:
+    """Stand-in when nothing is recording - set() does nothing"""
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Spans recorded while a recording() block was active"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [s.to_dict() for s in self.spans]
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dicts(), indent=2)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Total time and call count per stage name"""
+        totals = {}
+        for s in self.spans:
+            entry = totals.setdefault(s.name, {"calls": 0, "total_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + (s.duration_ms or 0.0), 3)
+        return totals
+
+
+@contextmanager
+def recording() -> Iterator[Trace]:
+    """Collect every span finished inside this block"""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def is_active() -> bool:
+    """True if spans are currently being collected or logged"""
+    return _current_trace.get() is not None or logger.isEnabledFor(logging.DEBUG)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Any]:
+    """Time a pipeline stage; use .set() on the result to record counts"""
+    if not is_active():
+        yield NULL_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.name if parent is not None else None, attrs)
+    token = _current_span.set(current)
+    rss_before = current_rss()
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000
+        rss_after = current_rss()
+        if rss_before is not None and rss_after is not None:
+            current.attrs["rss_delta_bytes"] = rss_after - rss_before
+        _current_span.reset(token)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(current)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(current.to_dict()))
+
+
+def traced(name: str) -> Callable:
+    """Decorator: wrap a function taking an image in a span
+
+    Records the input's pixel count, the number of regions in the result
+    (box lists such as TextBoxes, or dicts with "text_boxes") and the bytes
+    of image results.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_active():
+                return fn(*args, **kwargs)
+
+            image = next((a for a in args if isinstance(a, Image.Image)), None)
+            attrs = {"pixels": image.size[0] * image.size[1]} if image is not None else {}
+            with span(name, **attrs) as s:
+                result = fn(*args, **kwargs)
+                if isinstance(result, Sequence) and not isinstance(result, (str, bytes, tuple)):
+                    s.set(regions=len(result))
+                elif isinstance(result, dict) and "text_boxes" in result:
+                    s.set(regions=len(result["text_boxes"]))
+                size = nbytes(result)
+                if size is not None:
+                    s.set(allocated_bytes=size)
+                return result
+        return wrapper
+    return decorator
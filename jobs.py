@@ -0,0 +1,259 @@
+"""Bounded worker pool with per-session job queues for multi-user servers
+
+Every session's jobs wait in their own FIFO queue and a fixed number of worker
+threads take turns between sessions (round robin), so one user submitting big
+blur jobs cannot starve everyone else or oversubscribe the CPU. Queued jobs can
+be cancelled, and submit() refuses new work once too many jobs are waiting.
+Background jobs (cache warming and the like) share the same workers but only
+run when no session has a regular job waiting.
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+# Concurrent jobs; each one already uses several threads inside OpenCV/Pillow
+DEFAULT_WORKERS = int(os.environ.get("SCREENSHOT_EDITOR_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Queued jobs (all sessions) before new submissions are refused
+DEFAULT_MAX_PENDING = 64
+# Queued jobs one session may have before it is refused
+DEFAULT_MAX_PENDING_PER_SESSION = 4
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the server (or the session) already has enough queued work"""
+
+
+class JobCancelled(Exception):
+    """Raised by Job.result() for a job that was cancelled before it ran"""
+
+
+class Job:
+    """One unit of work submitted to a JobQueue"""
+
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+    def __init__(self, session_id: str, fn: Callable[[], Any]):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.status = self.QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._fn = fn
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+
+    def done(self) -> bool:
+        """True once the job finished, failed or was cancelled"""
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job is done (or timeout seconds pass); returns done()"""
+        return self._done.wait(timeout)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """The job's return value; re-raises its exception or JobCancelled"""
+        if not self.wait(timeout):
+            raise TimeoutError(f"Job {self.id} still {self.status}")
+        if self.status == self.CANCELLED:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _run(self) -> None:
+        try:
+            self._result = self._fn()
+            self.status = self.DONE
+        except Exception as e:
+            self._error = e
+            self.status = self.FAILED
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
+
+    def _cancel(self) -> None:
+        self.status = self.CANCELLED
+        self.finished_at = time.time()
+        self._done.set()
+
+
+class JobQueue:
+    """Fixed pool of worker threads serving per-session FIFO queues in turn"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING,
+                 max_pending_per_session: int = DEFAULT_MAX_PENDING_PER_SESSION):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_pending_per_session = max_pending_per_session
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._sessions: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._background: Deque[Job] = deque()
+        self._pending = 0
+        self._running: Dict[str, Job] = {}
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, session_id: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """Queue fn(*args, **kwargs) for session_id and return its Job
+
+        The job runs in a copy of the caller's context, so timing spans and
+        other context variables carry over to the worker thread.
+        """
+        return self._enqueue(session_id, fn, args, kwargs, background=False)
+
+    def submit_background(self, session_id: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """Queue fn like submit(), but run it only when no regular job is waiting
+
+        For work nobody is waiting on, like warming a cache. It still counts
+        against the pending limits and is cancelled with its session.
+        """
+        return self._enqueue(session_id, fn, args, kwargs, background=True)
+
+    def _enqueue(self, session_id: str, fn: Callable[..., Any], args: tuple, kwargs: dict,
+                 background: bool) -> Job:
+        context = contextvars.copy_context()
+        job = Job(session_id, lambda: context.run(fn, *args, **kwargs))
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("JobQueue has been shut down")
+            queue = self._background if background else self._sessions.get(session_id)
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} jobs already waiting")
+            waiting = sum(1 for queued in queue if queued.session_id == session_id) if queue is not None else 0
+            if waiting >= self.max_pending_per_session:
+                raise QueueFull(f"{waiting} jobs already waiting for this session")
+            if queue is None:
+                queue = self._sessions[session_id] = deque()
+            queue.append(job)
+            self._pending += 1
+            self._condition.notify()
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """Cancel job if it has not started yet; returns whether it was cancelled"""
+        with self._condition:
+            if job in self._background:
+                self._background.remove(job)
+            else:
+                queue = self._sessions.get(job.session_id)
+                if queue is None or job not in queue:
+                    return False
+                queue.remove(job)
+                self._drop_if_empty(job.session_id)
+            self._pending -= 1
+            self.cancelled += 1
+        job._cancel()
+        return True
+
+    def cancel_session(self, session_id: str) -> int:
+        """Cancel every queued job of a session (e.g. when it uploads a new image)"""
+        with self._condition:
+            queue = self._sessions.pop(session_id, None) or deque()
+            queue.extend(job for job in self._background if job.session_id == session_id)
+            self._background = deque(job for job in self._background if job.session_id != session_id)
+            self._pending -= len(queue)
+            self.cancelled += len(queue)
+        for job in queue:
+            job._cancel()
+        return len(queue)
+
+    def position(self, job: Job) -> Optional[int]:
+        """1-based place of a queued job in the order workers will take it (None if not queued)"""
+        with self._condition:
+            if job.status != Job.QUEUED:
+                return None
+            queues = [list(queue) for queue in self._sessions.values()]
+            place = 0
+            for depth in range(max((len(queue) for queue in queues), default=0)):
+                for queue in queues:
+                    if depth < len(queue):
+                        place += 1
+                        if queue[depth] is job:
+                            return place
+            # Background jobs go after every regular one
+            for queued in self._background:
+                place += 1
+                if queued is job:
+                    return place
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        """Current load and lifetime counters"""
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "running": len(self._running),
+                "queued": self._pending,
+                "background": len(self._background),
+                "sessions_waiting": len(self._sessions),
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers after the running jobs; queued jobs are cancelled"""
+        with self._condition:
+            self._shutdown = True
+            sessions = list(self._sessions) + [job.session_id for job in self._background]
+            self._condition.notify_all()
+        for session_id in sessions:
+            self.cancel_session(session_id)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _drop_if_empty(self, session_id: str) -> None:
+        if not self._sessions.get(session_id):
+            self._sessions.pop(session_id, None)
+
+    def _next_job(self) -> Optional[Job]:
+        """Wait for work, taking from the session that has waited longest since its last turn
+
+        Background jobs are only taken when no session has a regular job waiting.
+        """
+        with self._condition:
+            while not self._sessions and not self._background and not self._shutdown:
+                self._condition.wait()
+            if self._shutdown:
+                return None
+            if self._sessions:
+                session_id, queue = next(iter(self._sessions.items()))
+                job = queue.popleft()
+                # Round robin: this session goes to the back of the line
+                self._sessions.move_to_end(session_id)
+                self._drop_if_empty(session_id)
+            else:
+                job = self._background.popleft()
+            self._pending -= 1
+            job.status = Job.RUNNING
+            job.started_at = time.time()
+            self._running[job.id] = job
+            return job
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            job._run()
+            with self._condition:
+                del self._running[job.id]
+                if job.status == Job.FAILED:
+                    self.failed += 1
+                else:
+                    self.completed += 1
@@ -0,0 +1,282 @@
+"""Saved layout profiles: where text is worth looking for in screenshots of a known app
+
+Screenshots of the same app at the same resolution keep their sensitive data
+in the same places, and the rest is static chrome. A LayoutProfile records
+that for one resolution:
+
+- include: the only areas scanned for text (empty = the whole image)
+- exclude: areas never scanned (static chrome)
+- blur: areas always blurred, instead of guessing from the header/footer bands
+- chrome: static areas whose pixels identify the layout (default: exclude)
+
+FreeScreenshotEditor picks the profile whose size and chrome fingerprint (a
+tiny thumbnail of each chrome area) match an image, from SCREENSHOT_EDITOR_LAYOUTS
+(default layouts.json, reloaded when it changes). Matching only reads the
+chrome pixels, so screenshots of unknown layouts pay next to nothing.
+
+Example:
+    python layouts.py add mail-1080p mail.png --include 400,120,1920,1000 --exclude 0,0,1920,120 \\
+        --blur 1500,0,1920,60
+    python layouts.py match other_mail.png
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from boxes import Box, TextBoxes
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger("screenshot_editor")
+
+DEFAULT_LAYOUTS_PATH = "layouts.json"
+# Chrome areas are compared as thumbnails of this (width, height)
+FINGERPRINT_SIZE = (16, 8)
+# Mean gray-level difference between thumbnails that still counts as the same chrome
+CHROME_TOLERANCE = 6.0
+# Pieces of the scanned area thinner than this (left between exclude areas) are not scanned
+MIN_SCAN_SIDE = 16
+
+
+def fingerprint(gray: np.ndarray) -> Tuple[int, ...]:
+    """Thumbnail of a grayscale area, as a flat tuple of gray levels"""
+    return tuple(cv2.resize(gray, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA).ravel().tolist())
+
+
+def _rects(rects: Iterable[Sequence[int]]) -> Tuple[Box, ...]:
+    return tuple(tuple(int(v) for v in rect) for rect in rects)
+
+
+def _subtract(rect: Box, cut: Box) -> List[Box]:
+    """rect minus cut, as up to four rectangles (full-width pieces above and below, then left and right)"""
+    x1, y1, x2, y2 = rect
+    cx1, cy1, cx2, cy2 = max(x1, cut[0]), max(y1, cut[1]), min(x2, cut[2]), min(y2, cut[3])
+    if cx1 >= cx2 or cy1 >= cy2:
+        return [rect]
+    pieces = [(x1, y1, x2, cy1), (x1, cy2, x2, y2), (x1, cy1, cx1, cy2), (cx2, cy1, x2, cy2)]
+    return [piece for piece in pieces if piece[0] < piece[2] and piece[1] < piece[3]]
+
+
+class LayoutProfile(NamedTuple):
+    """Where to look for (and always blur) sensitive data in screenshots of one layout"""
+
+    name: str
+    size: Tuple[int, int]
+    include: Tuple[Box, ...] = ()
+    exclude: Tuple[Box, ...] = ()
+    blur: Tuple[Box, ...] = ()
+    chrome: Tuple[Box, ...] = ()
+    fingerprints: Tuple[Tuple[int, ...], ...] = ()  # One per chrome area
+
+    def scan_areas(self) -> List[Box]:
+        """The parts of the include areas (or the whole image) outside every exclude area
+
+        Detection only reads these, so the excluded chrome is never scanned.
+        """
+        areas = list(self.include) or [(0, 0) + tuple(self.size)]
+        for cut in self.exclude:
+            areas = [piece for area in areas for piece in _subtract(area, cut)]
+        return [area for area in areas if min(area[2] - area[0], area[3] - area[1]) >= MIN_SCAN_SIDE]
+
+    def restrict(self, boxes: TextBoxes) -> TextBoxes:
+        """boxes centred inside the include areas (if any) and outside the exclude areas"""
+        boxes = TextBoxes.of(boxes)
+        keep = boxes.centers_in(self.include) if self.include else np.ones(len(boxes), dtype=bool)
+        if self.exclude:
+            keep &= ~boxes.centers_in(self.exclude)
+        return boxes if keep.all() else boxes[keep]
+
+    def to_dict(self) -> dict:
+        return {field: list(value) if isinstance(value, tuple) else value for field, value in self._asdict().items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LayoutProfile":
+        return cls(
+            data["name"], tuple(data["size"]),
+            _rects(data.get("include", ())), _rects(data.get("exclude", ())),
+            _rects(data.get("blur", ())), _rects(data.get("chrome", ())),
+            tuple(tuple(fp) for fp in data.get("fingerprints", ())),
+        )
+
+
+def create_profile(name: str, features, include: Iterable[Box] = (), exclude: Iterable[Box] = (),
+                   blur: Iterable[Box] = (), chrome: Optional[Iterable[Box]] = None) -> LayoutProfile:
+    """Profile for the layout of one example screenshot (an editor.ImageFeatures)
+
+    The chrome areas (by default the exclude areas) are fingerprinted from it.
+    At least one is needed: without them the profile would match every
+    screenshot of the same size.
+    """
+    size = (features.width, features.height)
+    include, exclude, blur = _rects(include), _rects(exclude), _rects(blur)
+    chrome = exclude if chrome is None else _rects(chrome)
+    if not chrome:
+        raise ValueError("A layout profile needs at least one chrome (or exclude) area to be recognized by")
+    for rect in include + exclude + blur + chrome:
+        x1, y1, x2, y2 = rect
+        if not (0 <= x1 < x2 <= size[0] and 0 <= y1 < y2 <= size[1]):
+            raise ValueError(f"Area {rect} is not inside the {size[0]}x{size[1]} image")
+    fingerprints = tuple(fingerprint(features.gray_region(rect)) for rect in chrome)
+    return LayoutProfile(name, size, include, exclude, blur, chrome, fingerprints)
+
+
+class LayoutProfiles:
+    """A set of layout profiles, looked up by image size and then by chrome fingerprint"""
+
+    def __init__(self, profiles: Iterable[LayoutProfile] = (), tolerance: float = CHROME_TOLERANCE):
+        self.tolerance = tolerance
+        self._profiles: Dict[str, LayoutProfile] = {}
+        for profile in profiles:
+            self.add(profile)
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def __iter__(self) -> Iterator[LayoutProfile]:
+        return iter(self._profiles.values())
+
+    def add(self, profile: LayoutProfile) -> None:
+        """Add profile (replacing one with the same name)"""
+        self._profiles[profile.name] = profile
+
+    def remove(self, name: str) -> None:
+        del self._profiles[name]
+
+    def match(self, features) -> Optional[LayoutProfile]:
+        """The first profile of the image's size whose chrome looks the same (an editor.ImageFeatures)
+
+        Profiles without chrome fingerprints never match.
+        """
+        size = (features.width, features.height)
+        for profile in self._profiles.values():
+            if tuple(profile.size) != size or not profile.fingerprints:
+                continue
+            if all(
+                np.abs(np.asarray(fingerprint(features.gray_region(rect)), dtype=np.int16) - expected).mean()
+                <= self.tolerance
+                for rect, expected in zip(profile.chrome, profile.fingerprints)
+            ):
+                return profile
+        return None
+
+    @classmethod
+    def load(cls, path: str) -> "LayoutProfiles":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(LayoutProfile.from_dict(item) for item in data.get("profiles", []))
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"profiles": [profile.to_dict() for profile in self]}, f, indent=2)
+
+
+def layouts_path() -> str:
+    return os.environ.get("SCREENSHOT_EDITOR_LAYOUTS", DEFAULT_LAYOUTS_PATH)
+
+
+_default_lock = threading.Lock()
+_default_key = None
+_default_profiles = LayoutProfiles()
+
+
+def default_layouts() -> LayoutProfiles:
+    """Profiles from layouts_path(), loaded again whenever the file changes (empty if there is none)"""
+    global _default_key, _default_profiles
+    path = layouts_path()
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return LayoutProfiles()
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _default_lock:
+        if key != _default_key:
+            try:
+                _default_profiles = LayoutProfiles.load(path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error(f"Error loading layout profiles from {path}: {str(e)}")
+                _default_profiles = LayoutProfiles()
+            _default_key = key
+        return _default_profiles
+
+
+def _parse_rect(value: str) -> Box:
+    try:
+        x1, y1, x2, y2 = (int(v) for v in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected x1,y1,x2,y2 - got {value!r}")
+    return x1, y1, x2, y2
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Manage layout profiles for the FREE Screenshot Editor")
+    parser.add_argument("--file", default=None, help=f"Profiles file (default: $SCREENSHOT_EDITOR_LAYOUTS "
+                                                     f"or {DEFAULT_LAYOUTS_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Add (or replace) a profile, using a screenshot as the example")
+    add.add_argument("name")
+    add.add_argument("screenshot")
+    for option, help_text in [("--include", "Scan only this area for text"),
+                              ("--exclude", "Never scan this area (static chrome)"),
+                              ("--blur", "Always blur this area"),
+                              ("--chrome", "Static area that identifies the layout (default: the --exclude areas)")]:
+        add.add_argument(option, type=_parse_rect, action="append", default=None, metavar="X1,Y1,X2,Y2",
+                         help=f"{help_text} (repeatable)")
+
+    commands.add_parser("list", help="List the saved profiles")
+    remove = commands.add_parser("remove", help="Delete a profile")
+    remove.add_argument("name")
+    match = commands.add_parser("match", help="Show which profile a screenshot matches")
+    match.add_argument("screenshot")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    # editor imports this module, so it is only imported when run as a script
+    from editor import ImageFeatures, load_image
+
+    args = parse_args(argv)
+    path = args.file or layouts_path()
+    profiles = LayoutProfiles.load(path) if os.path.exists(path) else LayoutProfiles()
+
+    if args.command == "add":
+        with open(args.screenshot, "rb") as f:
+            features = ImageFeatures(load_image(f))
+        try:
+            profile = create_profile(args.name, features, args.include or (), args.exclude or (),
+                                     args.blur or (), args.chrome)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        profiles.add(profile)
+        profiles.save(path)
+        print(f"Saved profile {profile.name!r} for {profile.size[0]}x{profile.size[1]} to {path}")
+    elif args.command == "list":
+        for profile in profiles:
+            print(f"{profile.name}: {profile.size[0]}x{profile.size[1]}, {len(profile.include)} include, "
+                  f"{len(profile.exclude)} exclude, {len(profile.blur)} blur, {len(profile.chrome)} chrome areas")
+    elif args.command == "remove":
+        try:
+            profiles.remove(args.name)
+        except KeyError:
+            print(f"No profile named {args.name!r}", file=sys.stderr)
+            return 1
+        profiles.save(path)
+    elif args.command == "match":
+        with open(args.screenshot, "rb") as f:
+            profile = profiles.match(ImageFeatures(load_image(f)))
+        print(profile.name if profile else "No matching profile")
+        return 0 if profile else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""Deferred imports for heavy modules (NumPy, OpenCV)
+
+    np = lazy_import("numpy")
+
+returns a module object that is only actually imported the first time one of
+its attributes is used, so importing the editor core (e.g. in a worker that
+only needs fonts, or in a --help run) doesn't pay for NumPy and OpenCV.
+"""
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Module name, loaded on first attribute access (or already loaded)"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,98 @@
+"""Reduced-resolution display proxies for uploads and results
+
+Every st.image call sends an encoded copy of the image to the browser, and a
+column is only about a thousand pixels wide, so showing a 4K screenshot (or the
+same one three times) mostly costs time and bandwidth. Previews are scaled down
+to the display width once and cached; JPEG uploads are decoded straight at a
+reduced size (draft mode), so showing an upload never needs its full pixels.
+Processing and downloads still use the full-resolution image.
+"""
+from __future__ import annotations
+
+import io
+import threading
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from editor import ImageFeatures, load_image, normalize_mode
+from instrumentation import traced
+from result_cache import content_hash
+
+# Widest preview: about one wide-layout column on a 2x (HiDPI) display
+PREVIEW_WIDTH = 1200
+# Also caps very tall captures, which would otherwise stay full size at column width
+PREVIEW_MAX_PIXELS = 3_000_000
+
+
+def preview_size(size: Tuple[int, int], max_width: int = PREVIEW_WIDTH,
+                 max_pixels: int = PREVIEW_MAX_PIXELS) -> Tuple[int, int]:
+    """Size of the preview of an image of size (never larger than the image)"""
+    width, height = size
+    scale = min(1.0, max_width / width, (max_pixels / (width * height)) ** 0.5)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+@traced("preview.resize")
+def make_preview(image: Image.Image, max_width: int = PREVIEW_WIDTH,
+                 max_pixels: int = PREVIEW_MAX_PIXELS) -> Image.Image:
+    """image scaled down for display (image itself if it is already small enough)"""
+    size = preview_size(image.size, max_width, max_pixels)
+    if size == image.size:
+        return image
+    # reducing_gap shrinks by a whole factor first (cheap box filter), then resamples the rest;
+    # about 4x faster than a plain Lanczos resize of a 4K screenshot
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=1.0)
+
+
+@traced("preview.decode")
+def decode_preview(fp, max_width: int = PREVIEW_WIDTH, max_pixels: int = PREVIEW_MAX_PIXELS) -> Image.Image:
+    """Decode a file straight to preview size, skipping full-resolution decoding where possible"""
+    image = Image.open(fp)
+    if image.format == "JPEG":
+        # The decoder scales by 1/2, 1/4 or 1/8 on the fly, staying at least this big
+        image.draft("RGB", preview_size(image.size, max_width, max_pixels))
+    return make_preview(normalize_mode(image), max_width, max_pixels)
+
+
+class UploadedImage:
+    """An uploaded file whose full-resolution pixels are only decoded once processing needs them"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.hash = content_hash(data)
+        # Only the header is read here
+        with Image.open(io.BytesIO(data)) as header:
+            self.size = header.size
+            self.format = header.format
+        self._image: Optional[Image.Image] = None
+        self._features: Optional[ImageFeatures] = None
+        self._previews: Dict[int, Image.Image] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def image(self) -> Image.Image:
+        """Full-resolution pixels, decoded on first use (safe to call from several jobs)"""
+        with self._lock:
+            if self._image is None:
+                self._image = load_image(io.BytesIO(self.data))
+            return self._image
+
+    @property
+    def features(self) -> ImageFeatures:
+        """Shared per-image analysis (decodes the image when first used)"""
+        image = self.image
+        with self._lock:
+            if self._features is None:
+                self._features = ImageFeatures(image)
+            return self._features
+
+    def preview(self, max_width: int = PREVIEW_WIDTH) -> Image.Image:
+        """Display proxy; JPEGs are decoded at reduced size unless the full image is needed anyway"""
+        if max_width not in self._previews:
+            if self._image is None and self.format == "JPEG":
+                self._previews[max_width] = decode_preview(io.BytesIO(self.data), max_width)
+            else:
+                # Other formats have no reduced decode, and their pixels will be needed for processing
+                self._previews[max_width] = make_preview(self.image, max_width)
+        return self._previews[max_width]
@@ -0,0 +1,108 @@
+"""The editor's operations on one image, shared by the headless front ends (batch CLI, HTTP API)
+
+run_operations does the work for each requested operation and fills in the
+image's JSON record; where output images end up (files, response bytes) is
+up to the OutputSink it is given.
+"""
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from typing import BinaryIO, ContextManager, List, Optional
+
+from PIL import Image
+
+from editor import FreeScreenshotEditor, ImageFeatures, add_text_to_image, enhance_image_quality
+from streaming import StreamedFeatures, needs_streaming, stream_add_text, stream_enhance, stream_smart_blur
+
+OPERATIONS = ["alt_text", "blur", "meme", "enhance"]
+
+
+class OutputSink(ABC):
+    """Where run_operations puts output images"""
+
+    def reuse(self, operation: str, record: dict) -> bool:
+        """Use the output an identical file got earlier instead of computing it; returns whether it did"""
+        return False
+
+    @abstractmethod
+    def stream(self, operation: str) -> ContextManager[BinaryIO]:
+        """Context manager giving the binary file a streamed output (always PNG) is written to"""
+
+    @abstractmethod
+    def save(self, operation: str, image: Image.Image) -> None:
+        """Encode and store an output image"""
+
+
+def run_operations(editor: FreeScreenshotEditor, image: Image.Image, features: ImageFeatures, ops: List[str],
+                   options: dict, record: dict, sink: OutputSink, index=None,
+                   content_hash: Optional[str] = None) -> None:
+    """Run ops on image, adding results and timings to record and output images to sink
+
+    With a dedup index (and the file's content hash), alt text and text
+    detection reuse earlier results. Huge captures are blurred, enhanced and
+    captioned band by band straight into sink.stream(), get their alt text and
+    caption from statistics gathered band by band, and never use the index,
+    whose full-size analysis would break their memory bound.
+    """
+    encoding = options["encoding"]
+    streaming = needs_streaming(image)
+    record["streaming"] = streaming
+    if streaming:
+        index = None
+        features = StreamedFeatures(image)
+
+    for operation in ops:
+        op_start = time.perf_counter()
+
+        if operation == "alt_text":
+            if index is not None:
+                record["alt_text"] = index.generate_alt_text(editor, image, features, content_hash)
+            else:
+                record["alt_text"] = editor.generate_alt_text_free(image, features)
+
+        elif operation == "blur":
+            if streaming:
+                with sink.stream(operation) as fp:
+                    info = stream_smart_blur(image, fp, editor, options["blur_strength"],
+                                             compress_level=encoding.compress_level)
+            else:
+                if index is not None:
+                    dedup = index.detect_sensitive_info(editor, image, features, content_hash)
+                    info = dedup.sensitive_info
+                    record["dedup"] = {"mode": dedup.mode, "match": dedup.match,
+                                       "changed_fraction": round(dedup.changed_fraction, 4)}
+                else:
+                    info = editor.detect_sensitive_info_free(image, features)
+                if not sink.reuse(operation, record):
+                    sink.save(operation, editor.apply_smart_blur(image, options["blur_strength"], features, info)
+                              if info["found"] else image)
+            record["sensitive"] = {
+                "found": info["found"],
+                "details": info["details"],
+                "locations": info["locations"],
+            }
+            # Not in results stored by older versions
+            for key in ("area_text_boxes", "text_lines"):
+                if key in info:
+                    record["sensitive"][key] = info[key]
+            record["text_boxes"] = info["text_boxes"].tolist()
+
+        elif operation == "meme":
+            caption = editor.generate_meme_caption_free(image, features)
+            record["meme_caption"] = caption
+            if streaming:
+                with sink.stream(operation) as fp:
+                    stream_add_text(image, fp, caption, options["caption_position"],
+                                    compress_level=encoding.compress_level)
+            else:
+                sink.save(operation, add_text_to_image(image, caption, options["caption_position"]))
+
+        elif operation == "enhance":
+            if streaming:
+                with sink.stream(operation) as fp:
+                    stream_enhance(image, fp, compress_level=encoding.compress_level, **options["enhance"])
+            elif not sink.reuse(operation, record):
+                sink.save(operation, enhance_image_quality(image, **options["enhance"], features=features))
+
+        record["timings"][operation] = round(time.perf_counter() - op_start, 4)
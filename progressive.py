@@ -0,0 +1,84 @@
+"""Two-pass results: a quick answer from a small proxy first, full resolution after
+
+On a big capture every feature's full-resolution pass takes seconds. The
+quick pass runs the same feature on a proxy - the upload scaled down to a
+pixel count that fits a latency budget - so there is something to look at
+right away, while the full pass runs on the worker pool and replaces it.
+
+ProxyBudget learns how long each feature's quick pass takes per pixel and
+sizes later proxies so the quick pass stays within the budget whatever the
+size of the upload.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from PIL import Image
+
+from editor import FreeScreenshotEditor
+from previews import make_preview
+
+# Seconds the quick pass may take
+PREVIEW_BUDGET = 0.25
+MIN_PROXY_PIXELS = 50_000
+MAX_PROXY_PIXELS = 1_000_000
+# Assumed quick-pass cost until a feature has been timed (seconds per megapixel)
+INITIAL_SECONDS_PER_MEGAPIXEL = 0.4
+# Weight of the newest timing in the running average
+SMOOTHING = 0.3
+# Uploads need at least this many times the proxy's pixels for a quick pass to be worth it
+MIN_SPEEDUP = 2
+
+
+class ProxyBudget:
+    """Sizes each feature's quick-pass proxy from its measured cost per pixel (thread-safe)"""
+
+    def __init__(self, budget: float = PREVIEW_BUDGET, min_pixels: int = MIN_PROXY_PIXELS,
+                 max_pixels: int = MAX_PROXY_PIXELS):
+        self.budget = budget
+        self.min_pixels = min_pixels
+        self.max_pixels = max_pixels
+        self._seconds_per_pixel: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def proxy_pixels(self, feature: str) -> int:
+        """Largest proxy the feature's quick pass should finish within the budget on"""
+        with self._lock:
+            rate = self._seconds_per_pixel.get(feature, INITIAL_SECONDS_PER_MEGAPIXEL / 1e6)
+        return int(min(self.max_pixels, max(self.min_pixels, self.budget / rate)))
+
+    def worth_it(self, feature: str, size: Tuple[int, int]) -> bool:
+        """True if an image of size is big enough that a quick pass saves noticeable time"""
+        return size[0] * size[1] >= MIN_SPEEDUP * self.proxy_pixels(feature)
+
+    def record(self, feature: str, pixels: int, seconds: float) -> None:
+        rate = seconds / max(1, pixels)
+        with self._lock:
+            previous = self._seconds_per_pixel.get(feature)
+            self._seconds_per_pixel[feature] = rate if previous is None else (
+                SMOOTHING * rate + (1 - SMOOTHING) * previous
+            )
+
+    @contextmanager
+    def timed(self, feature: str, pixels: int) -> Iterator[None]:
+        """Time a quick pass over pixels and learn from it"""
+        start = time.perf_counter()
+        yield
+        self.record(feature, pixels, time.perf_counter() - start)
+
+
+def make_proxy(image: Image.Image, max_pixels: int) -> Image.Image:
+    """image scaled down to at most max_pixels (image itself if already that small)"""
+    return make_preview(image, image.size[0], max_pixels)
+
+
+def quick_blur(editor: FreeScreenshotEditor, proxy: Image.Image, blur_strength: int,
+               scale: float) -> Tuple[dict, Optional[Image.Image]]:
+    """Detection and blur on the proxy; scale is proxy width / full width, so the blur looks the same"""
+    info = editor.detect_sensitive_info_free(proxy)
+    if not info["found"]:
+        return info, None
+    return info, editor.apply_smart_blur(proxy, max(1, round(blur_strength * scale)), None, info)
@@ -0,0 +1,621 @@
+"""Local HTTP API for the FREE Screenshot Editor (no Streamlit needed)
+
+Other programs can get alt text, privacy blur, memes and enhancement over HTTP:
+
+    python server.py --port 8765
+    curl --data-binary @shot.png -H "Content-Type: image/png" "localhost:8765/image/blur?blur_strength=20" -o out.png
+    curl -F image=@a.png -F image=@b.jpg "localhost:8765/process?ops=alt_text,blur&images=0"
+
+Routes:
+    POST /image/<blur|meme|enhance>  one image (raw body or multipart) -> processed image bytes,
+                                     metadata in the X-Result-Metadata header (URL-encoded JSON)
+    POST /process?ops=alt_text,...   one or more images -> JSON, one result per image,
+                                     output images base64-encoded unless images=0
+    GET  /stats                      latency percentiles, throughput and worker pool load
+    GET  /health
+
+Options go in the query string: blur_strength, caption_position, sharpness,
+contrast, color, format, compress_level, quality, colors, trace. Multipart
+uploads are parsed as they arrive and every image is queued for a worker as
+soon as its part is complete, so processing overlaps the rest of the upload.
+Connections are kept alive (HTTP/1.1) and the worker threads, fonts and OpenCV
+stay loaded between requests. It listens on localhost only unless told otherwise.
+
+Load test a running server:
+    python server.py --bench shot.png --route "/process?ops=alt_text,blur" --requests 50 --concurrency 4
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import http.client
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from email.message import Message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import BinaryIO, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from PIL import Image, ImageDraw, UnidentifiedImageError
+
+from editor import FreeScreenshotEditor, ImageFeatures, enhance_image_quality, load_font, load_image
+from encoding import DEFAULT_PNG_COMPRESS_LEVEL, DEFAULT_QUALITY, FORMATS, EncodingOptions, encode_image
+from enhancement import DEFAULT_COLOR, DEFAULT_CONTRAST, DEFAULT_SHARPNESS
+from instrumentation import recording
+from jobs import DEFAULT_WORKERS, JobQueue, QueueFull
+from processing import OPERATIONS, OutputSink, run_operations
+
+logger = logging.getLogger("screenshot_editor")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Operations that produce an image (the others only produce metadata)
+IMAGE_OPERATIONS = ["blur", "meme", "enhance"]
+# Largest request body accepted (all images of a batch together)
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+# Bytes read from the socket at a time
+READ_CHUNK_SIZE = 64 * 1024
+# Seconds a request waits for its images before giving up
+REQUEST_TIMEOUT = 300
+# Seconds an idle keep-alive connection stays open
+IDLE_TIMEOUT = 60
+# Latest requests per route kept for latency percentiles
+STATS_WINDOW = 2048
+# Queued images per client (a batch request queues all of its images at once)
+MAX_PENDING_PER_CLIENT = 32
+MAX_PENDING = 256
+
+
+class APIError(Exception):
+    """A request the API refuses, with the HTTP status to answer with"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Part(NamedTuple):
+    """One part of a multipart/form-data body"""
+
+    name: Optional[str]
+    filename: Optional[str]
+    content_type: Optional[str]
+    data: bytes
+
+
+def _header_params(value: str, header: str = "content-type") -> Message:
+    """Parse a header value with parameters (e.g. a boundary or a filename)"""
+    message = Message()
+    message[header] = value
+    return message
+
+
+def iter_multipart(stream: BinaryIO, boundary: bytes, length: int,
+                   chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Part]:
+    """Parse a multipart body of length bytes off stream, yielding each part as soon as it is complete
+
+    Only the part being received is held in memory (plus one chunk); the
+    rest of the body is still on the socket when a part is yielded.
+    """
+    delimiter = b"\r\n--" + boundary
+    remaining = length
+    # The first delimiter has no line break in front of it
+    buffer = bytearray(b"\r\n")
+
+    def fill() -> bool:
+        nonlocal remaining
+        if remaining <= 0:
+            return False
+        chunk = stream.read(min(chunk_size, remaining))
+        if not chunk:
+            raise APIError(400, "Request body ended early")
+        remaining -= len(chunk)
+        buffer.extend(chunk)
+        return True
+
+    def read_until(marker: bytes, keep: Optional[List[bytes]] = None) -> None:
+        """Consume buffer up to and including marker; what came before goes into keep (if given)"""
+        start = 0
+        while True:
+            found = buffer.find(marker, start)
+            if found >= 0:
+                if keep is not None:
+                    keep.append(bytes(buffer[:found]))
+                del buffer[:found + len(marker)]
+                return
+            # Hand over everything that can't be the start of the marker, then read more
+            safe = max(0, len(buffer) - len(marker) + 1)
+            if keep is not None and safe:
+                keep.append(bytes(buffer[:safe]))
+                del buffer[:safe]
+                start = 0
+            else:
+                start = safe
+            if not fill():
+                raise APIError(400, "Malformed multipart body")
+
+    read_until(delimiter)
+    while True:
+        while len(buffer) < 2 and fill():
+            pass
+        if buffer[:2] == b"--":
+            break  # Closing delimiter
+        read_until(b"\r\n")
+        headers = {}
+        while True:
+            line: List[bytes] = []
+            read_until(b"\r\n", line)
+            line = b"".join(line)
+            if not line:
+                break  # Blank line: the part's data follows
+            key, _, value = line.decode("utf-8", "replace").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        body: List[bytes] = []
+        read_until(delimiter, body)
+        disposition = _header_params(headers.get("content-disposition", ""), "content-disposition")
+        yield Part(
+            disposition.get_param("name", header="content-disposition"),
+            disposition.get_param("filename", header="content-disposition"),
+            headers.get("content-type"),
+            b"".join(body),
+        )
+    # Skip the epilogue, so the connection can carry the next request
+    while fill():
+        buffer.clear()
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    def rank(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": rank(50), "p90_ms": rank(90), "p99_ms": rank(99), "max_ms": rank(100)}
+
+
+class RequestStats:
+    """Thread-safe request counters and recent latencies per route"""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._queue_waits: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, images: int = 0, bytes_in: int = 0,
+               bytes_out: int = 0, error: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += error
+            self.images += images
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self._latencies.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    def record_queue_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._queue_waits.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            uptime = time.time() - self.started
+            return {
+                "uptime_s": round(uptime, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "images": self.images,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "requests_per_sec": round(self.requests / uptime, 2) if uptime > 0 else 0.0,
+                "images_per_sec": round(self.images / uptime, 2) if uptime > 0 else 0.0,
+                "queue_wait": _percentiles(list(self._queue_waits)),
+                "routes": {route: dict(count=len(values), **_percentiles(list(values)))
+                           for route, values in self._latencies.items()},
+            }
+
+
+def parse_options(query: Dict[str, List[str]]) -> dict:
+    """Processing options from a parsed query string (APIError 400 for bad values)"""
+
+    def get(name: str, default, convert=str, low=None, high=None):
+        if name not in query:
+            return default
+        try:
+            value = convert(query[name][-1])
+        except ValueError:
+            raise APIError(400, f"Invalid {name}: {query[name][-1]!r}")
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise APIError(400, f"{name} must be between {low} and {high}")
+        return value
+
+    ops = [op.strip() for op in get("ops", "alt_text").split(",") if op.strip()]
+    unknown = [op for op in ops if op not in OPERATIONS]
+    if unknown:
+        raise APIError(400, f"Unknown operation(s): {', '.join(unknown)}")
+    output_format = get("format", "PNG")
+    if output_format not in FORMATS:
+        raise APIError(400, f"Unknown format {output_format!r} (one of: {', '.join(FORMATS)})")
+    caption_position = get("caption_position", "bottom")
+    if caption_position not in ("top", "bottom"):
+        raise APIError(400, "caption_position must be top or bottom")
+
+    def flag(value: str) -> bool:
+        return value.lower() in ("1", "true", "yes")
+
+    return {
+        "ops": ops,
+        "blur_strength": get("blur_strength", 15, int, 1, 30),
+        "caption_position": caption_position,
+        "enhance": {
+            "sharpness": get("sharpness", DEFAULT_SHARPNESS, float, 0.0, 5.0),
+            "contrast": get("contrast", DEFAULT_CONTRAST, float, 0.0, 5.0),
+            "color": get("color", DEFAULT_COLOR, float, 0.0, 5.0),
+        },
+        "encoding": EncodingOptions(
+            output_format,
+            get("compress_level", DEFAULT_PNG_COMPRESS_LEVEL, int, 0, 9),
+            get("quality", DEFAULT_QUALITY, int, 1, 100),
+            get("colors", None, int, 2, 256),
+        ),
+        "images": get("images", True, flag),
+        "trace": get("trace", False, flag),
+    }
+
+
+# One editor per worker thread (an editor caches the features of the image it last saw)
+_worker_state = threading.local()
+
+
+def _worker_editor() -> FreeScreenshotEditor:
+    editor = getattr(_worker_state, "editor", None)
+    if editor is None:
+        editor = _worker_state.editor = FreeScreenshotEditor()
+    return editor
+
+
+def warm_up() -> None:
+    """Load fonts, NumPy/OpenCV and the MSER detector once, before the first request needs them"""
+    image = Image.new("RGB", (320, 200), "white")
+    ImageDraw.Draw(image).text((20, 80), "warm up 12:00", fill="black", font=load_font())
+    editor = FreeScreenshotEditor()
+    features = ImageFeatures(image)
+    info = editor.detect_sensitive_info_free(image, features)
+    editor.apply_smart_blur(image, 15, features, info)
+    enhance_image_quality(image, features=features)
+    encode_image(image)
+
+
+class _ResponseSink(OutputSink):
+    """Keeps output images in memory as {operation: (bytes, MIME type)}"""
+
+    def __init__(self, encoding: EncodingOptions):
+        self.encoding = encoding
+        self.outputs: Dict[str, Tuple[bytes, str]] = {}
+
+    @contextmanager
+    def stream(self, operation: str) -> Iterator[BinaryIO]:
+        buf = io.BytesIO()
+        yield buf
+        self.outputs[operation] = (buf.getvalue(), "image/png")
+
+    def save(self, operation: str, image: Image.Image) -> None:
+        self.outputs[operation] = (encode_image(image, self.encoding), self.encoding.mime)
+
+
+def process_upload(data: bytes, ops: List[str], options: dict) -> Tuple[dict, Dict[str, Tuple[bytes, str]]]:
+    """Run ops on one uploaded image (on a worker thread)
+
+    Returns the metadata and the output images as {operation: (bytes, MIME type)}.
+    """
+    record = {"timings": {}}
+    sink = _ResponseSink(options["encoding"])
+    start = time.perf_counter()
+
+    with (recording() if options["trace"] else nullcontext()) as trace:
+        image = load_image(io.BytesIO(data))
+        features = ImageFeatures(image)
+        record["size"] = list(image.size)
+        record["timings"]["load"] = round(time.perf_counter() - start, 4)
+        run_operations(_worker_editor(), image, features, ops, options, record, sink)
+        if trace is not None:
+            record["spans"] = trace.to_dicts()
+
+    record["timings"]["total"] = round(time.perf_counter() - start, 4)
+    return record, sink.outputs
+
+
+class ScreenshotAPIServer(ThreadingHTTPServer):
+    """HTTP server whose connection threads hand images to a shared, warm worker pool"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = (DEFAULT_HOST, DEFAULT_PORT), workers: int = DEFAULT_WORKERS,
+                 max_upload_bytes: int = MAX_UPLOAD_BYTES, request_timeout: float = REQUEST_TIMEOUT):
+        warm_up()
+        self.jobs = JobQueue(workers, max_pending=MAX_PENDING, max_pending_per_session=MAX_PENDING_PER_CLIENT)
+        self.stats = RequestStats()
+        self.max_upload_bytes = max_upload_bytes
+        self.request_timeout = request_timeout
+        super().__init__(address, APIRequestHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.jobs.shutdown(wait=False)
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    """Routes one connection's requests (several, with keep-alive)"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "ScreenshotEditorAPI/1.0"
+    timeout = IDLE_TIMEOUT
+    server: ScreenshotAPIServer
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/stats":
+            self._send_json(200, dict(self.server.stats.snapshot(), workers=self.server.jobs.stats()))
+        else:
+            self._send_json(404, {"error": f"No such route: {path}"})
+
+    def do_POST(self) -> None:
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        self._bytes_in = 0
+        self._body_read = False
+        images, bytes_out, error = 0, 0, False
+        try:
+            options = parse_options(parse_qs(url.query))
+            if url.path == "/process":
+                images, bytes_out = self._process(options)
+            elif url.path.startswith("/image/"):
+                operation = url.path[len("/image/"):]
+                if operation not in IMAGE_OPERATIONS:
+                    raise APIError(404, f"No image operation {operation!r} "
+                                        f"(one of: {', '.join(IMAGE_OPERATIONS)})")
+                options["ops"] = [operation]
+                images, bytes_out = self._process_one(operation, options)
+            else:
+                raise APIError(404, f"No such route: {url.path}")
+        except APIError as e:
+            error = True
+            self._fail(e.status, str(e))
+        except QueueFull as e:
+            error = True
+            self._fail(503, f"Server busy: {e}", {"Retry-After": "1"})
+        except Exception as e:
+            error = True
+            logger.error(f"Error handling {url.path}: {str(e)}")
+            self._fail(500, str(e))
+        known = url.path == "/process" or (
+            url.path.startswith("/image/") and url.path[len("/image/"):] in IMAGE_OPERATIONS
+        )
+        self.server.stats.record(url.path if known else "other", time.perf_counter() - start, images,
+                                 self._bytes_in, bytes_out, error)
+
+    def _fail(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        # A body we didn't read would be taken for the next request
+        if not self._body_read:
+            self.close_connection = True
+        self._send_json(status, {"error": message}, headers)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> int:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None) -> int:
+        return self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _uploads(self) -> Iterator[Tuple[Optional[str], bytes]]:
+        """(filename, bytes) of every uploaded image, as each one finishes arriving"""
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            raise APIError(411, "Send a Content-Length (chunked uploads are not supported)")
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            raise APIError(411, "Content-Length required")
+        if length > self.server.max_upload_bytes:
+            raise APIError(413, f"Upload larger than {self.server.max_upload_bytes} bytes")
+        self._bytes_in = length
+
+        content_type = _header_params(self.headers.get("Content-Type", "application/octet-stream"))
+        if content_type.get_content_type() == "multipart/form-data":
+            boundary = content_type.get_param("boundary")
+            if not boundary:
+                raise APIError(400, "multipart/form-data without a boundary")
+            for part in iter_multipart(self.rfile, boundary.encode("latin-1"), length):
+                # Non-file fields are ignored - options go in the query string
+                if part.filename is not None or part.name in ("image", "images", "file"):
+                    yield part.filename, part.data
+        else:
+            # The body is one image
+            chunks = []
+            while length > 0:
+                chunk = self.rfile.read(min(READ_CHUNK_SIZE, length))
+                if not chunk:
+                    raise APIError(400, "Request body ended early")
+                chunks.append(chunk)
+                length -= len(chunk)
+            yield None, b"".join(chunks)
+        self._body_read = True
+
+    def _submit(self, data: bytes, options: dict):
+        # Clients share the workers round robin
+        return self.server.jobs.submit(self.client_address[0], process_upload, data, options["ops"], options)
+
+    def _result(self, job) -> Tuple[dict, Dict[str, Tuple[bytes, str]]]:
+        try:
+            result = job.result(self.server.request_timeout)
+        except TimeoutError:
+            self.server.jobs.cancel(job)
+            raise APIError(504, "Processing took too long")
+        self.server.stats.record_queue_wait(job.started_at - job.submitted_at)
+        return result
+
+    def _process(self, options: dict) -> Tuple[int, int]:
+        """POST /process: every uploaded image -> one JSON result each"""
+        submitted = []
+        try:
+            for filename, data in self._uploads():
+                # Queue each image as soon as it has arrived; the next one is still uploading
+                submitted.append((filename, self._submit(data, options)))
+        except Exception:
+            for _, job in submitted:
+                self.server.jobs.cancel(job)
+            raise
+        if not submitted:
+            raise APIError(400, "No image in the request")
+
+        results = []
+        for filename, job in submitted:
+            try:
+                record, outputs = self._result(job)
+            except APIError:
+                raise
+            except UnidentifiedImageError:
+                record, outputs = {"error": "Not an image"}, {}
+            except Exception as e:
+                record, outputs = {"error": str(e)}, {}
+            record["filename"] = filename
+            if options["images"] and outputs:
+                record["images"] = {operation: {"mime": mime, "data": base64.b64encode(data).decode("ascii")}
+                                    for operation, (data, mime) in outputs.items()}
+            results.append(record)
+        return len(results), self._send_json(200, {"results": results})
+
+    def _process_one(self, operation: str, options: dict) -> Tuple[int, int]:
+        """POST /image/<operation>: one image -> the processed image's bytes"""
+        uploads = iter(self._uploads())
+        upload = next(uploads, None)
+        if upload is None:
+            raise APIError(400, "No image in the request")
+        if next(uploads, None) is not None:
+            raise APIError(400, "Send one image (use /process for several)")
+        try:
+            record, outputs = self._result(self._submit(upload[1], options))
+        except UnidentifiedImageError:
+            raise APIError(415, "Not an image")
+        data, mime = outputs[operation]
+        record.pop("text_boxes", None)  # Can be thousands of boxes - ask /process for them
+        return 1, self._send(200, data, mime, {"X-Result-Metadata": quote(json.dumps(record))})
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = DEFAULT_WORKERS) -> None:
+    """Run the API until interrupted"""
+    with ScreenshotAPIServer((host, port), workers) as server:
+        print(f"📸 Screenshot Editor API on http://{host}:{server.server_address[1]} ({workers} workers)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def bench(url: str, image_path: str, route: str = "/image/blur", requests: int = 20,
+          concurrency: int = 4) -> dict:
+    """Send requests copies of an image to a running server from concurrency keep-alive connections
+
+    Returns client-side latency percentiles and throughput, plus the server's /stats.
+    """
+    target = urlsplit(url)
+    with open(image_path, "rb") as f:
+        data = f.read()
+    content_type = Image.MIME.get(Image.open(io.BytesIO(data)).format, "application/octet-stream")
+    latencies: List[float] = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client() -> None:
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=REQUEST_TIMEOUT)
+        try:
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        return
+                request_start = time.perf_counter()
+                connection.request("POST", route, body=data, headers={"Content-Type": content_type})
+                response = connection.getresponse()
+                response.read()
+                with lock:
+                    latencies.append(time.perf_counter() - request_start)
+                    if response.status != 200:
+                        errors.append(response.status)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80)
+    connection.request("GET", "/stats")
+    server_stats = json.loads(connection.getresponse().read())
+    connection.close()
+    return {
+        "route": route,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency": _percentiles(latencies),
+        "server": server_stats,
+    }
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local HTTP API for the FREE Screenshot Editor")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Images processed at once")
+    parser.add_argument("--bench", metavar="IMAGE", default=None,
+                        help="Load-test a running server with this image instead of serving")
+    parser.add_argument("--route", default="/image/blur", help="Route to load-test (with query string)")
+    parser.add_argument("-n", "--requests", type=int, default=20, help="Load test: total requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Load test: parallel connections")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    if args.bench:
+        result = bench(f"http://{args.host}:{args.port}", args.bench, args.route, args.requests, args.concurrency)
+        print(json.dumps(result, indent=2))
+        return 1 if result["errors"] else 0
+    serve(args.host, args.port, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
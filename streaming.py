@@ -0,0 +1,353 @@
+"""Bounded-memory band streaming for extremely tall screenshots
+
+Full-page captures (e.g. 1080x40000) are processed as horizontal bands with
+overlap. The decoded input is the only full-size buffer: detection, blur and
+enhancement work on one band at a time and the output PNG is written band by
+band, so peak memory stays near one frame plus a fixed budget.
+"""
+from __future__ import annotations
+
+import struct
+import zlib
+from functools import cached_property
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from boxes import TextBoxes
+from editor import caption_layer_top, render_caption_layer
+from enhancement import DEFAULT_COLOR, DEFAULT_CONTRAST, DEFAULT_SHARPNESS, enhance_pixels
+from instrumentation import traced
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# Images with more pixels than this go through the streaming pipeline
+STREAMING_MIN_PIXELS = 20_000_000
+# Working memory for band-sized buffers (on top of the decoded input)
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Band-sized copies alive at once (band, RGB/gray, MSER, mask, blurred, output rows...)
+WORKING_COPIES = 8
+# Rows Canny reads past a band (Sobel aperture plus non-maximum suppression)
+EDGE_CONTEXT = 4
+
+def needs_streaming(image: Image.Image, min_pixels: int = STREAMING_MIN_PIXELS) -> bool:
+    """True if image is big enough that it should be processed in bands"""
+    width, height = image.size
+    return width * height > min_pixels
+
+
+def band_height_for(width: int, channels: int = 3, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                    context: int = 0) -> int:
+    """Rows per band so that band-sized working buffers fit in memory_budget"""
+    rows = memory_budget // (width * channels * WORKING_COPIES) - 2 * context
+    return max(64, rows)
+
+
+def iter_bands(height: int, band_height: int, context: int = 0) -> Iterator[Tuple[int, int, int, int]]:
+    """Yield (y0, y1, read_y0, read_y1): output rows plus the rows to read for context"""
+    for y0 in range(0, height, band_height):
+        y1 = min(height, y0 + band_height)
+        yield y0, y1, max(0, y0 - context), min(height, y1 + context)
+
+
+class StreamingPNGWriter:
+    """Write a PNG incrementally, one band of rows at a time
+
+    With preview_size, each band is also shrunk into a small display copy as it
+    goes by, so the result can be previewed without decoding the PNG again.
+    """
+
+    # PIL mode -> (PNG color type, channels)
+    MODES = {"L": (0, 1), "RGB": (2, 3), "RGBA": (6, 4)}
+    # Emit an IDAT chunk whenever this much compressed data is pending
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, fp: BinaryIO, width: int, height: int, mode: str = "RGB", compress_level: int = 6,
+                 preview_size: Optional[Tuple[int, int]] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported mode for streaming PNG: {mode}")
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.rows_written = 0
+        self._color_type, self._channels = self.MODES[mode]
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        self.preview_size = preview_size
+        self._preview_bands: List[np.ndarray] = []
+
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, self._color_type, 0, 0, 0))
+
+    def __enter__(self) -> "StreamingPNGWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self.fp.write(struct.pack(">I", len(data)))
+        self.fp.write(chunk_type)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """Append rows (height, width[, channels]) of uint8 pixels"""
+        if self.preview_size is not None:
+            self._add_preview_rows(rows)
+        rows = rows.reshape(rows.shape[0], self.width * self._channels)
+        channels = self._channels
+
+        # "Sub" filter: each byte minus the same channel one pixel to the left (compresses UI well)
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:1 + channels] = rows[:, :channels]
+        np.subtract(rows[:, channels:], rows[:, :-channels], out=filtered[:, 1 + channels:])
+
+        self._pending += self._compressor.compress(filtered.tobytes())
+        if len(self._pending) >= self.CHUNK_SIZE:
+            self._write_chunk(b"IDAT", bytes(self._pending))
+            self._pending.clear()
+        self.rows_written += rows.shape[0]
+
+    def _add_preview_rows(self, rows: np.ndarray) -> None:
+        """Shrink a band into the preview rows it covers"""
+        preview_width, preview_height = self.preview_size
+        top = self.rows_written * preview_height // self.height
+        bottom = (self.rows_written + rows.shape[0]) * preview_height // self.height
+        if bottom > top:
+            self._preview_bands.append(cv2.resize(rows, (preview_width, bottom - top), interpolation=cv2.INTER_AREA))
+
+    @property
+    def preview(self) -> Optional[Image.Image]:
+        """The preview_size copy of the rows written so far (None without preview_size)"""
+        if not self._preview_bands:
+            return None
+        return Image.fromarray(np.concatenate(self._preview_bands), mode=self.mode)
+
+    def write_image(self, band: Image.Image) -> None:
+        """Append a band of the output image"""
+        if band.mode != self.mode:
+            band = band.convert(self.mode)
+        self.write_rows(np.asarray(band))
+
+    def close(self) -> None:
+        """Finish the compressed stream and the PNG file"""
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} rows, expected {self.height}")
+        self._pending += self._compressor.flush()
+        self._write_chunk(b"IDAT", bytes(self._pending))
+        self._pending.clear()
+        self._write_chunk(b"IEND", b"")
+
+
+def _output_mode(image: Image.Image) -> str:
+    """Closest PNG mode the streaming writer supports"""
+    return image.mode if image.mode in StreamingPNGWriter.MODES else "RGB"
+
+
+def _band_rgb(image: Image.Image, y0: int, y1: int) -> Image.Image:
+    """One horizontal band of image as RGB"""
+    band = image.crop((0, y0, image.size[0], y1))
+    return band if band.mode == "RGB" else band.convert("RGB")
+
+
+def _open_output(out: Union[str, BinaryIO]):
+    """File object for a path or an already open binary stream"""
+    return open(out, "wb") if isinstance(out, str) else out
+
+
+def stream_mean_gray(image: Image.Image, y0: int, y1: int, band_height: int) -> float:
+    """Mean brightness of rows y0..y1, read one band at a time"""
+    width = image.size[0]
+    total = 0.0
+    for b0 in range(y0, y1, band_height):
+        b1 = min(y1, b0 + band_height)
+        gray = np.asarray(image.crop((0, b0, width, b1)).convert("L"))
+        total += float(gray.sum(dtype=np.float64))
+    return total / max(1, (y1 - y0) * width)
+
+
+class StreamedFeatures:
+    """The image statistics alt text and meme captions use, gathered band by band
+
+    Stands in for editor.ImageFeatures on captures too big to analyse whole.
+    Brightness and edge density are summed one band at a time (Canny reads a
+    few rows past each band, so edges only differ where one crosses a band
+    edge); unique_colors reads just the rows its 50x50 thumbnail samples.
+    """
+
+    def __init__(self, image: Image.Image, band_height: Optional[int] = None,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.image = image
+        self.width, self.height = image.size
+        self.band_height = band_height or band_height_for(self.width, 3, memory_budget, EDGE_CONTEXT)
+
+    @cached_property
+    def _gray_stats(self) -> Tuple[float, float]:
+        """(mean brightness, edge pixel fraction)"""
+        gray_total, edge_count = 0.0, 0
+        for y0, y1, read_y0, read_y1 in iter_bands(self.height, self.band_height, EDGE_CONTEXT):
+            gray = np.asarray(_band_rgb(self.image, read_y0, read_y1).convert("L"))
+            gray_total += float(gray[y0 - read_y0:y1 - read_y0].sum(dtype=np.float64))
+            edge_count += np.count_nonzero(cv2.Canny(gray, 50, 150)[y0 - read_y0:y1 - read_y0])
+        pixels = self.width * self.height
+        return gray_total / pixels, edge_count / pixels
+
+    @property
+    def brightness(self) -> float:
+        return self._gray_stats[0]
+
+    @property
+    def edge_density(self) -> float:
+        return self._gray_stats[1]
+
+    @cached_property
+    def unique_colors(self) -> int:
+        """Number of distinct colors in a 50x50 thumbnail (made from 50 sampled rows)"""
+        rows = [min(self.height - 1, (2 * i + 1) * self.height // 100) for i in range(50)]
+        sampled = np.concatenate([np.asarray(_band_rgb(self.image, y, y + 1)) for y in rows])
+        img_small = np.ascontiguousarray(cv2.resize(sampled, (50, 50)).reshape(-1, 3))
+        return len(np.unique(img_small.view(np.dtype((np.void, img_small.dtype.itemsize * 3)))))
+
+
+def _owned_boxes(window_boxes: TextBoxes, y0: int, y1: int, read_y0: int) -> TextBoxes:
+    """Boxes found in a window read from read_y0, in image coordinates, that belong to band y0-y1
+
+    A box belongs to the band its top edge is in, so overlap duplicates are dropped.
+    """
+    boxes = window_boxes.offset(0, read_y0)
+    top = boxes.array[:, 1]
+    return boxes[(top >= y0) & (top < y1)]
+
+
+def stream_detect_text_regions(image: Image.Image, editor, band_height: Optional[int] = None,
+                               overlap: int = 64,
+                               memory_budget: int = DEFAULT_MEMORY_BUDGET) -> TextBoxes:
+    """Run editor.detect_text_regions band by band and return full-image boxes"""
+    width, height = image.size
+    band_height = band_height or band_height_for(width, 3, memory_budget, overlap)
+
+    parts = []
+    for y0, y1, read_y0, read_y1 in iter_bands(height, band_height, overlap):
+        band = _band_rgb(image, read_y0, read_y1)
+        window_boxes = editor.detect_text_regions(band, detection_pixels=width * height)
+        parts.append(_owned_boxes(window_boxes, y0, y1, read_y0))
+    return TextBoxes.concat(parts)
+
+
+@traced("stream.smart_blur")
+def stream_smart_blur(image: Image.Image, out: Union[str, BinaryIO], editor, blur_strength: int = 15,
+                      band_height: Optional[int] = None, overlap: int = 64,
+                      memory_budget: int = DEFAULT_MEMORY_BUDGET, compress_level: int = 6,
+                      preview_size: Optional[Tuple[int, int]] = None) -> dict:
+    """Privacy-blur image band by band, writing the PNG to out
+
+    Returns the same kind of dict as detect_sensitive_info_free, plus a
+    "preview" image of the result when preview_size is given.
+    """
+    width, height = image.size
+    # Enough context that both MSER and the blur see past the band edges
+    context = max(overlap, 3 * blur_strength)
+    band_height = band_height or band_height_for(width, 3, memory_budget, context)
+
+    # The same areas detect_sensitive_info_free would flag, with the brightness measured band by band
+    layout = editor.match_layout(image)
+    areas = editor.sensitive_areas(image.size, lambda ay1, ay2: stream_mean_gray(image, ay1, ay2, band_height),
+                                   layout)
+    parts = []
+
+    fp = _open_output(out)
+    try:
+        with StreamingPNGWriter(fp, width, height, _output_mode(image), compress_level, preview_size) as writer:
+            for y0, y1, read_y0, read_y1 in iter_bands(height, band_height, context):
+                window = _band_rgb(image, read_y0, read_y1)
+                window_boxes = editor.detect_text_regions(window, detection_pixels=width * height)
+                if layout is not None:
+                    window_boxes = layout.restrict(window_boxes.offset(0, read_y0)).offset(0, -read_y0)
+                parts.append(_owned_boxes(window_boxes, y0, y1, read_y0))
+
+                # Sensitive areas that reach into this window, in window coordinates
+                window_areas = [
+                    (ax1, max(ay1, read_y0) - read_y0, ax2, min(ay2, read_y1) - read_y0)
+                    for ax1, ay1, ax2, ay2 in areas[2]
+                    if ay1 < read_y1 and ay2 > read_y0
+                ]
+                window_boxes = TextBoxes.concat([window_boxes, window_areas])
+
+                if image.mode != "RGB":
+                    window = image.crop((0, read_y0, width, read_y1))
+                # The window is a fresh crop, so it can be blurred in place
+                blurred = editor.blur_regions(window, window_boxes, blur_strength, in_place=True)
+                writer.write_image(blurred.crop((0, y0 - read_y0, width, y1 - read_y0)))
+    finally:
+        if fp is not out:
+            fp.close()
+
+    info = editor.summarize_sensitive_info(image.size, areas, TextBoxes.concat(parts))
+    if preview_size is not None:
+        info["preview"] = writer.preview
+    return info
+
+
+@traced("stream.enhance")
+def stream_enhance(image: Image.Image, out: Union[str, BinaryIO], band_height: Optional[int] = None,
+                   memory_budget: int = DEFAULT_MEMORY_BUDGET, compress_level: int = 6,
+                   sharpness: float = DEFAULT_SHARPNESS, contrast: float = DEFAULT_CONTRAST,
+                   color: float = DEFAULT_COLOR,
+                   preview_size: Optional[Tuple[int, int]] = None) -> Optional[Image.Image]:
+    """enhance_image_quality band by band, writing the PNG to out
+
+    Returns a preview_size copy of the result if preview_size is given.
+    """
+    width, height = image.size
+    context = 2  # The sharpen kernel looks one pixel past the band
+    band_height = band_height or band_height_for(width, 3, memory_budget, context)
+    mode = _output_mode(image)
+
+    # Contrast is relative to the whole image's mean brightness
+    mean = stream_mean_gray(image, 0, height, band_height)
+
+    fp = _open_output(out)
+    try:
+        with StreamingPNGWriter(fp, width, height, mode, compress_level, preview_size) as writer:
+            for y0, y1, read_y0, read_y1 in iter_bands(height, band_height, context):
+                window = image.crop((0, read_y0, width, read_y1))
+                if window.mode != mode:
+                    window = window.convert(mode)
+                enhanced = enhance_pixels(np.asarray(window), sharpness, contrast, color, mean)
+                writer.write_rows(enhanced[y0 - read_y0:y1 - read_y0])
+    finally:
+        if fp is not out:
+            fp.close()
+    return writer.preview
+
+
+@traced("stream.add_text")
+def stream_add_text(image: Image.Image, out: Union[str, BinaryIO], text: str, position: str = "bottom",
+                    band_height: Optional[int] = None, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                    compress_level: int = 6) -> None:
+    """add_text_to_image band by band, writing the PNG to out"""
+    width, height = image.size
+    band_height = band_height or band_height_for(width, 3, memory_budget)
+    mode = _output_mode(image)
+    layer = render_caption_layer(text, width)
+    top = caption_layer_top(layer, height, position)
+
+    fp = _open_output(out)
+    try:
+        with StreamingPNGWriter(fp, width, height, mode, compress_level) as writer:
+            for y0, y1, _, _ in iter_bands(height, band_height):
+                band = image.crop((0, y0, width, y1))
+                if band.mode != mode:
+                    band = band.convert(mode)
+                if top < y1 and top + layer.size[1] > y0:
+                    band.paste(layer, (0, top - y0), layer)
+                writer.write_image(band)
+    finally:
+        if fp is not out:
+            fp.close()
@@ -0,0 +1,38 @@
+import json
+
+from PIL import Image
+
+from batch import find_images, run_batch
+
+
+def make_images(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (120, 80), (200, 30, 30)).save(path)
+
+
+def test_find_images_avoids_output_collisions(tmp_path):
+    make_images(tmp_path, ["a/x.png", "b/x.png", "a/x.jpg"])
+    rels = [rel for _, rel in find_images([str(tmp_path / "a"), str(tmp_path / "b")])]
+    stems = {rel.rsplit(".", 1)[0] for rel in rels}
+    assert len(rels) == len(stems) == 3
+
+
+def test_resume_only_skips_images_done_with_the_same_settings(tmp_path):
+    make_images(tmp_path / "in", ["one.png", "two.png"])
+    inputs, out_dir = [str(tmp_path / "in")], str(tmp_path / "out")
+
+    def run(**kwargs):
+        return run_batch(inputs, out_dir, kwargs.pop("ops", ["alt_text"]), workers=1, use_index=False, **kwargs)
+
+    assert run()["processed"] == 2
+    again = run()
+    assert (again["skipped"], again["processed"]) == (2, 0)
+    changed = run(ops=["alt_text", "blur"], blur_strength=5)
+    assert (changed["skipped"], changed["processed"]) == (0, 2)
+
+    with open(tmp_path / "out" / "manifest.jsonl", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records[-1]["settings"]["ops"] == ["alt_text", "blur"]
+    assert records[-1]["settings"]["blur_strength"] == 5
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from boxes import TextBoxes
+
+
+def brute_force(boxes, rect):
+    x1, y1, x2, y2 = rect
+    return np.flatnonzero((boxes[:, 0] < x2) & (boxes[:, 2] > x1) & (boxes[:, 1] < y2) & (boxes[:, 3] > y1))
+
+
+def random_boxes(rng, n, low=-300, high=1000):
+    x1, y1 = rng.integers(low, high, n), rng.integers(low, high, n)
+    return np.stack([x1, y1, x1 + rng.integers(0, 150, n), y1 + rng.integers(0, 150, n)], axis=1)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("cell_size", [16, 64])
+def test_query_matches_brute_force(seed, cell_size):
+    rng = np.random.default_rng(seed)
+    boxes = random_boxes(rng, int(rng.integers(1, 300)))
+    text_boxes = TextBoxes(boxes, cell_size)
+    for _ in range(50):
+        x, y = rng.integers(-400, 1200, 2)
+        rect = (int(x), int(y), int(x + rng.integers(1, 400)), int(y + rng.integers(1, 400)))
+        assert np.array_equal(text_boxes.query(rect), brute_force(boxes, rect)), rect
+        assert text_boxes.count_in(rect) == len(brute_force(boxes, rect))
+
+
+def test_query_at_negative_offsets():
+    boxes = TextBoxes([(-100, 0, -10, 10), (-50, -50, -40, -40), (0, 0, 10, 10), (500, 500, 520, 520)])
+    assert boxes.query((-60, 0, -20, 10)).tolist() == [0]
+    assert boxes.query((-1000, -1000, 0, 0)).tolist() == [1]
+    assert boxes.query((-5, -5, 5, 5)).tolist() == [2]
+    # Past the grid's last cell
+    assert boxes.query((2000, 2000, 3000, 3000)).tolist() == []
+
+
+def test_empty_and_degenerate_queries():
+    assert TextBoxes().query((0, 0, 10, 10)).tolist() == []
+    boxes = TextBoxes([(0, 0, 10, 10)])
+    assert boxes.query((5, 5, 5, 20)).tolist() == []
+    assert boxes.query((10, 0, 20, 10)).tolist() == []  # Touching edges don't overlap
+
+
+def test_lines():
+    words = [(10, 10, 40, 20), (45, 11, 80, 21), (300, 10, 330, 20),  # Two columns on one row
+             (10, 40, 50, 50), (55, 41, 90, 50)]
+    labels, lines = TextBoxes(words).lines()
+    assert labels.tolist() == [0, 0, 1, 2, 2]
+    assert lines.tolist() == [[10, 10, 80, 21], [300, 10, 330, 20], [10, 40, 90, 50]]
+
+
+def test_density_matches_brute_force():
+    rng = np.random.default_rng(0)
+    boxes = random_boxes(rng, 200, low=-50, high=300)
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]  # Empty boxes cover no cell
+    size, cell = (320, 250), 32
+    expected = np.zeros((-(-size[1] // cell), -(-size[0] // cell)), dtype=np.int64)
+    for row in range(expected.shape[0]):
+        for col in range(expected.shape[1]):
+            rect = (col * cell, row * cell, (col + 1) * cell, (row + 1) * cell)
+            expected[row, col] = len(brute_force(boxes, rect))
+    assert np.array_equal(TextBoxes(boxes).density(size, cell), expected)
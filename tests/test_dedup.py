@@ -0,0 +1,24 @@
+import numpy as np
+from PIL import Image
+
+from dedup import DedupIndex
+from editor import FreeScreenshotEditor
+from layouts import LayoutProfiles, create_profile
+
+
+def test_results_are_only_reused_with_the_same_detection_settings(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, (300, 400, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    editor = FreeScreenshotEditor(detection_mode="full", layouts=LayoutProfiles())
+
+    with DedupIndex(str(tmp_path / "index.sqlite3")) as index:
+        def mode(editor):
+            return index.detect_sensitive_info(editor, image, content_hash="same").mode
+
+        assert mode(editor) == "full"
+        assert mode(editor) == "exact"
+        assert mode(FreeScreenshotEditor(detection_mode="tiled", layouts=LayoutProfiles())) == "full"
+        profile = create_profile("app", editor.get_features(image), exclude=[(0, 0, 400, 40)])
+        assert mode(FreeScreenshotEditor(detection_mode="tiled", layouts=LayoutProfiles([profile]))) == "full"
+        assert mode(FreeScreenshotEditor(detection_mode="tiled", layouts=LayoutProfiles([profile]))) == "exact"
+        assert index.counts == {"exact": 2, "reused": 0, "incremental": 0, "full": 3}
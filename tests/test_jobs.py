@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from jobs import Job, JobCancelled, JobQueue, QueueFull
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1)
+    yield queue
+    queue.shutdown()
+
+
+def block(queue):
+    """Occupy the single worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def wait():
+        started.set()
+        release.wait(5)
+
+    queue.submit("blocker", wait)
+    assert started.wait(5)
+    return release
+
+
+def test_round_robin_between_sessions(queue):
+    release = block(queue)
+    order = []
+    jobs = [queue.submit(session, order.append, name)
+            for session, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1"), ("b", "b2")]]
+    jobs.append(queue.submit_background("c", order.append, "background"))
+    assert [queue.position(job) for job in jobs] == [1, 4, 6, 2, 3, 5, 7]
+
+    release.set()
+    for job in jobs:
+        job.result(5)
+    assert order == ["a1", "b1", "c1", "a2", "b2", "a3", "background"]
+
+
+def test_cancel(queue):
+    release = block(queue)
+    ran = []
+    first = queue.submit("a", ran.append, 1)
+    second = queue.submit("a", ran.append, 2)
+    other = queue.submit("b", ran.append, 3)
+    background = queue.submit_background("a", ran.append, 4)
+
+    assert queue.cancel(first)
+    assert not queue.cancel(first)
+    assert queue.cancel_session("a") == 2
+    assert queue.stats()["queued"] == 1
+    release.set()
+
+    assert other.result(5) is None
+    for job in (first, second, background):
+        assert job.status == Job.CANCELLED
+        with pytest.raises(JobCancelled):
+            job.result(5)
+    assert ran == [3]
+    # Too late to cancel a finished job
+    assert not queue.cancel(other)
+    assert queue.stats()["cancelled"] == 3
+
+
+def test_queue_full():
+    queue = JobQueue(workers=1, max_pending=3, max_pending_per_session=2)
+    try:
+        release = block(queue)
+        queue.submit("a", lambda: None)
+        queue.submit("a", lambda: None)
+        with pytest.raises(QueueFull):
+            queue.submit("a", lambda: None)
+        queue.submit("b", lambda: None)
+        with pytest.raises(QueueFull):
+            queue.submit("c", lambda: None)
+        with pytest.raises(QueueFull):
+            queue.submit_background("c", lambda: None)
+        release.set()
+    finally:
+        queue.shutdown()
+
+
+def test_failed_job_reraises(queue):
+    job = queue.submit("a", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        job.result(5)
+    assert job.status == Job.FAILED
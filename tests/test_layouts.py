@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from editor import FreeScreenshotEditor, ImageFeatures
+from layouts import LayoutProfile, LayoutProfiles, create_profile
+
+
+def covered(areas, size):
+    mask = np.zeros(size[::-1], dtype=int)
+    for x1, y1, x2, y2 in areas:
+        mask[y1:y2, x1:x2] += 1
+    return mask
+
+
+def test_scan_areas_leave_out_the_exclude_areas():
+    profile = LayoutProfile("app", (400, 300), include=((0, 40, 400, 300),),
+                            exclude=((0, 0, 400, 60), (0, 60, 100, 300), (300, 250, 400, 300)))
+    mask = covered(profile.scan_areas(), profile.size)
+    expected = np.zeros_like(mask)
+    expected[60:300, 100:400] = 1
+    expected[250:300, 300:400] = 0
+    assert np.array_equal(mask, expected)
+
+
+def test_detection_never_reads_excluded_pixels(monkeypatch):
+    width, height = 800, 600
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    profile = create_profile("app", ImageFeatures(image), exclude=[(0, 0, width, 120), (0, 120, 300, height)])
+
+    scanned = []
+    mser_boxes = ImageFeatures.mser_boxes
+
+    def recording(self, *args):
+        scanned.append(args[-1])
+        return mser_boxes(self, *args)
+
+    monkeypatch.setattr(ImageFeatures, "mser_boxes", recording)
+    features = ImageFeatures(image)
+    editor = FreeScreenshotEditor(detection_mode="full", layouts=LayoutProfiles([profile]))
+    boxes = editor.detect_text_regions(image, features)
+
+    assert scanned == [(300, 120, width, height)]
+    assert "gray" not in features.__dict__  # Only the scanned area was converted
+    assert (boxes.array[:, 1] >= 120).all() and (boxes.array[:, 0] >= 300).all()
+
+
+def test_profile_needs_chrome():
+    features = ImageFeatures(Image.new("RGB", (200, 100)))
+    with pytest.raises(ValueError):
+        create_profile("app", features, include=[(0, 0, 100, 100)])
+    # Profiles saved without fingerprints match nothing
+    assert LayoutProfiles([LayoutProfile("old", (200, 100))]).match(features) is None
+    assert LayoutProfiles([create_profile("app", features, exclude=[(0, 0, 200, 20)])]).match(features)
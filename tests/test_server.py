@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+from server import APIError, iter_multipart
+
+BOUNDARY = b"xyzBOUNDARY"
+
+
+def multipart_body(parts, preamble=b"", epilogue=b""):
+    body = preamble
+    for headers, data in parts:
+        body += b"--" + BOUNDARY + b"\r\n" + b"".join(h + b"\r\n" for h in headers) + b"\r\n" + data + b"\r\n"
+    return body + b"--" + BOUNDARY + b"--" + epilogue
+
+
+PARTS = [
+    ([b'Content-Disposition: form-data; name="image"; filename="a.png"', b"Content-Type: image/png"],
+     # Data that looks like the start of a delimiter must survive
+     b"\x89PNG\r\n-\r\n--xyz\r\n--xyzBOUNDAR" + bytes(range(256))),
+    ([b'Content-Disposition: form-data; name="note"'], b""),
+    ([b'Content-Disposition: form-data; name="image"; filename="b.png"'], b"\r\n" * 10),
+]
+
+
+def parse(body, chunk_size, trailing=b""):
+    stream = io.BytesIO(body + trailing)
+    return list(iter_multipart(stream, BOUNDARY, len(body), chunk_size)), stream
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 13, len(BOUNDARY) + 4, 64, 1 << 20])
+def test_parts_split_across_chunks(chunk_size):
+    body = multipart_body(PARTS, preamble=b"preamble\r\n", epilogue=b"\r\nepilogue\r\n")
+    parts, _ = parse(body, chunk_size)
+
+    assert [(p.name, p.filename, p.data) for p in parts] == [
+        ("image", "a.png", PARTS[0][1]),
+        ("note", None, b""),
+        ("image", "b.png", PARTS[2][1]),
+    ]
+    assert parts[0].content_type == "image/png"
+    assert parts[1].content_type is None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64])
+@pytest.mark.parametrize("epilogue", [b"", b"\r\n", b"\r\nepilogue --xyzBOUNDARY-- more"])
+def test_epilogue_consumed_but_not_the_next_request(chunk_size, epilogue):
+    body = multipart_body(PARTS[:1], epilogue=epilogue)
+    parts, stream = parse(body, chunk_size, trailing=b"GET /health HTTP/1.1")
+
+    assert len(parts) == 1
+    # A keep-alive connection's next request is left on the stream
+    assert stream.read() == b"GET /health HTTP/1.1"
+
+
+def test_no_parts():
+    parts, _ = parse(b"--" + BOUNDARY + b"--\r\n", 4)
+    assert parts == []
+
+
+@pytest.mark.parametrize("body", [
+    b"no delimiter at all",
+    multipart_body(PARTS[:1])[:-len(BOUNDARY) - 4],  # Closing delimiter missing
+    b"--" + BOUNDARY + b"\r\nContent-Disposition: form-data; name=\"x\"\r\n",  # Headers never end
+])
+def test_malformed(body):
+    with pytest.raises(APIError) as e:
+        parse(body, 8)
+    assert e.value.status == 400
+
+
+def test_body_shorter_than_content_length():
+    body = multipart_body(PARTS)
+    stream = io.BytesIO(body[:-20])
+    with pytest.raises(APIError) as e:
+        list(iter_multipart(stream, BOUNDARY, len(body), 16))
+    assert e.value.status == 400
@@ -0,0 +1,88 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmark import make_screenshot
+from editor import FreeScreenshotEditor, ImageFeatures, add_text_to_image
+from streaming import StreamedFeatures, StreamingPNGWriter, stream_add_text, stream_smart_blur
+
+
+@pytest.mark.parametrize("mode,channels", [("L", 1), ("RGB", 3), ("RGBA", 4)])
+def test_png_round_trip(mode, channels, monkeypatch):
+    # Small IDAT chunks, so the image spans several of them
+    monkeypatch.setattr(StreamingPNGWriter, "CHUNK_SIZE", 1024)
+    rng = np.random.default_rng(0)
+    width, height = 97, 301
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    pixels = rng.integers(0, 256, shape, dtype=np.uint8)
+    pixels[:100] //= 64  # Some compressible rows too
+
+    buf = io.BytesIO()
+    with StreamingPNGWriter(buf, width, height, mode, compress_level=1, preview_size=(10, 31)) as writer:
+        for top in range(0, height, 64):
+            writer.write_rows(pixels[top:top + 64])
+
+    buf.seek(0)
+    with Image.open(buf) as image:
+        assert image.format == "PNG"
+        assert image.mode == mode
+        assert image.size == (width, height)
+        assert np.array_equal(np.asarray(image), pixels)
+    assert writer.preview.size == (10, 31)
+
+
+def test_write_image_converts_mode():
+    image = Image.new("RGBA", (20, 10), (10, 20, 30, 40))
+    buf = io.BytesIO()
+    with StreamingPNGWriter(buf, 20, 10, "RGB") as writer:
+        writer.write_image(image.crop((0, 0, 20, 4)))
+        writer.write_image(image.crop((0, 4, 20, 10)))
+    buf.seek(0)
+    assert np.array_equal(np.asarray(Image.open(buf)), np.asarray(image.convert("RGB")))
+
+
+def test_close_checks_row_count():
+    writer = StreamingPNGWriter(io.BytesIO(), 4, 4, "L")
+    writer.write_rows(np.zeros((3, 4), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        writer.close()
+
+
+def test_unsupported_mode():
+    with pytest.raises(ValueError):
+        StreamingPNGWriter(io.BytesIO(), 4, 4, "CMYK")
+
+
+@pytest.mark.parametrize("scenario", ["desktop", "dark", "long_scroll"])
+def test_streamed_blur_classifies_like_in_memory(scenario):
+    image = make_screenshot(scenario)
+    editor = FreeScreenshotEditor()
+    expected = editor.detect_sensitive_info_free(image, ImageFeatures(image))
+    buf = io.BytesIO()
+    info = stream_smart_blur(image, buf, editor, band_height=512)
+
+    for key in ("found", "locations", "areas"):
+        assert info[key] == expected[key]
+    buf.seek(0)
+    assert Image.open(buf).size == image.size
+
+
+@pytest.mark.parametrize("position", ["top", "bottom"])
+def test_streamed_caption_matches_add_text_to_image(position):
+    image = make_screenshot("mobile")
+    buf = io.BytesIO()
+    stream_add_text(image, buf, "When the benchmark is more organized than your life", position, band_height=64)
+    buf.seek(0)
+    expected = add_text_to_image(image, "When the benchmark is more organized than your life", position)
+    assert np.array_equal(np.asarray(Image.open(buf)), np.asarray(expected))
+
+
+def test_streamed_features_match_full_analysis():
+    image = make_screenshot("desktop")
+    features, streamed = ImageFeatures(image), StreamedFeatures(image, band_height=100)
+    assert streamed.brightness == pytest.approx(features.brightness, abs=0.5)
+    assert streamed.edge_density == pytest.approx(features.edge_density, rel=0.02)
+    editor = FreeScreenshotEditor()
+    assert editor.generate_alt_text_free(image, streamed) == editor.generate_alt_text_free(image, features)